@@ -12,7 +12,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 # Import models and config
 from app.database import Base
-from app.models import User, MoodEntry, JournalEntry, AIAnalysis, CrisisLog
+from app.models import User, MoodEntry, JournalEntry, AIAnalysis, CrisisLog, VectorOutbox, SyncWatermark, JobCheckpoint
 from app.config import get_settings
 
 settings = get_settings()
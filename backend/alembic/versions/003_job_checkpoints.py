@@ -0,0 +1,33 @@
+"""Job checkpoints
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create job_checkpoints table
+    op.create_table(
+        'job_checkpoints',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('cursor', sa.String(length=64), nullable=True),
+        sa.Column('processed', sa.BigInteger(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('job_checkpoints')
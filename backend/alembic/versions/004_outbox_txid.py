@@ -0,0 +1,40 @@
+"""Commit-order-safe vector outbox positions
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Writing transaction of each outbox row (PostgreSQL 13+); existing rows
+    # get this migration's id and are replayed once, which is harmless
+    op.add_column(
+        'vector_outbox',
+        sa.Column(
+            'txid',
+            sa.BigInteger(),
+            server_default=sa.text("(pg_current_xact_id()::text)::bigint"),
+            nullable=False
+        )
+    )
+    op.create_index('idx_vector_outbox_txid', 'vector_outbox', ['txid', 'id'])
+    op.add_column(
+        'sync_watermarks',
+        sa.Column('txid', sa.BigInteger(), server_default='0', nullable=False)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('sync_watermarks', 'txid')
+    op.drop_index('idx_vector_outbox_txid', table_name='vector_outbox')
+    op.drop_column('vector_outbox', 'txid')
@@ -6,12 +6,21 @@ from app.models.user import User
 from app.models.journal import JournalEntry
 from app.models.analysis import AIAnalysis
 from app.schemas.analysis import AIAnalysisResponse, SentimentInfo, EmotionInfo, StressInfo
-from app.middleware.auth import get_current_user
+from app.middleware.auth import get_current_user, get_current_admin
 from app.services.ai_service import ai_service
+from app.services.analysis_cache import analysis_cache
 
 router = APIRouter(prefix="/analysis", tags=["AI Analysis"])
 
 
+@router.get("/cache/stats", response_model=dict)
+async def get_analysis_cache_stats(
+    current_user: User = Depends(get_current_admin)
+):
+    """Get hit/miss counters for the analysis result cache of this worker (admins only)."""
+    return analysis_cache.stats()
+
+
 @router.get("/{journal_id}", response_model=AIAnalysisResponse)
 async def get_analysis(
     journal_id: str,
@@ -88,19 +97,19 @@ async def trigger_analysis(
             detail="Journal entry not found"
         )
     
-    # Check if analysis already exists
-    existing_result = await db.execute(
-        select(AIAnalysis).where(AIAnalysis.journal_id == journal_id)
-    )
-    if existing_result.scalar_one_or_none():
+    # Perform analysis (concurrent duplicates share one run)
+    analysis, created = await ai_service.analyze_journal_entry_once(journal_entry.id)
+    if analysis is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Journal entry not found"
+        )
+    if not created:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Analysis already exists for this journal entry"
         )
     
-    # Perform analysis
-    analysis = await ai_service.analyze_journal_entry(journal_entry, db)
-    
     return {
         "journal_id": str(journal_id),
         "sentiment": {
@@ -5,7 +5,8 @@ from datetime import timedelta
 from app.database import get_db
 from app.models.user import User
 from app.schemas.auth import UserCreate, UserLogin, Token, UserResponse
-from app.utils.security import hash_password, verify_password, create_access_token
+from app.utils.security import create_access_token, password_pool
+from app.middleware.auth import get_current_admin, invalidate_principal
 from app.config import get_settings
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -30,13 +31,16 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
         new_user = User(
             email=user_data.email,
             full_name=user_data.full_name,
-            password_hash=hash_password(user_data.password)
+            password_hash=await password_pool.hash(user_data.password)
         )
         
         db.add(new_user)
         await db.commit()
         await db.refresh(new_user)
         
+        # The email may belong to a deleted account still cached elsewhere
+        await invalidate_principal(new_user.email)
+        
         return {
             "user_id": str(new_user.id),
             "email": new_user.email,
@@ -61,7 +65,7 @@ async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == credentials.email))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(credentials.password, user.password_hash):
+    if not user or not await password_pool.verify(credentials.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -89,6 +93,14 @@ async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     )
 
 
+@router.get("/password-pool/stats", response_model=dict)
+async def get_password_pool_stats(
+    current_user: User = Depends(get_current_admin)
+):
+    """Get queue depth, load shedding and queue wait metrics for password hashing on this worker (admins only)."""
+    return password_pool.stats()
+
+
 @router.post("/logout", response_model=dict)
 async def logout():
     """Logout user (client should discard token)."""
@@ -1,16 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, File, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc, func
 from datetime import datetime
+import json
 import os
 import tempfile
-from app.database import get_db
+from app.database import get_db, AsyncSessionLocal
 from app.models.user import User
 from app.models.journal import JournalEntry
 from app.models.analysis import AIAnalysis
-from app.schemas.journal import JournalEntryCreate, JournalEntryResponse, JournalListResponse
+from app.schemas.journal import JournalEntryCreate, JournalEntryResponse, JournalListResponse, AskPastSelfRequest
 from app.middleware.auth import get_current_user
 from app.ml import stt_service
+from app.services.cache_service import cache_service, CacheNamespace, CacheTTL
+from app.services.encryption_service import content_keyring, UndecryptableContent
+from app.services.vector_service import vector_service
 
 router = APIRouter(prefix="/journal", tags=["Journal"])
 
@@ -38,6 +43,8 @@ async def create_journal_entry(
     await db.commit()
     await db.refresh(journal_entry)
     
+    await cache_service.invalidate_namespace(CacheNamespace.journal_list(current_user.id))
+    
     # TODO: Trigger AI analysis in background task
     
     return {
@@ -53,14 +60,42 @@ async def create_journal_entry(
 async def get_journal_entries(
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """Get paginated list of journal entries."""
+    namespace = CacheNamespace.journal_list(current_user.id)
+    key = f"{limit}:{offset}"
+    
+    async def load_entries() -> str:
+        # Own session: the shared load may outlive this request
+        async with AsyncSessionLocal() as db:
+            entries = await _query_journal_entries(db, current_user.id, limit, offset)
+        # Pages hold decrypted content, so they are sealed before reaching Redis
+        return content_keyring.seal(entries.model_dump_json())
+    
+    sealed = await cache_service.get_or_load(
+        namespace, key, load_entries, ttl_seconds=CacheTTL.JOURNAL_LIST
+    )
+    try:
+        page = content_keyring.open(sealed)
+    except UndecryptableContent:
+        # Sealed under a master key that has since left the keyring
+        await cache_service.delete(namespace, key)
+        page = content_keyring.open(await load_entries())
+    return JournalListResponse.model_validate_json(page)
+
+
+async def _query_journal_entries(
+    db: AsyncSession,
+    user_id,
+    limit: int,
+    offset: int
+) -> JournalListResponse:
+    """Load one page of journal entries with their analysis status."""
     # Get total count
     count_result = await db.execute(
         select(func.count(JournalEntry.id))
-        .where(JournalEntry.user_id == current_user.id)
+        .where(JournalEntry.user_id == user_id)
     )
     total = count_result.scalar()
     
@@ -68,7 +103,7 @@ async def get_journal_entries(
     result = await db.execute(
         select(JournalEntry, AIAnalysis.id.isnot(None).label("has_analysis"))
         .outerjoin(AIAnalysis, JournalEntry.id == AIAnalysis.journal_id)
-        .where(JournalEntry.user_id == current_user.id)
+        .where(JournalEntry.user_id == user_id)
         .order_by(desc(JournalEntry.created_at))
         .limit(limit)
         .offset(offset)
@@ -170,3 +205,41 @@ async def transcribe_audio(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Transcription failed: {str(e)}"
         )
+
+
+@router.post("/ask/stream")
+async def ask_past_self_stream(
+    request: AskPastSelfRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Ask a question about past journal entries, streamed as Server-Sent Events.
+    
+    Emits one `sources` event with the cited entries, then `token` events
+    carrying answer text as it is generated, and finally `done` (or `error`).
+    """
+    date_range = None
+    if request.start_date or request.end_date:
+        date_range = (request.start_date, request.end_date)
+    
+    events = vector_service.ask_past_self_stream(
+        str(current_user.id),
+        request.question,
+        n_context=request.n_context,
+        date_range=date_range,
+        filters=request.filters
+    )
+    
+    async def event_stream():
+        async for event in events:
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stops nginx from buffering the stream
+            "X-Accel-Buffering": "no"
+        }
+    )
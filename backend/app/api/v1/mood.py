@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc, func
-from datetime import datetime, timedelta
-from app.database import get_db
+from datetime import datetime, date, timedelta
+from app.database import get_db, AsyncSessionLocal
 from app.models.user import User
 from app.models.mood import MoodEntry
 from app.schemas.mood import MoodEntryCreate, MoodEntryResponse, MoodHistoryResponse
 from app.middleware.auth import get_current_user
+from app.services.cache_service import cache_service, CacheNamespace, CacheTTL
 
 router = APIRouter(prefix="/mood", tags=["Mood Tracking"])
 
@@ -51,6 +52,8 @@ async def create_mood_entry(
     await db.commit()
     await db.refresh(mood_entry)
     
+    await cache_service.invalidate_namespace(CacheNamespace.mood_history(current_user.id))
+    
     return {
         "id": str(mood_entry.id),
         "user_id": str(mood_entry.user_id),
@@ -64,8 +67,7 @@ async def create_mood_entry(
 async def get_mood_history(
     period: str = Query("weekly", regex="^(weekly|monthly|yearly)$"),
     limit: int = Query(30, ge=1, le=365),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """Get mood history for the user."""
     # Calculate date range
@@ -77,11 +79,33 @@ async def get_mood_history(
     else:  # yearly
         start_date = end_date - timedelta(days=365)
     
+    async def load_history() -> dict:
+        # Own session: the shared load may outlive this request
+        async with AsyncSessionLocal() as db:
+            history = await _query_mood_history(db, current_user.id, start_date, end_date, limit)
+        return history.model_dump(mode="json")
+    
+    return await cache_service.get_or_load(
+        CacheNamespace.mood_history(current_user.id),
+        f"{period}:{limit}:{end_date.isoformat()}",
+        load_history,
+        ttl_seconds=CacheTTL.MOOD_HISTORY
+    )
+
+
+async def _query_mood_history(
+    db: AsyncSession,
+    user_id,
+    start_date: date,
+    end_date: date,
+    limit: int
+) -> MoodHistoryResponse:
+    """Load mood entries and their summary for a date range."""
     # Fetch entries
     result = await db.execute(
         select(MoodEntry)
         .where(
-            MoodEntry.user_id == current_user.id,
+            MoodEntry.user_id == user_id,
             MoodEntry.entry_date >= start_date,
             MoodEntry.entry_date <= end_date
         )
@@ -97,7 +121,7 @@ async def get_mood_history(
         avg_result = await db.execute(
             select(func.avg(MoodEntry.mood_score))
             .where(
-                MoodEntry.user_id == current_user.id,
+                MoodEntry.user_id == user_id,
                 MoodEntry.entry_date >= start_date
             )
         )
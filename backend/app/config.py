@@ -15,18 +15,61 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    TOKEN_CACHE_SIZE: int = 10000  # Verified JWT payloads memoized per worker
+    ADMIN_EMAILS: str = ""  # Comma-separated accounts allowed to read operational stats
+    
+    # Password Hashing
+    PASSWORD_HASH_WORKERS: int = 4  # Threads running bcrypt per worker
+    PASSWORD_HASH_MAX_QUEUE: int = 64  # Waiting bcrypt operations before shedding with 503
     
     # OpenAI
     OPENAI_API_KEY: str
     
+    # AI Pipeline
+    ANALYSIS_MAX_WORKERS: int = 4  # Threads for CPU-bound analyzers
+    REFLECTION_MAX_CONCURRENCY: int = 8  # In-flight GPT reflection calls
+    ANALYSIS_CACHE_MAX_ENTRIES: int = 2048  # In-process analysis memo entries
+    EMBEDDING_BACKEND: str = "openai"  # "openai" or "local" (offline hashed n-gram embeddings)
+    EMBEDDING_LOCAL_DIMENSIONS: int = 384
+    VECTOR_INDEX_BACKEND: str = "chroma"  # "chroma" (HNSW) or "numpy" (exact, memory-mapped)
+    VECTOR_INDEX_PATH: str = "./vector_index"  # NumPy index storage
+    VECTOR_COLLECTION_CACHE_SIZE: int = 1024  # Per-user index handles kept open
+    VECTOR_SYNC_INTERVAL: int = 30  # Seconds between outbox consumer runs
+    VECTOR_SYNC_BATCH_SIZE: int = 500  # Outbox rows applied per transaction
+    VECTOR_SYNC_MAX_BATCHES: int = 10  # Batches per consumer run
+    VECTOR_OUTBOX_RETENTION_DAYS: int = 7  # Applied outbox rows kept for auditing
+    EMBEDDING_MAX_CONCURRENCY: int = 4  # In-flight embedding requests
+    EMBEDDING_MAX_RETRIES: int = 5  # Retries with backoff on rate limits / 5xx
+    EMBEDDING_BASE_URL: str = ""  # OpenAI-compatible endpoint override (e.g. a local fake server)
+    
     # Redis (Caching & Celery)
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_MAX_CONNECTIONS: int = 50  # Shared cache connection pool size
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # Seconds before idle connections are re-pinged
+    REDIS_RETRY_INTERVAL: int = 10  # Seconds to serve from memory after a Redis error
+    MEMORY_CACHE_MAX_ENTRIES: int = 10000  # In-memory fallback cache limits
+    MEMORY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    NEAR_CACHE_TTL: int = 30  # Seconds a Redis value is reused in-process
+    NEAR_CACHE_MAX_ENTRIES: int = 5000
+    NEAR_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    CACHE_REAPER_INTERVAL: int = 3600  # Seconds between sweeps for invalidated keys
+    CACHE_REAPER_SCAN_COUNT: int = 500  # SCAN/UNLINK batch size
+    SINGLE_FLIGHT_LOCK_TIMEOUT: int = 120  # Seconds before a coalescing lock expires
+    SINGLE_FLIGHT_WAIT_TIMEOUT: int = 60  # Seconds a duplicate waits for the lock
     
     # Observability
     SENTRY_DSN: str = ""
     
     # Encryption
     ENCRYPTION_MASTER_KEY: str = ""
+    ENCRYPTION_RETIRED_KEYS: str = ""  # Comma-separated previous master keys, still readable while rotating
+    ENCRYPTION_ROTATION_BATCH_SIZE: int = 500  # Rows re-encrypted per transaction
+    ENCRYPTION_ROTATION_MAX_ROWS_PER_SECOND: int = 1000  # Throttle so Postgres keeps headroom
+    ENCRYPTION_ROTATION_TIME_BUDGET: int = 200  # Seconds per task run before it re-enqueues itself
+    ENCRYPTION_KEY_CACHE_SIZE: int = 1024  # Derived encryption keys kept in memory per worker
+    ENCRYPTION_KEY_CACHE_TTL: int = 900  # Seconds a derived key is reused
+    ENCRYPTION_KDF_WORKERS: int = 2  # Threads running PBKDF2
     
     # CORS
     ALLOWED_ORIGINS: str = "http://localhost:3000"
@@ -43,6 +86,11 @@ class Settings(BaseSettings):
         """Convert comma-separated origins to list."""
         return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",")]
 
+    @property
+    def admin_emails_set(self) -> set[str]:
+        """Convert comma-separated admin emails to a set."""
+        return {email.strip().lower() for email in self.ADMIN_EMAILS.split(",") if email.strip()}
+
     @property
     def async_database_url(self) -> str:
         """Convert postgres:// to postgresql+asyncpg:// for SQLAlchemy async."""
@@ -1,8 +1,15 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
 from app.api.v1 import api_router
+from app.services.analysis_cache import analysis_cache
+from app.services.cache_service import cache_service
+from app.services.embedding_cache import embedding_cache
+from app.middleware.auth import provision_guest_user
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
 # Initialize Sentry for error tracking
@@ -22,12 +29,33 @@ if settings.SENTRY_DSN:
         environment=settings.ENV,
     )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks."""
+    if not await cache_service.health_check():
+        logger.warning("Redis unreachable at startup. Serving cache from memory.")
+    cache_service.start_background_tasks()
+    
+    try:
+        await provision_guest_user()
+    except Exception as e:
+        logger.warning(f"Guest user provisioning failed: {e}. Retrying on first guest request.")
+    
+    yield
+    
+    await cache_service.close()
+    await embedding_cache.close()
+    await analysis_cache.close()
+
+
 app = FastAPI(
     title="NeuroLeaf API",
     description="AI-Powered Mental Wellness Companion - Ethical, Privacy-First Journaling & Mood Tracking",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -57,8 +85,13 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy"}
+    """Health check endpoint (reports cached Redis state; never waits on Redis)."""
+    cache = cache_service.status()
+    return {
+        "status": "healthy",
+        "cache": cache["backend"],
+        "cache_error": cache["last_error"]
+    }
 
 
 if __name__ == "__main__":
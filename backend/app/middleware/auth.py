@@ -1,48 +1,136 @@
+import logging
+import uuid
+from datetime import datetime
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.database import get_db
+from sqlalchemy.exc import IntegrityError
+from app.database import AsyncSessionLocal
 from app.models.user import User
-from app.utils.security import verify_token
+from app.services.cache_service import cache_service, CacheNamespace, CacheTTL
+from app.utils.security import verify_token, password_pool
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
 
 security = HTTPBearer()
 
+GUEST_EMAIL = "guest@neuroleaf.com"
+GUEST_PASSWORD = "guest-not-for-production-but-ok"
+
+# Columns cached for a principal (never the password hash)
+_PRINCIPAL_FIELDS = ("email", "full_name", "is_active", "timezone", "preferences")
+_PRINCIPAL_TIMESTAMPS = ("created_at", "updated_at")
+
+
+def _principal_snapshot(user: User) -> dict:
+    """JSON-serializable copy of a user's non-secret columns."""
+    snapshot = {field: getattr(user, field) for field in _PRINCIPAL_FIELDS}
+    snapshot["id"] = str(user.id)
+    for field in _PRINCIPAL_TIMESTAMPS:
+        value = getattr(user, field)
+        snapshot[field] = value.isoformat() if value else None
+    return snapshot
+
+
+def _principal_user(snapshot: dict) -> User:
+    """Detached User rebuilt from a cached snapshot."""
+    columns = {field: snapshot[field] for field in _PRINCIPAL_FIELDS}
+    for field in _PRINCIPAL_TIMESTAMPS:
+        value = snapshot[field]
+        columns[field] = datetime.fromisoformat(value) if value else None
+    return User(id=uuid.UUID(snapshot["id"]), **columns)
+
+
+async def _load_principal(email: str) -> dict:
+    """Fetch a user by email; raises 401 (and caches nothing) if missing."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User).where(User.email == email))
+        user = result.scalar_one_or_none()
+    
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+        )
+    return _principal_snapshot(user)
+
+
+async def invalidate_principal(email: str):
+    """Drop a cached principal on every worker; call after changing or deleting an account."""
+    await cache_service.delete(CacheNamespace.PRINCIPAL, email)
+
+
+async def provision_guest_user():
+    """Create the shared Guest user if it does not exist (run at startup)."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.id).where(User.email == GUEST_EMAIL))
+        if result.scalar_one_or_none() is not None:
+            return
+        
+        password_hash = await password_pool.hash(GUEST_PASSWORD)
+        db.add(User(email=GUEST_EMAIL, full_name="Guest User", password_hash=password_hash))
+        try:
+            await db.commit()
+            logger.info("Provisioned Guest user")
+        except IntegrityError:
+            # Another worker created it first
+            await db.rollback()
+
 
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials | None = Depends(security),
-    db: AsyncSession = Depends(get_db)
+    credentials: HTTPAuthorizationCredentials | None = Depends(security)
 ) -> User:
-    """Get current user, falling back to a global Guest user for seamless access."""
+    """
+    Get current user, falling back to a global Guest user for seamless access.
+    
+    The user is resolved from a principal cache keyed by token subject
+    (CacheTTL.PRINCIPAL, invalidated by invalidate_principal()), so most
+    requests make no database round trip. The returned User is detached
+    from any session and carries no password hash.
+    """
     # Try to verify token if provided
-    email = "guest@neuroleaf.com" # Default
+    email = GUEST_EMAIL # Default
     
     if credentials:
         token = credentials.credentials
         payload = verify_token(token)
         if payload and payload.get("sub"):
             email = payload.get("sub")
-
-    # Get user from DB
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalar_one_or_none()
     
-    # If Guest user doesn't exist yet, create it on the fly
-    if user is None and email == "guest@neuroleaf.com":
-        from app.utils.security import hash_password
-        user = User(
-            email=email,
-            full_name="Guest User",
-            password_hash=hash_password("guest-not-for-production-but-ok")
+    try:
+        snapshot = await cache_service.get_or_load(
+            CacheNamespace.PRINCIPAL,
+            email,
+            lambda: _load_principal(email),
+            ttl_seconds=CacheTTL.PRINCIPAL
+        )
+    except HTTPException:
+        if email != GUEST_EMAIL:
+            raise
+        # Startup provisioning failed (e.g. database not ready yet)
+        await provision_guest_user()
+        snapshot = await cache_service.get_or_load(
+            CacheNamespace.PRINCIPAL,
+            email,
+            lambda: _load_principal(email),
+            ttl_seconds=CacheTTL.PRINCIPAL
         )
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
     
-    if user is None:
-         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+    return _principal_user(snapshot)
+
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """
+    Require an account listed in ADMIN_EMAILS (for operational endpoints).
+    
+    The shared Guest user is never an admin.
+    """
+    email = current_user.email.lower()
+    if email == GUEST_EMAIL or email not in settings.admin_emails_set:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
         )
-        
-    return user
+    return current_user
@@ -3,11 +3,16 @@ from app.ml.emotion_classifier import emotion_classifier
 from app.ml.crisis_detector import crisis_detector
 from app.ml.reflection_generator import reflection_generator
 from app.ml.stt_service import stt_service
+from app.ml.embedder import embedder
+from app.ml.preprocessing import PreprocessedText, preprocess
 
 __all__ = [
     "sentiment_analyzer",
     "emotion_classifier",
     "crisis_detector",
     "reflection_generator",
-    "stt_service"
+    "stt_service",
+    "embedder",
+    "PreprocessedText",
+    "preprocess"
 ]
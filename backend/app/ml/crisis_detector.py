@@ -1,9 +1,64 @@
 import re
+from app.ml.preprocessing import PreprocessedText, preprocess
+
+
+def _leading_literal(pattern: str) -> str:
+    """
+    Rewrite a ``\\b<char>...`` pattern so it begins with a plain literal.
+    
+    ``x(?<!\\w.)`` is the same check as ``\\bx`` for a word character ``x``,
+    but a leading literal lets the regex engine skip straight to candidate
+    characters instead of attempting every alternative at every position.
+    """
+    if not (pattern.startswith(r'\b') and re.fullmatch(r'\w', pattern[2:3])):
+        raise ValueError(f"Pattern must start with \\b and a word character: {pattern!r}")
+    return pattern[2] + r'(?<!\w.)' + pattern[3:]
+
+
+def _compile_matcher(high_risk: list, moderate_patterns: list, stress_keywords: list) -> re.Pattern:
+    """
+    Combine every crisis/stress pattern into one precompiled scanner.
+    
+    Each alternative ends in an empty named group (``h<i>``, ``m<i>``,
+    ``s<i>``) that identifies it via ``match.lastgroup``. Alternatives are
+    ordered by severity: when two categories match at the same position the
+    more severe one wins, which never changes the outcome because a higher
+    severity short-circuits the lower ones.
+    """
+    alternatives = []
+    
+    # High-risk keywords are plain substrings; longest first so that a keyword
+    # which is a prefix of another is still recovered via _HIGH_RISK_IMPLIED.
+    for i, keyword in sorted(enumerate(high_risk), key=lambda item: -len(item[1])):
+        alternatives.append(f"{re.escape(keyword)}(?P<h{i}>)")
+    
+    # Moderate patterns keep their case-insensitive matching past the first
+    # character (every leading character is already lowercase-only)
+    for i, pattern in enumerate(moderate_patterns):
+        literal = _leading_literal(pattern)
+        alternatives.append(f"{literal[0]}(?i:{literal[1:]})(?P<m{i}>)")
+    
+    # Stress keywords match whole words only
+    for i, keyword in enumerate(stress_keywords):
+        alternatives.append(_leading_literal(r'\b' + re.escape(keyword) + r'\b') + f"(?P<s{i}>)")
+    
+    return re.compile("|".join(alternatives))
+
+
+def _contained_keywords(keywords: list) -> list:
+    """For each keyword, the indices of all keywords that are substrings of it."""
+    return [
+        [i for i, other in enumerate(keywords) if other in keyword]
+        for keyword in keywords
+    ]
 
 
 class CrisisDetector:
     """Detect crisis language in journal entries with escalating severity levels."""
     
+    # Bump when keywords or patterns change so cached analyses are recomputed
+    VERSION = "rules-1"
+    
     # High-severity keywords indicating immediate crisis
     HIGH_RISK_KEYWORDS = [
         'suicide', 'suicidal', 'kill myself', 'end my life', 'end it all',
@@ -32,6 +87,40 @@ class CrisisDetector:
         'deadline', 'workload', 'busy', 'hectic'
     ]
     
+    # Single-pass scanner over all three keyword/pattern sets (built once at import)
+    _MATCHER = _compile_matcher(HIGH_RISK_KEYWORDS, MODERATE_RISK_PATTERNS, STRESS_KEYWORDS)
+    
+    # High-risk keywords implied by a hit on each keyword (itself included)
+    _HIGH_RISK_IMPLIED = _contained_keywords(HIGH_RISK_KEYWORDS)
+    
+    def _scan(self, text_lower: str) -> tuple:
+        """
+        Collect all high-risk, moderate and stress hits in one pass.
+        
+        Returns:
+            tuple: (high-risk indices, {moderate index: first match}, stress indices)
+        """
+        high_risk_hits = set()
+        moderate_hits = {}
+        stress_hits = set()
+        
+        # Restart one character past each hit so overlapping hits are kept
+        match = self._MATCHER.search(text_lower)
+        while match:
+            name = match.lastgroup
+            kind, index = name[0], int(name[1:])
+            if kind == 'h':
+                high_risk_hits.update(self._HIGH_RISK_IMPLIED[index])
+            elif kind == 'm':
+                # Keep the leftmost match, as re.search would
+                if index not in moderate_hits:
+                    moderate_hits[index] = match.group(0)
+            else:
+                stress_hits.add(index)
+            match = self._MATCHER.search(text_lower, match.start() + 1)
+        
+        return high_risk_hits, moderate_hits, stress_hits
+    
     def detect(self, text: str) -> dict:
         """
         Detect crisis language and stress patterns.
@@ -45,46 +134,33 @@ class CrisisDetector:
                 'stress_level': str ('low', 'moderate', 'high')
             }
         """
-        text_lower = text.lower()
-        detected_patterns = []
-        stress_keywords_found = []
-        
-        # Check high-risk keywords
-        for keyword in self.HIGH_RISK_KEYWORDS:
-            if keyword in text_lower:
-                detected_patterns.append(keyword)
+        return self.detect_preprocessed(PreprocessedText(text))
+    
+    def detect_preprocessed(self, doc: PreprocessedText) -> dict:
+        """Detect crisis language from a PreprocessedText (see detect())."""
+        high_risk_hits, moderate_hits, stress_hits = self._scan(doc.lower)
         
         # If high-risk detected, immediate severe crisis
-        if detected_patterns:
+        if high_risk_hits:
             return {
                 'crisis_detected': True,
                 'severity': 'severe',
-                'detected_patterns': detected_patterns,
+                'detected_patterns': [self.HIGH_RISK_KEYWORDS[i] for i in sorted(high_risk_hits)],
                 'stress_keywords': [],
                 'stress_level': 'high'
             }
         
-        # Check moderate-risk patterns
-        for pattern in self.MODERATE_RISK_PATTERNS:
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                match = re.search(pattern, text_lower, re.IGNORECASE)
-                detected_patterns.append(match.group(0))
-        
         # If moderate risk detected
-        if detected_patterns:
+        if moderate_hits:
             return {
                 'crisis_detected': True,
                 'severity': 'moderate',
-                'detected_patterns': detected_patterns,
+                'detected_patterns': [moderate_hits[i] for i in sorted(moderate_hits)],
                 'stress_keywords': [],
                 'stress_level': 'high'
             }
         
-        # Check stress keywords
-        for keyword in self.STRESS_KEYWORDS:
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, text_lower):
-                stress_keywords_found.append(keyword)
+        stress_keywords_found = [self.STRESS_KEYWORDS[i] for i in sorted(stress_hits)]
         
         # Determine stress level
         stress_count = len(stress_keywords_found)
@@ -102,6 +178,18 @@ class CrisisDetector:
             'stress_keywords': stress_keywords_found,
             'stress_level': stress_level
         }
+    
+    def analyze_batch(self, texts: list) -> list:
+        """
+        Run crisis detection over a batch of texts.
+        
+        Args:
+            texts: Raw texts or PreprocessedText instances
+        
+        Returns:
+            list: One detect() result per text, in input order
+        """
+        return [self.detect_preprocessed(preprocess(text)) for text in texts]
 
 
 # Singleton instance
@@ -0,0 +1,311 @@
+import asyncio
+import hashlib
+import logging
+import math
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+from openai import OpenAI, AsyncOpenAI, BadRequestError
+from app.config import get_settings
+from app.ml.preprocessing import preprocess
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class OpenAIEmbedder:
+    """
+    Batched text embeddings through the OpenAI embeddings API.
+    
+    Texts are packed into as few requests as the API limits allow and the
+    requests are sent with bounded concurrency. Rate limits, timeouts and
+    5xx errors are retried with exponential backoff by the OpenAI client.
+    
+    Tokens are counted with the model's tiktoken encoding when available,
+    else as UTF-8 bytes, an upper bound for byte-level BPE in any script
+    (CJK and emoji take several tokens per character). A batch the API
+    still rejects as too large is retried in halves, so one bad input
+    cannot fail the rest.
+    """
+    
+    MODEL = "text-embedding-3-small"
+    DIMENSIONS = 1536
+    
+    # Remote calls are worth caching by content hash
+    cacheable = True
+    
+    # Per-request API limits
+    MAX_BATCH_INPUTS = 2048
+    MAX_BATCH_TOKENS = 300000
+    MAX_INPUT_TOKENS = 8191
+    
+    def __init__(self, base_url: str = None, api_key: str = None):
+        """
+        Args:
+            base_url: OpenAI-compatible endpoint (default: EMBEDDING_BASE_URL,
+                else the OpenAI API)
+            api_key: API key (default: OPENAI_API_KEY)
+        """
+        client_options = {
+            "api_key": api_key or settings.OPENAI_API_KEY,
+            "max_retries": settings.EMBEDDING_MAX_RETRIES,
+        }
+        base_url = base_url or settings.EMBEDDING_BASE_URL
+        if base_url:
+            client_options["base_url"] = base_url
+        
+        self.model = self.MODEL
+        self.dimensions = self.DIMENSIONS
+        self.client = OpenAI(**client_options)
+        self.async_client = AsyncOpenAI(**client_options)
+        # Caps in-flight embedding requests per process
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.EMBEDDING_MAX_CONCURRENCY,
+            thread_name_prefix="embedding"
+        )
+        self._async_slots = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+        self._encoding = None
+        self._encoding_loaded = False
+    
+    def _get_encoding(self):
+        """The model's tiktoken encoding, or None to count UTF-8 bytes (loaded on first use)."""
+        if not self._encoding_loaded:
+            self._encoding_loaded = True
+            if TIKTOKEN_AVAILABLE:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except Exception as e:  # Unknown model, or the encoding download failed
+                    logger.warning(f"tiktoken encoding unavailable ({e}); counting UTF-8 bytes")
+        return self._encoding
+    
+    def _prepare(self, text: str) -> tuple:
+        """
+        Truncate a text to the per-input limit.
+        
+        Returns:
+            tuple: (prepared text, token count); the API rejects empty inputs
+        """
+        encoding = self._get_encoding()
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            if len(tokens) > self.MAX_INPUT_TOKENS:
+                tokens = tokens[:self.MAX_INPUT_TOKENS]
+                text = encoding.decode(tokens)
+            return text or " ", max(len(tokens), 1)
+        
+        raw = text.encode('utf-8')
+        if len(raw) > self.MAX_INPUT_TOKENS:
+            # Drops a character cut in half at the limit
+            text = raw[:self.MAX_INPUT_TOKENS].decode('utf-8', errors='ignore')
+            raw = text.encode('utf-8')
+        return text or " ", max(len(raw), 1)
+    
+    def make_batches(self, texts: list) -> list:
+        """
+        Pack texts into request-sized batches, preserving order.
+        
+        Args:
+            texts: Texts to embed
+        
+        Returns:
+            list of lists of prepared texts
+        """
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for text in texts:
+            prepared, tokens = self._prepare(text)
+            if batch and (
+                len(batch) >= self.MAX_BATCH_INPUTS
+                or batch_tokens + tokens > self.MAX_BATCH_TOKENS
+            ):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(prepared)
+            batch_tokens += tokens
+        
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    @staticmethod
+    def _vectors(response) -> list:
+        """Embedding vectors of a response, in input order."""
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    
+    def _embed_request(self, batch: list) -> list:
+        """Embed one batch in a single API request, halving it if rejected."""
+        try:
+            response = self.client.embeddings.create(model=self.model, input=batch)
+        except BadRequestError:
+            if len(batch) == 1:
+                raise
+            middle = len(batch) // 2
+            logger.warning(f"Embedding batch of {len(batch)} rejected; retrying in halves")
+            return self._embed_request(batch[:middle]) + self._embed_request(batch[middle:])
+        return self._vectors(response)
+    
+    async def _embed_request_async(self, batch: list) -> list:
+        """Embed one batch in a single API request via the async client, halving it if rejected."""
+        try:
+            async with self._async_slots:
+                response = await self.async_client.embeddings.create(model=self.model, input=batch)
+        except BadRequestError:
+            if len(batch) == 1:
+                raise
+            middle = len(batch) // 2
+            logger.warning(f"Embedding batch of {len(batch)} rejected; retrying in halves")
+            halves = await asyncio.gather(
+                self._embed_request_async(batch[:middle]),
+                self._embed_request_async(batch[middle:])
+            )
+            return halves[0] + halves[1]
+        return self._vectors(response)
+    
+    def embed(self, texts: list) -> list:
+        """
+        Embed texts with as few requests as possible.
+        
+        Args:
+            texts: Texts to embed
+        
+        Returns:
+            list: One embedding vector per text, in input order
+        """
+        batches = self.make_batches(texts)
+        if len(batches) == 1:
+            return self._embed_request(batches[0])
+        
+        logger.info(f"Embedding {len(texts)} texts in {len(batches)} requests")
+        vectors = []
+        for batch_vectors in self._executor.map(self._embed_request, batches):
+            vectors.extend(batch_vectors)
+        return vectors
+    
+    async def embed_async(self, texts: list) -> list:
+        """Non-blocking variant of embed() for the API."""
+        batches = self.make_batches(texts)
+        results = await asyncio.gather(*(self._embed_request_async(batch) for batch in batches))
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+
+@lru_cache(maxsize=65536)
+def _feature_bucket(feature: str, dimensions: int) -> tuple:
+    """Stable (index, sign) of a hashed feature."""
+    digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+    return digest % dimensions, 1.0 if digest >> 63 else -1.0
+
+
+class HashingEmbedder:
+    """
+    Local CPU embeddings from hashed word unigrams and bigrams.
+    
+    Each feature is hashed to one of `dimensions` buckets with a random
+    sign (a sparse random projection of the term-frequency vector),
+    weighted by 1 + log(tf) and L2-normalized, so cosine similarity tracks
+    shared vocabulary and phrasing. Needs no network or model download,
+    which makes it suitable for offline use, tests and bulk indexing.
+    """
+    
+    # Bump when feature extraction changes so stored vectors are rebuilt
+    VERSION = "1"
+    
+    # Recomputing is cheaper than a cache round trip
+    cacheable = False
+    
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+        self.model = f"hashing-{dimensions}-v{self.VERSION}"
+    
+    @staticmethod
+    def features(text) -> Counter:
+        """
+        Unigram and bigram counts of a text.
+        
+        Args:
+            text: Raw text or PreprocessedText
+        """
+        tokens = preprocess(text).tokens
+        counts = Counter(tokens)
+        counts.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+        # Keeps empty texts off the zero vector, which has no direction
+        return counts or Counter({"": 1})
+    
+    def _weighted_buckets(self, text) -> list:
+        """(index, weight) contributions of every feature of a text."""
+        contributions = []
+        for feature, count in self.features(text).items():
+            index, sign = _feature_bucket(feature, self.dimensions)
+            contributions.append((index, sign * (1.0 + math.log(count))))
+        return contributions
+    
+    def embed_one(self, text) -> list:
+        """Embed a single text (pure Python)."""
+        vector = [0.0] * self.dimensions
+        for index, weight in self._weighted_buckets(text):
+            vector[index] += weight
+        
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+    
+    def embed(self, texts: list) -> list:
+        """
+        Embed texts, vectorized with NumPy when available.
+        
+        Args:
+            texts: Raw texts or PreprocessedText instances
+        
+        Returns:
+            list: One embedding vector per text, in input order
+        """
+        if not NUMPY_AVAILABLE:
+            return [self.embed_one(text) for text in texts]
+        
+        rows, columns, weights = [], [], []
+        for row, text in enumerate(texts):
+            for index, weight in self._weighted_buckets(text):
+                rows.append(row)
+                columns.append(index)
+                weights.append(weight)
+        
+        matrix = np.zeros((len(texts), self.dimensions))
+        np.add.at(matrix, (rows, columns), weights)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).tolist()
+    
+    async def embed_async(self, texts: list) -> list:
+        """Embed texts off the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed, texts)
+
+
+def create_embedder(backend: str):
+    """
+    Build the embedder for a configured backend.
+    
+    Args:
+        backend: 'openai' (API) or 'local' (HashingEmbedder)
+    """
+    if backend == "openai":
+        return OpenAIEmbedder()
+    if backend == "local":
+        return HashingEmbedder(dimensions=settings.EMBEDDING_LOCAL_DIMENSIONS)
+    raise ValueError(f"Unknown embedding backend: {backend!r}")
+
+
+# Singleton instance
+embedder = create_embedder(settings.EMBEDDING_BACKEND)
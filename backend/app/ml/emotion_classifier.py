@@ -1,4 +1,10 @@
-import re
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from app.ml.preprocessing import TOKEN_PATTERN, PreprocessedText, preprocess
 
 
 class EmotionClassifier:
@@ -10,6 +16,9 @@ class EmotionClassifier:
     - j-hartmann/emotion-english-distilroberta-base
     """
     
+    # Bump when the lexicon changes so cached analyses are recomputed
+    VERSION = "lexicon-1"
+    
     EMOTION_KEYWORDS = {
         'joy': ['happy', 'joyful', 'excited', 'thrilled', 'delighted', 'cheerful', 'wonderful', 'amazing', 'great'],
         'gratitude': ['grateful', 'thankful', 'blessed', 'appreciative', 'fortunate', 'lucky'],
@@ -23,6 +32,68 @@ class EmotionClassifier:
         'hope': ['hopeful', 'optimistic', 'confident', 'encouraged']
     }
     
+    def __init__(self):
+        self.emotions = list(self.EMOTION_KEYWORDS)
+        
+        # Compile the lexicon into a token -> emotion indices hash index
+        self._keyword_index = {}
+        for i, keywords in enumerate(self.EMOTION_KEYWORDS.values()):
+            for keyword in keywords:
+                if not TOKEN_PATTERN.fullmatch(keyword):
+                    raise ValueError(f"Emotion keyword must be a single word: {keyword!r}")
+                self._keyword_index.setdefault(keyword, []).append(i)
+        
+        # (keywords x emotions) incidence matrix for the vectorized batch path
+        self._vocabulary = {keyword: col for col, keyword in enumerate(self._keyword_index)}
+        self._incidence = None
+        if NUMPY_AVAILABLE:
+            self._incidence = np.zeros((len(self._vocabulary), len(self.emotions)), dtype=np.int64)
+            for keyword, indices in self._keyword_index.items():
+                self._incidence[self._vocabulary[keyword], indices] = 1
+    
+    def count_emotions(self, text) -> list:
+        """
+        Count keyword hits per emotion from the entry's token counts.
+        
+        Args:
+            text: Raw text or PreprocessedText
+        
+        Returns:
+            list: hit count per emotion, in EMOTION_KEYWORDS order
+        """
+        counts = [0] * len(self.emotions)
+        tokens = preprocess(text).token_counts
+        for keyword in tokens.keys() & self._keyword_index.keys():
+            for i in self._keyword_index[keyword]:
+                counts[i] += tokens[keyword]
+        return counts
+    
+    def count_matrix(self, texts: list) -> "np.ndarray":
+        """
+        Count keyword hits for a batch of texts.
+        
+        Args:
+            texts: Raw texts or PreprocessedText instances
+        
+        Returns:
+            np.ndarray: (entries x emotions) count matrix, columns in
+            EMOTION_KEYWORDS order
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("NumPy not installed. Use count_emotions per entry.")
+        
+        rows, cols, values = [], [], []
+        for row, text in enumerate(texts):
+            tokens = preprocess(text).token_counts
+            for keyword in tokens.keys() & self._vocabulary.keys():
+                rows.append(row)
+                cols.append(self._vocabulary[keyword])
+                values.append(tokens[keyword])
+        
+        keyword_counts = np.zeros((len(texts), len(self._vocabulary)), dtype=np.int64)
+        keyword_counts[rows, cols] = values
+        return keyword_counts @ self._incidence
+    
     def analyze(self, text: str) -> dict:
         """
         Classify emotions in text.
@@ -33,21 +104,47 @@ class EmotionClassifier:
                 'scores': dict (emotion -> score)
             }
         """
-        text_lower = text.lower()
+        return self.analyze_preprocessed(PreprocessedText(text))
+    
+    def analyze_preprocessed(self, doc: PreprocessedText) -> dict:
+        """Classify emotions from a PreprocessedText (see analyze())."""
+        return self.score_counts(self.count_emotions(doc), doc.word_count)
+    
+    def analyze_batch(self, texts: list) -> list:
+        """
+        Classify emotions for a batch of texts.
+        
+        Uses the vectorized count matrix when NumPy is available.
+        
+        Args:
+            texts: Raw texts or PreprocessedText instances
+        
+        Returns:
+            list: One analyze() result per text, in input order
+        """
+        docs = [preprocess(text) for text in texts]
+        if not NUMPY_AVAILABLE:
+            return [self.analyze_preprocessed(doc) for doc in docs]
+        
+        counts = self.count_matrix(docs)
+        return [
+            self.score_counts(row, doc.word_count)
+            for row, doc in zip(counts, docs)
+        ]
+    
+    def score_counts(self, counts, word_count: int) -> dict:
+        """
+        Turn per-emotion keyword counts into the analysis result.
+        
+        Args:
+            counts: Hit count per emotion, in EMOTION_KEYWORDS order
+            word_count: Whitespace-delimited word count of the entry
+        """
         emotion_scores = {}
         
-        # Count keyword matches
-        for emotion, keywords in self.EMOTION_KEYWORDS.items():
-            score = 0
-            for keyword in keywords:
-                # Use word boundaries to avoid partial matches
-                pattern = r'\b' + re.escape(keyword) + r'\b'
-                matches = len(re.findall(pattern, text_lower))
-                score += matches
-            
+        for emotion, score in zip(self.emotions, counts):
             # Normalize by text length (rough approximation)
-            word_count = len(text.split())
-            normalized_score = score / max(word_count, 1) * 10
+            normalized_score = int(score) / max(word_count, 1) * 10
             emotion_scores[emotion] = min(round(normalized_score, 2), 1.0)
         
         # Find primary emotion
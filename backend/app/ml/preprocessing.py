@@ -0,0 +1,61 @@
+import re
+from collections import Counter
+from functools import cached_property
+
+# Maximal runs of word characters: a token equal to a keyword is exactly
+# one ``\bkeyword\b`` match
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# A sentence runs from its first visible character to terminal punctuation,
+# a line break or the end of the text
+SENTENCE_PATTERN = re.compile(r'[^.!?\s][^.!?\n]*(?:[.!?]+|$)', re.MULTILINE)
+
+
+class PreprocessedText:
+    """
+    Normalized view of a journal entry, computed once and shared by every
+    analyzer in the pipeline.
+    
+    Every view is built the first time an analyzer asks for it and reused
+    afterwards. Token and sentence offsets index into ``lower``.
+    """
+    
+    def __init__(self, text: str):
+        self.text = text
+    
+    @cached_property
+    def lower(self) -> str:
+        """Lowercased text."""
+        return self.text.lower()
+    
+    @cached_property
+    def word_count(self) -> int:
+        """Whitespace-delimited word count."""
+        return len(self.text.split())
+    
+    @cached_property
+    def tokens(self) -> list:
+        """Lowercased word tokens, in order."""
+        return TOKEN_PATTERN.findall(self.lower)
+    
+    @cached_property
+    def token_spans(self) -> list:
+        """(start, end) offset of each entry in ``tokens``."""
+        return [match.span() for match in TOKEN_PATTERN.finditer(self.lower)]
+    
+    @cached_property
+    def token_counts(self) -> Counter:
+        """Occurrences of each token."""
+        return Counter(self.tokens)
+    
+    @cached_property
+    def sentences(self) -> list:
+        """(start, end) offset of each sentence."""
+        return [match.span() for match in SENTENCE_PATTERN.finditer(self.lower)]
+
+
+def preprocess(text) -> PreprocessedText:
+    """Return ``text`` as a PreprocessedText, reusing it if already preprocessed."""
+    if isinstance(text, PreprocessedText):
+        return text
+    return PreprocessedText(text)
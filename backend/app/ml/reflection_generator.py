@@ -1,4 +1,5 @@
-from openai import OpenAI
+import asyncio
+from openai import OpenAI, AsyncOpenAI
 from app.config import get_settings
 from app.ml.prompts import REFLECTION_SYSTEM_PROMPT, create_reflection_prompt, CRISIS_RESPONSE_MESSAGE
 
@@ -8,9 +9,88 @@ settings = get_settings()
 class ReflectionGenerator:
     """Generate AI reflections using OpenAI GPT with safety constraints."""
     
+    # Bump when prompts change so cached reflections are regenerated
+    PROMPT_VERSION = "1"
+    
+    FALLBACK_REFLECTION = "Thank you for sharing your thoughts. Taking time to reflect through journaling is a valuable practice for self-awareness."
+    
     def __init__(self):
         self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.async_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = "gpt-4"  # or gpt-3.5-turbo for cost savings
+        # Caps in-flight GPT calls from the async path
+        self._async_slots = asyncio.Semaphore(settings.REFLECTION_MAX_CONCURRENCY)
+    
+    @property
+    def version(self) -> str:
+        """Model and prompt version that produced a reflection."""
+        return f"{self.model}-{self.PROMPT_VERSION}"
+    
+    @staticmethod
+    def is_fallback(result: dict) -> bool:
+        """Whether a result is the canned fallback from a failed API call."""
+        return result['model_version'].startswith('fallback_error_')
+    
+    def _build_request(
+        self,
+        journal_content: str,
+        primary_emotion: str,
+        sentiment_label: str,
+        stress_level: str
+    ) -> dict:
+        """Build the chat completion arguments for a reflection."""
+        user_prompt = create_reflection_prompt(
+            journal_content=journal_content,
+            primary_emotion=primary_emotion,
+            sentiment_label=sentiment_label,
+            stress_level=stress_level
+        )
+        
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": REFLECTION_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            "max_tokens": 150,
+            "temperature": 0.7,
+            "presence_penalty": 0.0,
+            "frequency_penalty": 0.0
+        }
+    
+    def _build_result(self, response, sentiment_label: str, stress_level: str) -> dict:
+        """Turn a chat completion into the reflection result."""
+        reflection = response.choices[0].message.content.strip()
+        
+        # Determine tone based on emotion and sentiment
+        if sentiment_label == 'positive':
+            tone = 'encouraging'
+        elif stress_level == 'high' or sentiment_label == 'negative':
+            tone = 'grounding'
+        else:
+            tone = 'supportive'
+        
+        return {
+            'reflection': reflection,
+            'tone': tone,
+            'model_version': self.model
+        }
+    
+    def _crisis_result(self) -> dict:
+        """Crisis override returned instead of a generated reflection."""
+        return {
+            'reflection': CRISIS_RESPONSE_MESSAGE,
+            'tone': 'crisis_response',
+            'model_version': 'crisis_override'
+        }
+    
+    def _fallback_result(self, error: Exception) -> dict:
+        """Fallback response if the API fails."""
+        return {
+            'reflection': self.FALLBACK_REFLECTION,
+            'tone': 'supportive',
+            'model_version': f'fallback_error_{type(error).__name__}'
+        }
     
     def generate(
         self,
@@ -39,57 +119,38 @@ class ReflectionGenerator:
         """
         # Override with crisis message if detected
         if crisis_detected:
-            return {
-                'reflection': CRISIS_RESPONSE_MESSAGE,
-                'tone': 'crisis_response',
-                'model_version': 'crisis_override'
-            }
+            return self._crisis_result()
         
         try:
-            # Create prompt
-            user_prompt = create_reflection_prompt(
-                journal_content=journal_content,
-                primary_emotion=primary_emotion,
-                sentiment_label=sentiment_label,
-                stress_level=stress_level
-            )
-            
-            # Call OpenAI API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": REFLECTION_SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=150,
-                temperature=0.7,
-                presence_penalty=0.0,
-                frequency_penalty=0.0
-            )
-            
-            reflection = response.choices[0].message.content.strip()
-            
-            # Determine tone based on emotion and sentiment
-            if sentiment_label == 'positive':
-                tone = 'encouraging'
-            elif stress_level == 'high' or sentiment_label == 'negative':
-                tone = 'grounding'
-            else:
-                tone = 'supportive'
-            
-            return {
-                'reflection': reflection,
-                'tone': tone,
-                'model_version': self.model
-            }
+            request = self._build_request(journal_content, primary_emotion, sentiment_label, stress_level)
+            response = self.client.chat.completions.create(**request)
+            return self._build_result(response, sentiment_label, stress_level)
+        except Exception as e:
+            return self._fallback_result(e)
+    
+    async def generate_async(
+        self,
+        journal_content: str,
+        primary_emotion: str,
+        sentiment_label: str,
+        stress_level: str,
+        crisis_detected: bool = False
+    ) -> dict:
+        """
+        Generate AI reflection without blocking the event loop.
+        
+        Same arguments and result as generate(), using the async OpenAI client.
+        """
+        if crisis_detected:
+            return self._crisis_result()
         
+        try:
+            request = self._build_request(journal_content, primary_emotion, sentiment_label, stress_level)
+            async with self._async_slots:
+                response = await self.async_client.chat.completions.create(**request)
+            return self._build_result(response, sentiment_label, stress_level)
         except Exception as e:
-            # Fallback response if API fails
-            return {
-                'reflection': "Thank you for sharing your thoughts. Taking time to reflect through journaling is a valuable practice for self-awareness.",
-                'tone': 'supportive',
-                'model_version': f'fallback_error_{type(e).__name__}'
-            }
+            return self._fallback_result(e)
 
 
 # Singleton instance
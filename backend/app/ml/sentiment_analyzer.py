@@ -1,9 +1,13 @@
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from app.ml.preprocessing import PreprocessedText, preprocess
 
 
 class SentimentAnalyzer:
     """Sentiment analysis using VADER (Valence Aware Dictionary and sEntiment Reasoner)."""
     
+    # Bump when results change so cached analyses are recomputed
+    VERSION = "vader-1"
+    
     def __init__(self):
         self.analyzer = SentimentIntensityAnalyzer()
     
@@ -17,7 +21,16 @@ class SentimentAnalyzer:
                 'label': str ('positive', 'negative', 'neutral')
             }
         """
-        scores = self.analyzer.polarity_scores(text)
+        return self.analyze_preprocessed(PreprocessedText(text))
+    
+    def analyze_preprocessed(self, doc: PreprocessedText) -> dict:
+        """
+        Analyze sentiment from a PreprocessedText (see analyze()).
+        
+        VADER reads the original-case text, since capitalization is one of
+        its intensity cues.
+        """
+        scores = self.analyzer.polarity_scores(doc.text)
         compound_score = scores['compound']
         
         # Classify sentiment
@@ -37,6 +50,18 @@ class SentimentAnalyzer:
                 'neutral': round(scores['neu'], 2)
             }
         }
+    
+    def analyze_batch(self, texts: list) -> list:
+        """
+        Analyze sentiment for a batch of texts.
+        
+        Args:
+            texts: Raw texts or PreprocessedText instances
+        
+        Returns:
+            list: One analyze() result per text, in input order
+        """
+        return [self.analyze_preprocessed(preprocess(text)) for text in texts]
 
 
 # Singleton instance
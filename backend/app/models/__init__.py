@@ -3,5 +3,7 @@ from app.models.mood import MoodEntry
 from app.models.journal import JournalEntry
 from app.models.analysis import AIAnalysis
 from app.models.crisis import CrisisLog
+from app.models.outbox import VectorOutbox, SyncWatermark
+from app.models.checkpoint import JobCheckpoint
 
-__all__ = ["User", "MoodEntry", "JournalEntry", "AIAnalysis", "CrisisLog"]
+__all__ = ["User", "MoodEntry", "JournalEntry", "AIAnalysis", "CrisisLog", "VectorOutbox", "SyncWatermark", "JobCheckpoint"]
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, BigInteger, DateTime
+from datetime import datetime
+from app.database import Base
+
+
+class JobCheckpoint(Base):
+    """Resume point of a long-running batch job."""
+    __tablename__ = "job_checkpoints"
+    
+    name = Column(String(100), primary_key=True)
+    cursor = Column(String(64))  # Last key processed (keyset pagination)
+    processed = Column(BigInteger, nullable=False, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f"<JobCheckpoint {self.name} @ {self.cursor}>"
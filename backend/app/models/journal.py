@@ -1,8 +1,9 @@
 import uuid
-from sqlalchemy import Column, String, Text, Integer, DateTime, Date, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, Date, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
 from app.database import Base
+from app.models.types import EncryptedText
 
 
 class JournalEntry(Base):
@@ -11,7 +12,7 @@ class JournalEntry(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     title = Column(String(255))
-    content = Column(Text, nullable=False)
+    content = Column(EncryptedText, nullable=False)  # Encrypted at rest when ENCRYPTION_MASTER_KEY is set
     word_count = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,79 @@
+import uuid
+from sqlalchemy import Column, String, BigInteger, DateTime, event, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Session
+from datetime import datetime
+from app.database import Base
+from app.models.journal import JournalEntry
+from app.models.analysis import AIAnalysis
+
+
+class VectorOutbox(Base):
+    """
+    Change log of journal entries whose vector index entry is out of date.
+    
+    Rows are written in the same transaction as the journal change (see
+    record_journal_changes) and consumed in id order by the
+    sync_vector_index task. No foreign keys, so deletions are kept too.
+    
+    Rows are consumed in (txid, id) order, where txid is the id of the
+    writing transaction. Unlike the id alone, that order is safe against
+    commit order: once a transaction is older than every running one, no
+    row can still appear before it.
+    """
+    __tablename__ = "vector_outbox"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    txid = Column(BigInteger, nullable=False, server_default=text("(pg_current_xact_id()::text)::bigint"))
+    journal_id = Column(UUID(as_uuid=True), nullable=False)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    operation = Column(String(10), nullable=False)  # 'upsert' or 'delete'
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f"<VectorOutbox {self.id} {self.operation} {self.journal_id}>"
+
+
+class SyncWatermark(Base):
+    """Highest change-log (txid, id) a consumer has applied."""
+    __tablename__ = "sync_watermarks"
+    
+    name = Column(String(50), primary_key=True)
+    txid = Column(BigInteger, nullable=False, default=0, server_default="0")
+    position = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<SyncWatermark {self.name} @ {self.txid}/{self.position}>"
+
+
+@event.listens_for(Session, "before_flush")
+def record_journal_changes(session, flush_context, instances):
+    """
+    Queue vector index updates for journal entries changed in this flush.
+    
+    New, modified and deleted entries are logged, as are new or modified
+    analyses, whose labels are stored as index metadata. Bulk statements
+    (session.execute(delete(...))) bypass the ORM and are not logged.
+    """
+    changes = {}
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, JournalEntry):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            if obj.id is None:
+                obj.id = uuid.uuid4()
+            changes[obj.id] = (obj.user_id, "upsert")
+        elif isinstance(obj, AIAnalysis) and obj.journal_id is not None:
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            changes.setdefault(obj.journal_id, (obj.user_id, "upsert"))
+    
+    for obj in session.deleted:
+        if isinstance(obj, JournalEntry):
+            changes[obj.id] = (obj.user_id, "delete")
+    
+    session.add_all(
+        VectorOutbox(journal_id=journal_id, user_id=user_id, operation=operation)
+        for journal_id, (user_id, operation) in changes.items()
+    )
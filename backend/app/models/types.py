@@ -0,0 +1,25 @@
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+from app.services.encryption_service import content_keyring
+
+
+class EncryptedText(TypeDecorator):
+    """
+    Text encrypted at rest with the content keyring.
+    
+    Values are encrypted on write under the current master key and
+    decrypted on read, so the application only sees plaintext. The column
+    stays TEXT, holding plaintext rows from before encryption was enabled
+    until rotate_journal_encryption has migrated them. A value that cannot
+    be decrypted raises UndecryptableContent: passing the ciphertext on
+    would show it as content and let a later save seal it a second time,
+    losing the entry for good.
+    """
+    impl = Text
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return content_keyring.seal(value)
+    
+    def process_result_value(self, value, dialect):
+        return content_keyring.open(value)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime, date
 import uuid
 
@@ -29,3 +29,11 @@ class JournalListResponse(BaseModel):
     entries: list[JournalEntryResponse]
     total: int
     page: int
+
+
+class AskPastSelfRequest(BaseModel):
+    question: str = Field(min_length=1, max_length=1000)
+    n_context: int = Field(5, ge=1, le=20)
+    start_date: date | None = None
+    end_date: date | None = None
+    filters: dict[str, str | list[str]] | None = None
@@ -1,4 +1,10 @@
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from sqlalchemy import select, delete, exists, update, bindparam
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal
 from app.models.journal import JournalEntry
 from app.models.analysis import AIAnalysis
 from app.models.crisis import CrisisLog
@@ -6,50 +12,214 @@ from app.ml import (
     sentiment_analyzer,
     emotion_classifier,
     crisis_detector,
-    reflection_generator
+    reflection_generator,
+    PreprocessedText
 )
+from app.services.analysis_cache import analysis_cache
+from app.services.cache_service import cache_service, CacheNamespace
+from app.services.single_flight import SingleFlight
+from app.config import get_settings
+
+settings = get_settings()
+
+# Bounded pool for the CPU-bound analyzers so they never run on the event loop
+analysis_executor = ThreadPoolExecutor(
+    max_workers=settings.ANALYSIS_MAX_WORKERS,
+    thread_name_prefix="analysis"
+)
+
+# Coalesces duplicate analysis requests for the same journal entry
+analysis_flight = SingleFlight("analysis", lock=cache_service.hold_lock)
+
+CRISIS_RESOURCES = [
+    "National Suicide Prevention Lifeline: 988",
+    "Crisis Text Line: Text HOME to 741741"
+]
 
 
 class AIService:
     """Service for AI analysis of journal entries."""
     
     @staticmethod
-    async def analyze_journal_entry(
-        journal_entry: JournalEntry,
-        db: AsyncSession
-    ) -> AIAnalysis:
+    def _stage_keys(stage: str, analyzer, docs: list) -> list:
+        """Analysis cache keys for one analyzer stage."""
+        return [analysis_cache.make_key(stage, analyzer.VERSION, doc.text) for doc in docs]
+    
+    @staticmethod
+    def _reflection_args(content: str, sentiment_result: dict, emotion_result: dict, crisis_result: dict) -> dict:
+        """Reflection generator arguments for one entry."""
+        return {
+            'journal_content': content,
+            'primary_emotion': emotion_result['primary'],
+            'sentiment_label': sentiment_result['label'],
+            'stress_level': crisis_result['stress_level'],
+            'crisis_detected': crisis_result['crisis_detected']
+        }
+    
+    @staticmethod
+    def _reflection_key(args: dict) -> str:
+        """Analysis cache key for a reflection, which also depends on the detected context."""
+        return analysis_cache.make_key(
+            'reflection',
+            reflection_generator.version,
+            args['journal_content'],
+            args['primary_emotion'],
+            args['sentiment_label'],
+            args['stress_level']
+        )
+    
+    @staticmethod
+    def _run_stage(stage: str, analyzer, docs: list) -> list:
+        """Run one analyzer over docs, skipping cached entries (sync Redis client)."""
+        keys = AIService._stage_keys(stage, analyzer, docs)
+        results = [analysis_cache.get_sync(stage, key) for key in keys]
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = analyzer.analyze_batch([docs[i] for i in missing])
+            for i, result in zip(missing, computed):
+                results[i] = result
+                analysis_cache.set_sync(keys[i], result)
+        
+        return results
+    
+    @staticmethod
+    async def _run_stage_async(stage: str, analyzer, docs: list) -> list:
+        """Run one analyzer over docs on the analysis pool, skipping cached entries."""
+        keys = AIService._stage_keys(stage, analyzer, docs)
+        results = list(await asyncio.gather(*(analysis_cache.get(stage, key) for key in keys)))
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            loop = asyncio.get_running_loop()
+            computed = await loop.run_in_executor(
+                analysis_executor, analyzer.analyze_batch, [docs[i] for i in missing]
+            )
+            for i, result in zip(missing, computed):
+                results[i] = result
+            await asyncio.gather(*(analysis_cache.set(keys[i], results[i]) for i in missing))
+        
+        return results
+    
+    @staticmethod
+    def _generate_reflection(args: dict) -> dict:
+        """Generate a reflection, reusing a cached one for identical input."""
+        # The crisis override is static, so it is never cached
+        if args['crisis_detected']:
+            return reflection_generator.generate(**args)
+        
+        key = AIService._reflection_key(args)
+        result = analysis_cache.get_sync('reflection', key)
+        if result is None:
+            result = reflection_generator.generate(**args)
+            if not reflection_generator.is_fallback(result):
+                analysis_cache.set_sync(key, result)
+        
+        return result
+    
+    @staticmethod
+    async def _generate_reflection_async(args: dict) -> dict:
+        """Async variant of _generate_reflection() backed by both cache tiers."""
+        if args['crisis_detected']:
+            return await reflection_generator.generate_async(**args)
+        
+        key = AIService._reflection_key(args)
+        result = await analysis_cache.get('reflection', key)
+        if result is None:
+            result = await reflection_generator.generate_async(**args)
+            if not reflection_generator.is_fallback(result):
+                await analysis_cache.set(key, result)
+        
+        return result
+    
+    @staticmethod
+    def run_pipeline_batch(contents: list) -> list:
         """
-        Perform complete AI analysis on a journal entry.
+        Run sentiment, emotion, crisis and reflection stages over many texts.
+        
+        Stage results are memoized by content hash in both tiers of the
+        analysis cache, through its sync Redis client.
         
         Args:
-            journal_entry: JournalEntry instance
-            db: Database session
+            contents: Journal texts
         
         Returns:
-            AIAnalysis instance
+            list of dicts with 'sentiment', 'emotion', 'crisis' and
+            'reflection' results, in input order
         """
-        content = journal_entry.content
+        # Normalize each text once and share it across analyzers
+        docs = [PreprocessedText(content) for content in contents]
         
-        # 1. Sentiment Analysis
-        sentiment_result = sentiment_analyzer.analyze(content)
+        sentiment_results = AIService._run_stage('sentiment', sentiment_analyzer, docs)
+        emotion_results = AIService._run_stage('emotion', emotion_classifier, docs)
+        crisis_results = AIService._run_stage('crisis', crisis_detector, docs)
         
-        # 2. Emotion Classification
-        emotion_result = emotion_classifier.analyze(content)
+        results = []
+        for content, sentiment_result, emotion_result, crisis_result in zip(
+            contents, sentiment_results, emotion_results, crisis_results
+        ):
+            reflection_result = AIService._generate_reflection(
+                AIService._reflection_args(content, sentiment_result, emotion_result, crisis_result)
+            )
+            results.append({
+                'sentiment': sentiment_result,
+                'emotion': emotion_result,
+                'crisis': crisis_result,
+                'reflection': reflection_result
+            })
         
-        # 3. Crisis Detection
-        crisis_result = crisis_detector.detect(content)
+        return results
+    
+    @staticmethod
+    async def run_pipeline_batch_async(contents: list) -> list:
+        """
+        Non-blocking variant of run_pipeline_batch() for the API.
         
-        # 4. Generate AI Reflection (unless crisis)
-        reflection_result = reflection_generator.generate(
-            journal_content=content,
-            primary_emotion=emotion_result['primary'],
-            sentiment_label=sentiment_result['label'],
-            stress_level=crisis_result['stress_level'],
-            crisis_detected=crisis_result['crisis_detected']
+        Sentiment, emotion and crisis stages run concurrently on the
+        analysis thread pool; reflections are requested concurrently through
+        the async OpenAI client. Every stage is memoized in both tiers of
+        the analysis cache.
+        """
+        docs = [PreprocessedText(content) for content in contents]
+        
+        sentiment_results, emotion_results, crisis_results = await asyncio.gather(
+            AIService._run_stage_async('sentiment', sentiment_analyzer, docs),
+            AIService._run_stage_async('emotion', emotion_classifier, docs),
+            AIService._run_stage_async('crisis', crisis_detector, docs)
         )
         
-        # 5. Create AI Analysis record
-        analysis = AIAnalysis(
+        reflection_results = await asyncio.gather(*(
+            AIService._generate_reflection_async(
+                AIService._reflection_args(content, sentiment_result, emotion_result, crisis_result)
+            )
+            for content, sentiment_result, emotion_result, crisis_result in zip(
+                contents, sentiment_results, emotion_results, crisis_results
+            )
+        ))
+        
+        return [
+            {
+                'sentiment': sentiment_result,
+                'emotion': emotion_result,
+                'crisis': crisis_result,
+                'reflection': reflection_result
+            }
+            for sentiment_result, emotion_result, crisis_result, reflection_result in zip(
+                sentiment_results, emotion_results, crisis_results, reflection_results
+            )
+        ]
+    
+    @staticmethod
+    def build_analysis(journal_entry: JournalEntry, result: dict) -> AIAnalysis:
+        """Create the AIAnalysis record for one pipeline result."""
+        sentiment_result = result['sentiment']
+        emotion_result = result['emotion']
+        crisis_result = result['crisis']
+        reflection_result = result['reflection']
+        
+        return AIAnalysis(
+            # Assigned up front so crisis logs can reference it before a flush
+            id=uuid.uuid4(),
             user_id=journal_entry.user_id,
             journal_id=journal_entry.id,
             
@@ -75,29 +245,195 @@ class AIService:
             
             model_version=reflection_result['model_version']
         )
+    
+    @staticmethod
+    def build_crisis_log(
+        journal_entry: JournalEntry,
+        analysis: AIAnalysis,
+        result: dict
+    ) -> Optional[CrisisLog]:
+        """Create the CrisisLog record for an analysis, if crisis was detected."""
+        crisis_result = result['crisis']
+        if not crisis_result['crisis_detected']:
+            return None
         
+        return CrisisLog(
+            user_id=journal_entry.user_id,
+            journal_id=journal_entry.id,
+            analysis_id=analysis.id,
+            detected_patterns=crisis_result['detected_patterns'],
+            severity_level=crisis_result['severity'],
+            flagged_content=journal_entry.content[:100] + "...",  # Redacted excerpt
+            resources_shown=CRISIS_RESOURCES
+        )
+    
+    # Points an entry's existing crisis log at its replacement analysis
+    RELINK_CRISIS_LOG = (
+        update(CrisisLog.__table__)
+        .where(CrisisLog.__table__.c.journal_id == bindparam("log_journal_id"))
+        .values(analysis_id=bindparam("new_analysis_id"))
+    )
+    
+    @staticmethod
+    def batch_entries_query(journal_ids: list, user_id=None, reanalyze: bool = False):
+        """Entries of a batch to analyze (only unanalyzed ones unless reanalyzing)."""
+        query = select(JournalEntry).where(JournalEntry.id.in_(journal_ids))
+        if user_id is not None:
+            query = query.where(JournalEntry.user_id == user_id)
+        if not reanalyze:
+            query = query.where(~exists().where(AIAnalysis.journal_id == JournalEntry.id))
+        return query
+    
+    @staticmethod
+    def logged_journals_query(journal_ids: list):
+        """Ids among journal_ids that already have a crisis log."""
+        return select(CrisisLog.journal_id).where(CrisisLog.journal_id.in_(journal_ids)).distinct()
+    
+    @staticmethod
+    def delete_analyses_statement(journal_ids: list):
+        """Remove the analyses a re-analysis replaces."""
+        return delete(AIAnalysis).where(AIAnalysis.journal_id.in_(journal_ids))
+    
+    @staticmethod
+    def build_batch_records(entries: list, results: list, logged_journal_ids: set) -> tuple:
+        """
+        Create the records for a batch of pipeline results.
+        
+        Crisis logs are safety records of what a user was shown, so an entry
+        that already has one keeps it (re-linked to the new analysis)
+        instead of being logged again.
+        
+        Returns:
+            tuple: (analyses, new crisis logs, RELINK_CRISIS_LOG parameters)
+        """
+        analyses = [AIService.build_analysis(e, r) for e, r in zip(entries, results)]
+        crisis_logs = []
+        relinks = []
+        for entry, analysis, result in zip(entries, analyses, results):
+            if entry.id in logged_journal_ids:
+                relinks.append({"log_journal_id": entry.id, "new_analysis_id": analysis.id})
+                continue
+            crisis_log = AIService.build_crisis_log(entry, analysis, result)
+            if crisis_log:
+                crisis_logs.append(crisis_log)
+        return analyses, crisis_logs, relinks
+    
+    @staticmethod
+    async def analyze_journal_entry(
+        journal_entry: JournalEntry,
+        db: AsyncSession
+    ) -> AIAnalysis:
+        """
+        Perform complete AI analysis on a journal entry.
+        
+        Args:
+            journal_entry: JournalEntry instance
+            db: Database session
+        
+        Returns:
+            AIAnalysis instance
+        """
+        # 1-4. Sentiment, emotion, crisis and reflection
+        result = (await AIService.run_pipeline_batch_async([journal_entry.content]))[0]
+        
+        # 5. Create AI Analysis record
+        analysis = AIService.build_analysis(journal_entry, result)
         db.add(analysis)
+        await db.flush()
         
         # 6. Log crisis if detected
-        if crisis_result['crisis_detected']:
-            crisis_log = CrisisLog(
-                user_id=journal_entry.user_id,
-                journal_id=journal_entry.id,
-                analysis_id=analysis.id,
-                detected_patterns=crisis_result['detected_patterns'],
-                severity_level=crisis_result['severity'],
-                flagged_content=content[:100] + "...",  # Redacted excerpt
-                resources_shown=[
-                    "National Suicide Prevention Lifeline: 988",
-                    "Crisis Text Line: Text HOME to 741741"
-                ]
-            )
+        crisis_log = AIService.build_crisis_log(journal_entry, analysis, result)
+        if crisis_log:
             db.add(crisis_log)
         
         await db.commit()
         await db.refresh(analysis)
         
+        # Listings show whether each entry has been analyzed
+        await cache_service.invalidate_namespace(CacheNamespace.journal_list(journal_entry.user_id))
+        
         return analysis
+    
+    @staticmethod
+    async def analyze_journal_entry_once(journal_id) -> tuple:
+        """
+        Analyze a journal entry unless it already has an analysis.
+        
+        Duplicate concurrent calls for the same entry (double submits,
+        client retries) share one pipeline run in this process and wait
+        for each other across workers. The shared run may outlive the
+        request that started it, so it works in its own session rather
+        than any caller's.
+        
+        Args:
+            journal_id: Journal entry ID (ownership checked by the caller)
+        
+        Returns:
+            tuple: (detached AIAnalysis, or None if the entry no longer
+            exists; whether it was created by this flight)
+        """
+        async def analyze_if_missing() -> tuple:
+            async with AsyncSessionLocal() as db:
+                existing_result = await db.execute(
+                    select(AIAnalysis).where(AIAnalysis.journal_id == journal_id)
+                )
+                existing = existing_result.scalar_one_or_none()
+                if existing:
+                    return existing, False
+                
+                journal_entry = await db.get(JournalEntry, journal_id)
+                if journal_entry is None:
+                    return None, False
+                return await AIService.analyze_journal_entry(journal_entry, db), True
+        
+        return await analysis_flight.do(str(journal_id), analyze_if_missing)
+    
+    @staticmethod
+    async def analyze_batch(
+        journal_ids: list,
+        db: AsyncSession,
+        user_id: Optional[str] = None,
+        reanalyze: bool = False
+    ) -> list:
+        """
+        Analyze many journal entries with one fetch, one bulk insert per
+        table and a single commit.
+        
+        Args:
+            journal_ids: Journal entry IDs to analyze
+            db: Database session
+            user_id: Restrict to entries owned by this user
+            reanalyze: Replace existing analyses instead of skipping
+                entries that already have one
+        
+        Returns:
+            List of new AIAnalysis instances
+        """
+        result = await db.execute(AIService.batch_entries_query(journal_ids, user_id, reanalyze))
+        entries = result.scalars().all()
+        if not entries:
+            return []
+        
+        entry_ids = [e.id for e in entries]
+        logged = set((await db.execute(AIService.logged_journals_query(entry_ids))).scalars())
+        if reanalyze:
+            await db.execute(AIService.delete_analyses_statement(entry_ids))
+        
+        results = await AIService.run_pipeline_batch_async([e.content for e in entries])
+        
+        analyses, crisis_logs, relinks = AIService.build_batch_records(entries, results, logged)
+        db.add_all(analyses)
+        await db.flush()
+        db.add_all(crisis_logs)
+        if relinks:
+            await db.execute(AIService.RELINK_CRISIS_LOG, relinks)
+        
+        await db.commit()
+        
+        for entry_user_id in {e.user_id for e in entries}:
+            await cache_service.invalidate_namespace(CacheNamespace.journal_list(entry_user_id))
+        
+        return analyses
 
 
 # Singleton instance
@@ -0,0 +1,214 @@
+"""
+Content-Addressed Analysis Cache for NeuroLeaf
+Memoizes each stage of the journal analysis pipeline by content hash.
+"""
+
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Optional
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+from app.config import get_settings
+from app.services.cache_service import CacheTTL, RedisBackoff, redis_pool_options
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class AnalysisCache:
+    """
+    Two-tier memo cache for analysis stage results.
+    
+    Keys combine the stage name, the analyzer/model version and a SHA-256 of
+    the normalized entry text, so identical content (re-saves, task retries,
+    backfills) reuses earlier results and a version bump invalidates them.
+    Lookups hit a bounded in-process LRU first, then Redis.
+    
+    The shared tier lives under its own key prefix, outside CacheService's
+    versioned namespaces: keys are content-addressed and versioned, so
+    entries never need invalidating and simply expire. Like EmbeddingCache
+    it has a sync client (Celery tasks, including retries that land on
+    another worker) and an async client (API), and Redis errors degrade to
+    misses with a REDIS_RETRY_INTERVAL backoff.
+    """
+    
+    KEY_PREFIX = "neuroleaf-analysis"
+    
+    def __init__(self, max_entries: int = 2048, ttl_seconds: int = CacheTTL.AI_ANALYSIS):
+        self._local: OrderedDict = OrderedDict()
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._stats: dict = {}
+        self._client: Optional["redis.Redis"] = None
+        self._async_client: Optional["aioredis.Redis"] = None
+        self._backoff = RedisBackoff("Analysis cache")
+        self._initialize()
+    
+    def _initialize(self):
+        """Configure sync and async Redis clients (connections open on first use)."""
+        if not REDIS_AVAILABLE:
+            logger.warning("Redis package not installed. Analysis cache is in-process only.")
+            return
+        
+        redis_url = getattr(settings, 'REDIS_URL', None)
+        if not redis_url:
+            logger.warning("REDIS_URL not configured. Analysis cache is in-process only.")
+            return
+        
+        try:
+            self._client = redis.Redis(
+                connection_pool=redis.BlockingConnectionPool.from_url(
+                    redis_url, **redis_pool_options(decode_responses=True)
+                )
+            )
+            self._async_client = aioredis.Redis(
+                connection_pool=aioredis.BlockingConnectionPool.from_url(
+                    redis_url, **redis_pool_options(decode_responses=True)
+                )
+            )
+        except (redis.RedisError, ValueError) as e:
+            logger.warning(f"Analysis cache configuration failed: {e}. Using the in-process tier only.")
+            self._client = None
+            self._async_client = None
+    
+    async def close(self):
+        """Close pooled Redis connections."""
+        # Clients built on an explicit pool leave it open on close
+        if self._client:
+            self._client.connection_pool.disconnect()
+        if self._async_client:
+            await self._async_client.connection_pool.disconnect()
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normalize entry text for hashing.
+        
+        Only surrounding whitespace is dropped: every analyzer gives the same
+        result without it, while case and inner whitespace can matter.
+        """
+        return text.strip()
+    
+    def make_key(self, stage: str, version: str, text: str, *context: Any) -> str:
+        """
+        Build the cache key for one stage result.
+        
+        Args:
+            stage: Pipeline stage ('sentiment', 'emotion', ...)
+            version: Analyzer or model version
+            text: Entry text
+            context: Extra inputs the stage result depends on
+        """
+        digest = hashlib.sha256(self.normalize(text).encode('utf-8'))
+        for part in context:
+            digest.update(b'\0' + str(part).encode('utf-8'))
+        return f"{stage}:{version}:{digest.hexdigest()}"
+    
+    def _record(self, stage: str, outcome: str):
+        """Increment a hit/miss counter for a stage."""
+        counters = self._stats.setdefault(stage, {"local_hits": 0, "shared_hits": 0, "misses": 0})
+        counters[outcome] += 1
+    
+    def _remember(self, key: str, value: Any):
+        """Store a value in the in-process LRU tier."""
+        self._local[key] = value
+        self._local.move_to_end(key)
+        while len(self._local) > self._max_entries:
+            self._local.popitem(last=False)
+    
+    def _redis_key(self, key: str) -> str:
+        """Redis key of a stage result."""
+        return f"{self.KEY_PREFIX}:{key}"
+    
+    def _lookup_local(self, stage: str, key: str) -> Optional[Any]:
+        """Look up the in-process tier, counting a hit."""
+        value = self._local.get(key)
+        if value is not None:
+            self._local.move_to_end(key)
+            self._record(stage, "local_hits")
+        return value
+    
+    def _shared_result(self, stage: str, key: str, raw: Optional[str]) -> Optional[Any]:
+        """Decode a shared-tier read, promoting hits to the in-process tier."""
+        if raw is None:
+            self._record(stage, "misses")
+            return None
+        value = json.loads(raw)
+        self._remember(key, value)
+        self._record(stage, "shared_hits")
+        return value
+    
+    def get_sync(self, stage: str, key: str) -> Optional[Any]:
+        """Look up a stage result in the in-process tier, then Redis (sync callers)."""
+        value = self._lookup_local(stage, key)
+        if value is not None:
+            return value
+        
+        raw = None
+        if self._client and not self._backoff.active:
+            try:
+                raw = self._client.get(self._redis_key(key))
+            except redis.RedisError as e:
+                self._backoff.failed("GET", e)
+        return self._shared_result(stage, key, raw)
+    
+    def set_sync(self, key: str, value: Any):
+        """Store a stage result in both tiers (sync callers)."""
+        self._remember(key, value)
+        if self._client and not self._backoff.active:
+            try:
+                self._client.setex(self._redis_key(key), self._ttl_seconds, json.dumps(value))
+            except redis.RedisError as e:
+                self._backoff.failed("SET", e)
+    
+    async def get(self, stage: str, key: str) -> Optional[Any]:
+        """Look up a stage result in the in-process tier, then Redis."""
+        value = self._lookup_local(stage, key)
+        if value is not None:
+            return value
+        
+        raw = None
+        if self._async_client and not self._backoff.active:
+            try:
+                raw = await self._async_client.get(self._redis_key(key))
+            except redis.RedisError as e:
+                self._backoff.failed("GET", e)
+        return self._shared_result(stage, key, raw)
+    
+    async def set(self, key: str, value: Any):
+        """Store a stage result in both tiers."""
+        self._remember(key, value)
+        if self._async_client and not self._backoff.active:
+            try:
+                await self._async_client.setex(self._redis_key(key), self._ttl_seconds, json.dumps(value))
+            except redis.RedisError as e:
+                self._backoff.failed("SET", e)
+    
+    def stats(self) -> dict:
+        """Per-stage hit/miss counters and in-process tier occupancy."""
+        stages = {}
+        for stage, counters in self._stats.items():
+            lookups = sum(counters.values())
+            hits = counters["local_hits"] + counters["shared_hits"]
+            stages[stage] = {
+                **counters,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+        
+        return {
+            "stages": stages,
+            "local_entries": len(self._local),
+            "local_max_entries": self._max_entries,
+        }
+
+
+# Singleton instance
+analysis_cache = AnalysisCache(max_entries=settings.ANALYSIS_CACHE_MAX_ENTRIES)
@@ -3,35 +3,217 @@ Redis Caching Service for NeuroLeaf
 Provides high-performance caching for frequently accessed data.
 """
 
+import asyncio
 import json
 import logging
-from typing import Any, Optional
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
 from datetime import timedelta
 
 try:
     import redis
+    import redis.asyncio as aioredis
     REDIS_AVAILABLE = True
 except ImportError:
     REDIS_AVAILABLE = False
 
 from app.config import get_settings
+from app.services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+def redis_pool_options(**overrides) -> dict:
+    """
+    Connection pool settings shared by every NeuroLeaf Redis pool.
+    
+    Pass them to BlockingConnectionPool.from_url() (sync or asyncio), so
+    callers wait for a free connection instead of failing.
+    """
+    return {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+        **overrides,
+    }
+
+
+class RedisBackoff:
+    """
+    Error backoff for a Redis-backed service.
+    
+    After a Redis error the service stops calling Redis for
+    REDIS_RETRY_INTERVAL seconds and serves its fallback instead of
+    waiting on a struggling server for every request.
+    """
+    
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Service name used in log messages
+        """
+        self.name = name
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+    
+    @property
+    def active(self) -> bool:
+        """Whether the service is currently backing off."""
+        return time.monotonic() < self.retry_at
+    
+    def failed(self, operation: str, error: Exception):
+        """Log a Redis error and back off until the retry interval passes."""
+        logger.warning(f"{self.name} Redis {operation} error: {error}")
+        self.last_error = f"{operation}: {error}"
+        self.retry_at = time.monotonic() + settings.REDIS_RETRY_INTERVAL
+    
+    def reset(self):
+        """Clear the backoff after Redis answered again."""
+        self.retry_at = 0.0
+        self.last_error = None
+
+
+class MemoryCache:
+    """
+    Bounded in-process cache with per-key TTL and LRU eviction.
+    
+    Entries are evicted least-recently-used first once either the entry
+    count or the approximate byte size (serialized JSON length) exceeds its
+    limit. Keys are tracked per namespace so a namespace can be invalidated
+    without scanning the whole cache.
+    """
+    
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self._entries: OrderedDict = OrderedDict()  # (namespace, key) -> (value, expires_at, size)
+        self._namespaces: dict = {}  # namespace -> set of keys
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _remove(self, namespace: str, key: str):
+        """Drop one entry and its namespace bookkeeping."""
+        _, _, size = self._entries.pop((namespace, key))
+        self._bytes -= size
+        keys = self._namespaces[namespace]
+        keys.discard(key)
+        if not keys:
+            del self._namespaces[namespace]
+    
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return a live value and mark it recently used, or None."""
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return None
+        
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(namespace, key)
+            return None
+        
+        self._entries.move_to_end((namespace, key))
+        return value
+    
+    def set(self, namespace: str, key: str, value: Any, ttl_seconds: int, size: int):
+        """Store a value, evicting least-recently-used entries to stay within limits."""
+        if (namespace, key) in self._entries:
+            self._remove(namespace, key)
+        
+        if size > self._max_bytes:
+            return
+        
+        self._entries[(namespace, key)] = (value, time.monotonic() + ttl_seconds, size)
+        self._namespaces.setdefault(namespace, set()).add(key)
+        self._bytes += size
+        
+        while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+            oldest_namespace, oldest_key = next(iter(self._entries))
+            self._remove(oldest_namespace, oldest_key)
+    
+    def delete(self, namespace: str, key: str) -> bool:
+        """Remove a key; returns whether it was present."""
+        if (namespace, key) not in self._entries:
+            return False
+        self._remove(namespace, key)
+        return True
+    
+    def invalidate_namespace(self, namespace: str) -> int:
+        """Remove every key in a namespace; returns the number removed."""
+        keys = self._namespaces.pop(namespace, set())
+        for key in keys:
+            _, _, size = self._entries.pop((namespace, key))
+            self._bytes -= size
+        return len(keys)
+    
+    def clear(self):
+        """Remove every entry."""
+        self._entries.clear()
+        self._namespaces.clear()
+        self._bytes = 0
+
+
 class CacheService:
     """
     Redis-based caching service with fallback to in-memory cache.
+    
+    Uses the asyncio Redis client over one shared, bounded connection pool,
+    so cache calls never block the event loop. After a Redis error the
+    service serves from memory for REDIS_RETRY_INTERVAL seconds instead of
+    waiting on a struggling server for every request.
+    
+    Values read from Redis are also kept in a short-lived in-process
+    near-cache, saving the round trip and JSON decode for hot keys. Writes
+    and deletes are broadcast on a pub/sub channel so every worker evicts its
+    near-cache copy; the near-cache is only used while this process is
+    subscribed. Cached values are shared between callers and must not be
+    mutated.
+    
+    Redis keys embed a per-namespace generation, so invalidating a namespace
+    is a single INCR rather than a blocking KEYS scan on the server that
+    also brokers Celery tasks. Keys from retired generations simply stop
+    being read; they expire on their TTL or are removed earlier by an
+    incremental SCAN reaper.
     """
     
+    INVALIDATION_CHANNEL = "neuroleaf:invalidate"
+    # neuroleaf:<namespace>:v<generation>:<key> (keys may contain colons)
+    VERSIONED_KEY_PATTERN = re.compile(r"^neuroleaf:([^:]+):v(\d+):")
+    # Bookkeeping keys sit outside the "neuroleaf:" prefix the reaper scans
+    GENERATION_KEY_PREFIX = "neuroleaf-meta:generation"
+    REAPER_LOCK_KEY = "neuroleaf-meta:reaper-lock"
+    LOCK_KEY_PREFIX = "neuroleaf-meta:lock"
+    
     def __init__(self):
-        self._redis_client: Optional[redis.Redis] = None
-        self._memory_cache: dict = {}
+        self._redis_pool: Optional["aioredis.BlockingConnectionPool"] = None
+        self._redis_client: Optional["aioredis.Redis"] = None
+        self._backoff = RedisBackoff("Cache")
+        self._memory_cache = MemoryCache(
+            max_entries=settings.MEMORY_CACHE_MAX_ENTRIES,
+            max_bytes=settings.MEMORY_CACHE_MAX_BYTES
+        )
+        self._near_cache = MemoryCache(
+            max_entries=settings.NEAR_CACHE_MAX_ENTRIES,
+            max_bytes=settings.NEAR_CACHE_MAX_BYTES
+        )
+        self._near_cache_active = False
+        self._near_cache_generation = 0  # Bumped on every eviction
+        self._namespace_generations: dict = {}  # Valid only while the near-cache is active
+        self._background_tasks: list = []
+        self._loads = SingleFlight("cache-fill", lock=self.hold_lock)
+        self._instance_id = uuid.uuid4().hex
         self._initialize_redis()
     
     def _initialize_redis(self):
-        """Initialize Redis connection."""
+        """Configure the Redis connection pool (connections open on first use)."""
         if not REDIS_AVAILABLE:
             logger.warning("Redis package not installed. Using in-memory cache.")
             return
@@ -42,22 +224,177 @@ class CacheService:
             return
         
         try:
-            self._redis_client = redis.from_url(
-                redis_url,
-                decode_responses=True,
-                socket_timeout=5,
-                socket_connect_timeout=5,
+            self._redis_pool = aioredis.BlockingConnectionPool.from_url(
+                redis_url, **redis_pool_options(decode_responses=True)
             )
-            # Test connection
-            self._redis_client.ping()
-            logger.info("Redis cache initialized successfully")
-        except redis.RedisError as e:
-            logger.warning(f"Redis connection failed: {e}. Falling back to in-memory cache.")
+            self._redis_client = aioredis.Redis(connection_pool=self._redis_pool)
+            logger.info("Redis cache pool configured")
+        except (redis.RedisError, ValueError) as e:
+            logger.warning(f"Redis configuration failed: {e}. Falling back to in-memory cache.")
+            self._redis_pool = None
             self._redis_client = None
     
-    def _make_key(self, namespace: str, key: str) -> str:
-        """Create a namespaced cache key."""
-        return f"neuroleaf:{namespace}:{key}"
+    def _redis(self) -> Optional["aioredis.Redis"]:
+        """Redis client, or None if unconfigured or backing off after an error."""
+        if self._redis_client and not self._backoff.active:
+            return self._redis_client
+        return None
+    
+    async def health_check(self) -> bool:
+        """
+        Ping Redis.
+        
+        Returns:
+            True if Redis is reachable (clears any error backoff)
+        """
+        if not self._redis_client:
+            return False
+        
+        try:
+            await self._redis_client.ping()
+            self._backoff.reset()
+            return True
+        except redis.RedisError as e:
+            self._backoff.failed("PING", e)
+            return False
+    
+    def status(self) -> dict:
+        """
+        Connection state as of the last Redis call, without a round trip.
+        
+        Cheap enough for every liveness probe: while Redis is down the
+        service backs off and serves from memory, so a probe should report
+        that rather than wait out another socket timeout.
+        """
+        return {
+            "backend": "redis" if self._redis() else "memory",
+            "near_cache": self._near_cache_active,
+            "last_error": self._backoff.last_error if self._backoff.active else None,
+        }
+    
+    def start_background_tasks(self):
+        """Start the invalidation listener (enabling the near-cache) and the key reaper."""
+        if self._redis_client and not self._background_tasks:
+            self._background_tasks = [
+                asyncio.create_task(self._listen_for_invalidations()),
+                asyncio.create_task(self._reap_periodically()),
+            ]
+    
+    async def close(self):
+        """Stop background tasks and close all pooled Redis connections."""
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks = []
+        
+        if self._redis_client:
+            await self._redis_client.aclose()
+            # A client built on an explicit pool leaves it open
+            await self._redis_pool.disconnect()
+    
+    async def _listen_for_invalidations(self):
+        """Apply invalidations published by other workers, resubscribing after errors."""
+        while True:
+            pubsub = self._redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.INVALIDATION_CHANNEL)
+                # Generations recorded before subscribing may have been bumped since
+                self._namespace_generations.clear()
+                self._near_cache_active = True
+                logger.info("Near-cache invalidation listener subscribed")
+                
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True,
+                        timeout=settings.REDIS_SOCKET_TIMEOUT
+                    )
+                    if message:
+                        self._apply_invalidation(message["data"])
+            except redis.RedisError as e:
+                logger.warning(f"Near-cache invalidation listener error: {e}")
+            finally:
+                # Broadcasts may be missed while unsubscribed
+                self._near_cache_active = False
+                self._evict_near(None, None)
+                await pubsub.aclose()
+            
+            await asyncio.sleep(settings.REDIS_RETRY_INTERVAL)
+    
+    def _apply_invalidation(self, data: str):
+        """Evict the near-cache entries named by an invalidation broadcast."""
+        try:
+            message = json.loads(data)
+        except ValueError:
+            logger.warning(f"Ignoring malformed cache invalidation: {data!r}")
+            return
+        
+        # Local writes already evicted their own entries
+        if message.get("origin") == self._instance_id:
+            return
+        
+        namespace = message.get("namespace")
+        self._evict_near(namespace, message.get("key"))
+        if self._near_cache_active and message.get("generation") is not None:
+            self._namespace_generations[namespace] = max(
+                message["generation"], self._namespace_generations.get(namespace, 0)
+            )
+    
+    def _evict_near(self, namespace: Optional[str], key: Optional[str]):
+        """
+        Evict near-cache entries.
+        
+        Args:
+            namespace: Namespace to evict, or None for everything
+            key: Key to evict, or None for the whole namespace
+        """
+        self._near_cache_generation += 1
+        if namespace is None:
+            self._near_cache.clear()
+            self._namespace_generations.clear()
+        elif key is None:
+            self._near_cache.invalidate_namespace(namespace)
+        else:
+            self._near_cache.delete(namespace, key)
+    
+    def _invalidation_message(
+        self,
+        namespace: str,
+        key: Optional[str] = None,
+        generation: Optional[int] = None
+    ) -> str:
+        """Serialize an invalidation broadcast for one key or a whole namespace."""
+        return json.dumps({
+            "origin": self._instance_id,
+            "namespace": namespace,
+            "key": key,
+            "generation": generation
+        })
+    
+    def _generation_key(self, namespace: str) -> str:
+        """Redis key holding a namespace's current generation."""
+        return f"{self.GENERATION_KEY_PREFIX}:{namespace}"
+    
+    async def _namespace_generation(self, client: "aioredis.Redis", namespace: str) -> int:
+        """
+        Current generation of a namespace.
+        
+        Served from memory while the invalidation listener keeps it current,
+        otherwise read from Redis.
+        """
+        if self._near_cache_active and namespace in self._namespace_generations:
+            return self._namespace_generations[namespace]
+        
+        evictions = self._near_cache_generation
+        generation = int(await client.get(self._generation_key(namespace)) or 0)
+        if self._near_cache_active and evictions == self._near_cache_generation:
+            self._namespace_generations[namespace] = generation
+        return generation
+    
+    def _make_key(self, namespace: str, key: str, generation: int = 0) -> str:
+        """Create a namespaced cache key (namespaces must not contain colons)."""
+        if ":" in namespace:
+            raise ValueError(f"Cache namespace must not contain ':': {namespace!r}")
+        return f"neuroleaf:{namespace}:v{generation}:{key}"
     
     async def get(self, namespace: str, key: str) -> Optional[Any]:
         """
@@ -70,18 +407,31 @@ class CacheService:
         Returns:
             Cached value or None if not found
         """
-        cache_key = self._make_key(namespace, key)
-        
-        if self._redis_client:
+        client = self._redis()
+        if client:
+            if self._near_cache_active:
+                value = self._near_cache.get(namespace, key)
+                if value is not None:
+                    return value
+            
+            evictions = self._near_cache_generation
             try:
-                value = self._redis_client.get(cache_key)
-                if value:
-                    return json.loads(value)
+                generation = await self._namespace_generation(client, namespace)
+                raw = await client.get(self._make_key(namespace, key, generation))
+                if raw:
+                    value = json.loads(raw)
+                    # Skip the fill if an eviction raced with the read
+                    if self._near_cache_active and evictions == self._near_cache_generation:
+                        self._near_cache.set(
+                            namespace, key, value, settings.NEAR_CACHE_TTL, size=len(raw)
+                        )
+                    return value
+                return None
             except redis.RedisError as e:
-                logger.error(f"Redis GET error: {e}")
+                self._backoff.failed("GET", e)
         
-        # Fallback to memory cache
-        return self._memory_cache.get(cache_key)
+        # Fallback to memory cache (only consulted while Redis is unavailable)
+        return self._memory_cache.get(namespace, key)
     
     async def set(
         self, 
@@ -102,20 +452,151 @@ class CacheService:
         Returns:
             True if successfully cached
         """
-        cache_key = self._make_key(namespace, key)
+        return await self._store(namespace, key, value, ttl_seconds)
+    
+    async def _store(
+        self,
+        namespace: str,
+        key: str,
+        value: Any,
+        ttl_seconds: int,
+        generation: Optional[int] = None
+    ) -> bool:
+        """Store a value under the given namespace generation (default: current)."""
         serialized = json.dumps(value)
         
-        if self._redis_client:
+        client = self._redis()
+        if client:
+            self._evict_near(namespace, key)
             try:
-                self._redis_client.setex(cache_key, ttl_seconds, serialized)
+                if generation is None:
+                    generation = await self._namespace_generation(client, namespace)
+                cache_key = self._make_key(namespace, key, generation)
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.setex(cache_key, ttl_seconds, serialized)
+                    pipe.publish(self.INVALIDATION_CHANNEL, self._invalidation_message(namespace, key))
+                    await pipe.execute()
                 return True
             except redis.RedisError as e:
-                logger.error(f"Redis SET error: {e}")
+                self._backoff.failed("SET", e)
         
-        # Fallback to memory cache (no TTL for simplicity)
-        self._memory_cache[cache_key] = value
+        # Fallback to memory cache
+        self._memory_cache.set(namespace, key, value, ttl_seconds, size=len(serialized))
         return True
     
+    @asynccontextmanager
+    async def hold_lock(
+        self,
+        name: str,
+        timeout: Optional[float] = None,
+        blocking_timeout: Optional[float] = None
+    ) -> AsyncIterator[bool]:
+        """
+        Hold a Redis lock shared by all workers.
+        
+        Args:
+            name: Lock name
+            timeout: Seconds before an unreleased lock expires
+            blocking_timeout: Seconds to wait for the lock
+        
+        Yields:
+            True if the lock is held; False if it timed out or Redis is
+            unavailable (callers decide whether to proceed unlocked)
+        """
+        client = self._redis()
+        if not client:
+            yield False
+            return
+        
+        lock = client.lock(
+            f"{self.LOCK_KEY_PREFIX}:{name}",
+            timeout=timeout or settings.SINGLE_FLIGHT_LOCK_TIMEOUT,
+            blocking_timeout=blocking_timeout or settings.SINGLE_FLIGHT_WAIT_TIMEOUT,
+            sleep=0.05
+        )
+        try:
+            acquired = await lock.acquire()
+            if not acquired:
+                logger.warning(f"Timed out waiting for Redis lock {name}")
+        except redis.RedisError as e:
+            self._backoff.failed("lock", e)
+            acquired = False
+        
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except redis.RedisError as e:
+                    # Expired while held; another worker may own it now
+                    logger.warning(f"Redis lock {name} release failed: {e}")
+    
+    async def get_or_load(
+        self,
+        namespace: str,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl_seconds: int = 300
+    ) -> Any:
+        """
+        Read-through lookup: return the cached value or load and cache it.
+        
+        Concurrent misses for the same key share one loader call: within a
+        process through a SingleFlight, and across workers through a Redis
+        lock, after which waiting workers find the value already cached.
+        The namespace generation is captured before loading, so a result
+        computed from data that was invalidated mid-load is written under
+        the retired generation and never served.
+        
+        The shared load may outlive the request that started it (one
+        cancelled caller does not cancel the others), so the loader must
+        acquire its own resources, e.g. open a session from
+        AsyncSessionLocal, rather than close over a request-scoped one.
+        
+        Args:
+            namespace: Cache namespace
+            key: Unique key within namespace
+            loader: Coroutine function producing the (JSON serializable) value
+            ttl_seconds: Time-to-live in seconds (default: 5 minutes)
+        
+        Returns:
+            Cached or freshly loaded value
+        """
+        value = await self.get(namespace, key)
+        if value is not None:
+            return value
+        
+        return await self._loads.do(
+            f"{namespace}:{key}",
+            lambda: self._load(namespace, key, loader, ttl_seconds)
+        )
+    
+    async def _load(
+        self,
+        namespace: str,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl_seconds: int
+    ) -> Any:
+        """Run a loader and cache its result under the pre-load generation."""
+        # Another worker may have filled it while we waited for the lock
+        value = await self.get(namespace, key)
+        if value is not None:
+            return value
+        
+        generation = None
+        client = self._redis()
+        if client:
+            try:
+                generation = await self._namespace_generation(client, namespace)
+            except redis.RedisError as e:
+                self._backoff.failed("GET", e)
+        
+        value = await loader()
+        await self._store(namespace, key, value, ttl_seconds, generation)
+        return value
+    
     async def delete(self, namespace: str, key: str) -> bool:
         """
         Delete a value from cache.
@@ -127,47 +608,112 @@ class CacheService:
         Returns:
             True if successfully deleted
         """
-        cache_key = self._make_key(namespace, key)
+        # Drop any copy written to memory while Redis was unavailable
+        self._memory_cache.delete(namespace, key)
         
-        if self._redis_client:
+        client = self._redis()
+        if client:
+            self._evict_near(namespace, key)
             try:
-                self._redis_client.delete(cache_key)
-                return True
+                generation = await self._namespace_generation(client, namespace)
+                cache_key = self._make_key(namespace, key, generation)
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.delete(cache_key)
+                    pipe.publish(self.INVALIDATION_CHANNEL, self._invalidation_message(namespace, key))
+                    await pipe.execute()
             except redis.RedisError as e:
-                logger.error(f"Redis DELETE error: {e}")
+                self._backoff.failed("DELETE", e)
         
-        # Fallback to memory cache
-        self._memory_cache.pop(cache_key, None)
         return True
     
     async def invalidate_namespace(self, namespace: str) -> int:
         """
         Invalidate all keys in a namespace.
         
+        In Redis this bumps the namespace generation in O(1); the retired
+        keys are left for their TTL or the background reaper.
+        
         Args:
             namespace: Cache namespace to clear
             
         Returns:
-            Number of keys deleted
+            Number of in-memory keys deleted immediately
         """
-        pattern = self._make_key(namespace, "*")
-        deleted = 0
+        # Drop any copies written to memory while Redis was unavailable
+        deleted = self._memory_cache.invalidate_namespace(namespace)
         
-        if self._redis_client:
+        client = self._redis()
+        if client:
+            self._evict_near(namespace, None)
             try:
-                keys = self._redis_client.keys(pattern)
-                if keys:
-                    deleted = self._redis_client.delete(*keys)
-                return deleted
+                generation = await client.incr(self._generation_key(namespace))
+                # Only the listener keeps recorded generations current
+                if self._near_cache_active:
+                    self._namespace_generations[namespace] = generation
+                await client.publish(
+                    self.INVALIDATION_CHANNEL,
+                    self._invalidation_message(namespace, generation=generation)
+                )
             except redis.RedisError as e:
-                logger.error(f"Redis invalidate error: {e}")
+                self._backoff.failed("invalidate", e)
         
-        # Fallback to memory cache
-        prefix = self._make_key(namespace, "")
-        keys_to_delete = [k for k in self._memory_cache if k.startswith(prefix)]
-        for k in keys_to_delete:
-            del self._memory_cache[k]
-        return len(keys_to_delete)
+        return deleted
+    
+    async def reap_orphaned_keys(self) -> int:
+        """
+        Delete Redis keys left behind by namespace invalidations.
+        
+        Walks the keyspace with incremental SCAN and UNLINKs keys from
+        retired generations (or written before keys were versioned), so
+        Redis is never blocked for more than one small batch. Runs at most
+        once per CACHE_REAPER_INTERVAL across all workers.
+        
+        Returns:
+            Number of keys removed
+        """
+        client = self._redis()
+        if not client:
+            return 0
+        
+        acquired = await client.set(
+            self.REAPER_LOCK_KEY, self._instance_id, nx=True, ex=settings.CACHE_REAPER_INTERVAL
+        )
+        if not acquired:
+            return 0
+        
+        generations = {}
+        stale = []
+        reaped = 0
+        async for cache_key in client.scan_iter(match="neuroleaf:*", count=settings.CACHE_REAPER_SCAN_COUNT):
+            match = self.VERSIONED_KEY_PATTERN.match(cache_key)
+            if not match:
+                stale.append(cache_key)
+            else:
+                namespace, version = match.group(1), int(match.group(2))
+                if namespace not in generations:
+                    generations[namespace] = int(await client.get(self._generation_key(namespace)) or 0)
+                if version < generations[namespace]:
+                    stale.append(cache_key)
+            
+            if len(stale) >= settings.CACHE_REAPER_SCAN_COUNT:
+                reaped += await client.unlink(*stale)
+                stale = []
+        
+        if stale:
+            reaped += await client.unlink(*stale)
+        
+        return reaped
+    
+    async def _reap_periodically(self):
+        """Run reap_orphaned_keys() every CACHE_REAPER_INTERVAL seconds."""
+        while True:
+            await asyncio.sleep(settings.CACHE_REAPER_INTERVAL)
+            try:
+                reaped = await self.reap_orphaned_keys()
+                if reaped:
+                    logger.info(f"Reaped {reaped} orphaned cache keys")
+            except redis.RedisError as e:
+                self._backoff.failed("reaper", e)
 
 
 # Cache TTL constants (in seconds)
@@ -177,7 +723,23 @@ class CacheTTL:
     MOOD_HISTORY = 600           # 10 minutes
     JOURNAL_LIST = 300           # 5 minutes
     AI_EMBEDDINGS = 3600         # 1 hour
+    AI_ANALYSIS = 86400          # 24 hours
     ANALYTICS_STATS = 1800       # 30 minutes
+    PRINCIPAL = 60               # 1 minute
+
+
+# Per-user cache namespaces (invalidated as a whole on writes).
+# Namespaces are one segment of the Redis key, so they never contain colons.
+class CacheNamespace:
+    PRINCIPAL = "principal"
+    
+    @staticmethod
+    def mood_history(user_id) -> str:
+        return f"mood_history.{user_id}"
+    
+    @staticmethod
+    def journal_list(user_id) -> str:
+        return f"journal_list.{user_id}"
 
 
 # Singleton instance
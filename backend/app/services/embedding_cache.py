@@ -0,0 +1,164 @@
+"""
+Embedding Cache for NeuroLeaf
+Stores embedding vectors in Redis as raw float32 bytes, keyed by content hash.
+"""
+
+import hashlib
+import logging
+import sys
+from array import array
+from typing import List, Optional
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+from app.config import get_settings
+from app.services.cache_service import CacheTTL, RedisBackoff, redis_pool_options
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class EmbeddingCache:
+    """
+    Redis cache of embedding vectors keyed by model and content hash.
+    
+    Vectors are stored as little-endian float32 bytes (6 KB for a
+    1536-dimension vector, about a fifth of its JSON form) under their own
+    key prefix, outside CacheService's versioned namespaces. Both a sync
+    client (Celery backfills) and an async client (API) are provided, and
+    every lookup is batched into one MGET. Redis errors degrade to misses,
+    and the cache is bypassed for REDIS_RETRY_INTERVAL seconds afterwards.
+    
+    Its pools use the same settings as CacheService's (redis_pool_options)
+    but do not decode responses, since values are binary.
+    """
+    
+    KEY_PREFIX = "neuroleaf-embedding"
+    
+    def __init__(self, ttl_seconds: int = CacheTTL.AI_EMBEDDINGS):
+        self._ttl_seconds = ttl_seconds
+        self._client: Optional["redis.Redis"] = None
+        self._async_client: Optional["aioredis.Redis"] = None
+        self._backoff = RedisBackoff("Embedding cache")
+        self._initialize()
+    
+    def _initialize(self):
+        """Configure sync and async Redis clients (connections open on first use)."""
+        if not REDIS_AVAILABLE:
+            logger.warning("Redis package not installed. Embedding cache disabled.")
+            return
+        
+        redis_url = getattr(settings, 'REDIS_URL', None)
+        if not redis_url:
+            logger.warning("REDIS_URL not configured. Embedding cache disabled.")
+            return
+        
+        try:
+            self._client = redis.Redis(
+                connection_pool=redis.BlockingConnectionPool.from_url(redis_url, **redis_pool_options())
+            )
+            self._async_client = aioredis.Redis(
+                connection_pool=aioredis.BlockingConnectionPool.from_url(redis_url, **redis_pool_options())
+            )
+        except (redis.RedisError, ValueError) as e:
+            logger.warning(f"Embedding cache configuration failed: {e}. Embedding cache disabled.")
+            self._client = None
+            self._async_client = None
+    
+    async def close(self):
+        """Close pooled Redis connections."""
+        # Clients built on an explicit pool leave it open on close
+        if self._client:
+            self._client.connection_pool.disconnect()
+        if self._async_client:
+            await self._async_client.connection_pool.disconnect()
+    
+    def make_key(self, model: str, text: str) -> str:
+        """Cache key for the embedding of text under model."""
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return f"{self.KEY_PREFIX}:{model}:{digest}"
+    
+    @staticmethod
+    def encode(vector: List[float]) -> bytes:
+        """Pack a vector as little-endian float32 bytes."""
+        packed = array('f', vector)
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        return packed.tobytes()
+    
+    @staticmethod
+    def decode(raw: bytes) -> List[float]:
+        """Unpack little-endian float32 bytes into a vector."""
+        packed = array('f')
+        packed.frombytes(raw)
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        return packed.tolist()
+    
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up cached embeddings.
+        
+        Args:
+            model: Embedding model name
+            texts: Texts to look up
+        
+        Returns:
+            One vector per text, or None where not cached
+        """
+        if not self._client or not texts or self._backoff.active:
+            return [None] * len(texts)
+        
+        try:
+            raws = self._client.mget([self.make_key(model, text) for text in texts])
+        except redis.RedisError as e:
+            self._backoff.failed("read", e)
+            return [None] * len(texts)
+        return [self.decode(raw) if raw else None for raw in raws]
+    
+    def set_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Cache embeddings for texts in one pipelined round trip."""
+        if not self._client or not texts or self._backoff.active:
+            return
+        
+        try:
+            with self._client.pipeline(transaction=False) as pipe:
+                for text, vector in zip(texts, vectors):
+                    pipe.setex(self.make_key(model, text), self._ttl_seconds, self.encode(vector))
+                pipe.execute()
+        except redis.RedisError as e:
+            self._backoff.failed("write", e)
+    
+    async def get_many_async(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Non-blocking variant of get_many() for the API."""
+        if not self._async_client or not texts or self._backoff.active:
+            return [None] * len(texts)
+        
+        try:
+            raws = await self._async_client.mget([self.make_key(model, text) for text in texts])
+        except redis.RedisError as e:
+            self._backoff.failed("read", e)
+            return [None] * len(texts)
+        return [self.decode(raw) if raw else None for raw in raws]
+    
+    async def set_many_async(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Non-blocking variant of set_many() for the API."""
+        if not self._async_client or not texts or self._backoff.active:
+            return
+        
+        try:
+            async with self._async_client.pipeline(transaction=False) as pipe:
+                for text, vector in zip(texts, vectors):
+                    pipe.setex(self.make_key(model, text), self._ttl_seconds, self.encode(vector))
+                await pipe.execute()
+        except redis.RedisError as e:
+            self._backoff.failed("write", e)
+
+
+# Singleton instance
+embedding_cache = EmbeddingCache()
@@ -5,15 +5,106 @@ Provides end-to-end encryption for sensitive journal content.
 
 import os
 import base64
+import asyncio
+import hmac
 import logging
-from typing import Optional, Tuple
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
 import hashlib
 
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives import padding, hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.backends import default_backend
+from app.config import get_settings
+from app.services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class DerivedKeyCache:
+    """
+    In-memory cache of derived encryption keys, bounded and TTL-evicted.
+    
+    Entries are looked up by an HMAC of (salt, password) under a random
+    per-process secret, so neither the password nor a fast hash of it is
+    held. Keys are stored in bytearrays that are overwritten with zeros
+    when evicted, expired or forgotten; callers receive their own copies.
+    Entries may be tagged with a session so logout can drop them early.
+    Never persisted or shared between processes.
+    """
+    
+    def __init__(self, max_entries: int = 1024, ttl_seconds: int = 900):
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._secret = os.urandom(32)
+        self._entries: OrderedDict = OrderedDict()  # lookup -> (key, expires_at, session)
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def lookup_key(self, password: str, salt: bytes) -> bytes:
+        """Cache lookup key for a (password, salt) pair."""
+        message = len(salt).to_bytes(2, 'big') + salt + password.encode('utf-8')
+        return hmac.new(self._secret, message, hashlib.sha256).digest()
+    
+    @staticmethod
+    def _zeroize(key: bytearray):
+        key[:] = bytes(len(key))
+    
+    def _evict(self, lookup: bytes):
+        key, _, _ = self._entries.pop(lookup)
+        self._zeroize(key)
+    
+    def get(self, lookup: bytes) -> Optional[bytes]:
+        """Return a copy of a live cached key, or None."""
+        with self._lock:
+            entry = self._entries.get(lookup)
+            if entry is None:
+                return None
+            
+            key, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._evict(lookup)
+                return None
+            
+            self._entries.move_to_end(lookup)
+            return bytes(key)
+    
+    def set(self, lookup: bytes, key: bytes, session: Optional[str] = None):
+        """Cache a key, evicting expired and least-recently-used entries."""
+        with self._lock:
+            if lookup in self._entries:
+                self._evict(lookup)
+            
+            self._entries[lookup] = (bytearray(key), time.monotonic() + self._ttl_seconds, session)
+            
+            now = time.monotonic()
+            expired = [stale for stale, (_, expires_at, _) in self._entries.items() if expires_at <= now]
+            for stale in expired:
+                self._evict(stale)
+            while len(self._entries) > self._max_entries:
+                self._evict(next(iter(self._entries)))
+    
+    def forget_session(self, session: str) -> int:
+        """Zeroize and drop every key cached for a session; returns the number dropped."""
+        with self._lock:
+            lookups = [lookup for lookup, (_, _, owner) in self._entries.items() if owner == session]
+            for lookup in lookups:
+                self._evict(lookup)
+            return len(lookups)
+    
+    def clear(self):
+        """Zeroize and drop every key."""
+        with self._lock:
+            for lookup in list(self._entries):
+                self._evict(lookup)
 
 
 class EncryptionService:
@@ -30,9 +121,25 @@ class EncryptionService:
     ALGORITHM = algorithms.AES
     BLOCK_SIZE = 128  # bits
     KEY_SIZE = 256    # bits (32 bytes)
+    IV_SIZE = 16      # bytes
+    
+    # Plaintext read per step when streaming
+    STREAM_CHUNK_SIZE = 64 * 1024
+    
+    KDF_ITERATIONS = 100000
     
     def __init__(self):
         self._backend = default_backend()
+        self._key_cache = DerivedKeyCache(
+            max_entries=settings.ENCRYPTION_KEY_CACHE_SIZE,
+            ttl_seconds=settings.ENCRYPTION_KEY_CACHE_TTL
+        )
+        # OpenSSL releases the GIL while deriving, so threads run in parallel
+        self._kdf_executor = ThreadPoolExecutor(
+            max_workers=settings.ENCRYPTION_KDF_WORKERS,
+            thread_name_prefix="kdf"
+        )
+        self._derivations = SingleFlight("kdf")
     
     def derive_key(self, password: str, salt: bytes) -> bytes:
         """
@@ -46,22 +153,90 @@ class EncryptionService:
         Returns:
             32-byte encryption key
         """
-        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-        from cryptography.hazmat.primitives import hashes
-        
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
             salt=salt,
-            iterations=100000,
+            iterations=self.KDF_ITERATIONS,
             backend=self._backend
         )
         return kdf.derive(password.encode('utf-8'))
     
+    def get_key(self, password: str, salt: bytes, session: Optional[str] = None) -> bytes:
+        """
+        Derive a key, reusing a cached derivation while it is live.
+        
+        Args:
+            password: User's plaintext password
+            salt: Unique salt for this user (stored in DB)
+            session: Optional session id, for forget_session() on logout
+        
+        Returns:
+            32-byte encryption key
+        """
+        lookup = self._key_cache.lookup_key(password, salt)
+        key = self._key_cache.get(lookup)
+        if key is None:
+            key = self.derive_key(password, salt)
+            self._key_cache.set(lookup, key, session)
+        return key
+    
+    async def get_key_async(self, password: str, salt: bytes, session: Optional[str] = None) -> bytes:
+        """
+        Non-blocking get_key() for the API.
+        
+        Misses are derived on the KDF thread pool, and concurrent misses
+        for the same password and salt share one derivation.
+        """
+        lookup = self._key_cache.lookup_key(password, salt)
+        key = self._key_cache.get(lookup)
+        if key is not None:
+            return key
+        
+        async def derive() -> bytes:
+            derived = await asyncio.get_running_loop().run_in_executor(
+                self._kdf_executor, self.derive_key, password, salt
+            )
+            self._key_cache.set(lookup, derived, session)
+            return derived
+        
+        return await self._derivations.do(lookup.hex(), derive)
+    
+    def forget_session(self, session: str) -> int:
+        """Zeroize and drop the keys cached for a session (e.g. on logout)."""
+        return self._key_cache.forget_session(session)
+    
     def generate_salt(self) -> bytes:
         """Generate a cryptographically secure random salt."""
         return os.urandom(16)
     
+    @classmethod
+    def _pad(cls, data: bytes) -> bytes:
+        """PKCS7-pad data to the AES block size."""
+        pad_length = cls.IV_SIZE - len(data) % cls.IV_SIZE
+        return data + bytes([pad_length]) * pad_length
+    
+    @classmethod
+    def _unpad(cls, data: bytes) -> bytes:
+        """Strip and check PKCS7 padding, comparing the padding bytes in constant time."""
+        pad_length = data[-1] if data else 0
+        if not 1 <= pad_length <= cls.IV_SIZE or not hmac.compare_digest(
+            data[-pad_length:], bytes([pad_length]) * pad_length
+        ):
+            raise ValueError("Invalid padding bytes.")
+        return data[:-pad_length]
+    
+    def _encrypt_blob(self, data: bytes, aes: algorithms.AES) -> bytes:
+        """Encrypt bytes under a fresh IV; returns IV + ciphertext."""
+        iv = os.urandom(self.IV_SIZE)
+        encryptor = Cipher(aes, modes.CBC(iv), backend=self._backend).encryptor()
+        return iv + encryptor.update(self._pad(data)) + encryptor.finalize()
+    
+    def _decrypt_blob(self, blob: bytes, aes: algorithms.AES) -> bytes:
+        """Decrypt IV + ciphertext bytes."""
+        decryptor = Cipher(aes, modes.CBC(blob[:self.IV_SIZE]), backend=self._backend).decryptor()
+        return self._unpad(decryptor.update(blob[self.IV_SIZE:]) + decryptor.finalize())
+    
     def encrypt(self, plaintext: str, key: bytes) -> Tuple[bytes, bytes]:
         """
         Encrypt plaintext using AES-256-CBC.
@@ -73,23 +248,8 @@ class EncryptionService:
         Returns:
             Tuple of (ciphertext, iv)
         """
-        # Generate random IV
-        iv = os.urandom(16)
-        
-        # Pad plaintext to block size
-        padder = padding.PKCS7(self.BLOCK_SIZE).padder()
-        padded_data = padder.update(plaintext.encode('utf-8')) + padder.finalize()
-        
-        # Encrypt
-        cipher = Cipher(
-            algorithms.AES(key),
-            modes.CBC(iv),
-            backend=self._backend
-        )
-        encryptor = cipher.encryptor()
-        ciphertext = encryptor.update(padded_data) + encryptor.finalize()
-        
-        return ciphertext, iv
+        blob = self._encrypt_blob(plaintext.encode('utf-8'), algorithms.AES(key))
+        return blob[self.IV_SIZE:], blob[:self.IV_SIZE]
     
     def decrypt(self, ciphertext: bytes, key: bytes, iv: bytes) -> str:
         """
@@ -103,20 +263,7 @@ class EncryptionService:
         Returns:
             Decrypted plaintext
         """
-        # Decrypt
-        cipher = Cipher(
-            algorithms.AES(key),
-            modes.CBC(iv),
-            backend=self._backend
-        )
-        decryptor = cipher.decryptor()
-        padded_data = decryptor.update(ciphertext) + decryptor.finalize()
-        
-        # Unpad
-        unpadder = padding.PKCS7(self.BLOCK_SIZE).unpadder()
-        plaintext = unpadder.update(padded_data) + unpadder.finalize()
-        
-        return plaintext.decode('utf-8')
+        return self._decrypt_blob(iv + ciphertext, algorithms.AES(key)).decode('utf-8')
     
     def encrypt_for_storage(self, plaintext: str, key: bytes) -> str:
         """
@@ -130,10 +277,7 @@ class EncryptionService:
         Returns:
             Base64-encoded string (IV + ciphertext)
         """
-        ciphertext, iv = self.encrypt(plaintext, key)
-        # Prepend IV to ciphertext
-        combined = iv + ciphertext
-        return base64.b64encode(combined).decode('utf-8')
+        return base64.b64encode(self.encrypt_to_bytes(plaintext, key)).decode('ascii')
     
     def decrypt_from_storage(self, encrypted_data: str, key: bytes) -> str:
         """
@@ -146,11 +290,292 @@ class EncryptionService:
         Returns:
             Decrypted plaintext
         """
-        combined = base64.b64decode(encrypted_data)
-        # Extract IV (first 16 bytes) and ciphertext
-        iv = combined[:16]
-        ciphertext = combined[16:]
-        return self.decrypt(ciphertext, key, iv)
+        return self.decrypt_from_bytes(base64.b64decode(encrypted_data), key)
+    
+    def encrypt_to_bytes(self, plaintext: str, key: bytes) -> bytes:
+        """
+        Encrypt for a binary (BYTEA) column: IV + ciphertext, without the
+        third larger base64 form.
+        
+        Args:
+            plaintext: Text to encrypt
+            key: 32-byte encryption key
+        
+        Returns:
+            IV followed by ciphertext
+        """
+        return self._encrypt_blob(plaintext.encode('utf-8'), algorithms.AES(key))
+    
+    def decrypt_from_bytes(self, encrypted_data: bytes, key: bytes) -> str:
+        """
+        Decrypt the output of encrypt_to_bytes() (or encrypt_stream()).
+        
+        Args:
+            encrypted_data: IV followed by ciphertext
+            key: 32-byte encryption key
+        
+        Returns:
+            Decrypted plaintext
+        """
+        return self._decrypt_blob(bytes(encrypted_data), algorithms.AES(key)).decode('utf-8')
+    
+    def encrypt_many(self, plaintexts: Iterable[str], key: bytes, binary: bool = False) -> List:
+        """
+        Encrypt many entries under one key (exports, re-keying).
+        
+        The key is validated once and padding is done in-line; each entry
+        still gets its own random IV.
+        
+        Args:
+            plaintexts: Texts to encrypt
+            key: 32-byte encryption key
+            binary: Return bytes (BYTEA) instead of base64 strings
+        
+        Returns:
+            One encrypted value per plaintext, in input order
+        """
+        aes = algorithms.AES(key)
+        blobs = [self._encrypt_blob(plaintext.encode('utf-8'), aes) for plaintext in plaintexts]
+        if binary:
+            return blobs
+        return [base64.b64encode(blob).decode('ascii') for blob in blobs]
+    
+    def decrypt_many(self, encrypted_items: Iterable, key: bytes) -> List[str]:
+        """
+        Decrypt many entries under one key.
+        
+        Args:
+            encrypted_items: Base64 strings (encrypt_for_storage) or bytes
+                (encrypt_to_bytes), which may be mixed
+            key: 32-byte encryption key
+        
+        Returns:
+            Decrypted plaintexts, in input order
+        """
+        aes = algorithms.AES(key)
+        return [
+            self._decrypt_blob(
+                base64.b64decode(item) if isinstance(item, str) else bytes(item),
+                aes
+            ).decode('utf-8')
+            for item in encrypted_items
+        ]
+    
+    def encrypt_stream(self, chunks: Iterable[bytes], key: bytes) -> Iterator[bytes]:
+        """
+        Encrypt a large payload chunk by chunk in constant memory.
+        
+        The concatenated output is IV + ciphertext, the same format as
+        encrypt_to_bytes(), so it can be decrypted either way.
+        
+        Args:
+            chunks: Plaintext bytes, in order (e.g. iter_file())
+            key: 32-byte encryption key
+        
+        Yields:
+            The IV, then ciphertext pieces
+        """
+        iv = os.urandom(self.IV_SIZE)
+        encryptor = Cipher(algorithms.AES(key), modes.CBC(iv), backend=self._backend).encryptor()
+        padder = padding.PKCS7(self.BLOCK_SIZE).padder()
+        
+        yield iv
+        for chunk in chunks:
+            ciphertext = encryptor.update(padder.update(chunk))
+            if ciphertext:
+                yield ciphertext
+        yield encryptor.update(padder.finalize()) + encryptor.finalize()
+    
+    def decrypt_stream(self, chunks: Iterable[bytes], key: bytes) -> Iterator[bytes]:
+        """
+        Decrypt the output of encrypt_stream() chunk by chunk in constant memory.
+        
+        Args:
+            chunks: IV + ciphertext bytes, split anywhere
+            key: 32-byte encryption key
+        
+        Yields:
+            Plaintext pieces
+        """
+        aes = algorithms.AES(key)
+        header = b""
+        decryptor = None
+        unpadder = padding.PKCS7(self.BLOCK_SIZE).unpadder()
+        
+        for chunk in chunks:
+            if decryptor is None:
+                header += chunk
+                if len(header) < self.IV_SIZE:
+                    continue
+                decryptor = Cipher(aes, modes.CBC(header[:self.IV_SIZE]), backend=self._backend).decryptor()
+                chunk = header[self.IV_SIZE:]
+            
+            plaintext = unpadder.update(decryptor.update(chunk))
+            if plaintext:
+                yield plaintext
+        
+        if decryptor is None:
+            raise ValueError("Encrypted stream is shorter than its IV")
+        yield unpadder.update(decryptor.finalize()) + unpadder.finalize()
+    
+    @classmethod
+    def iter_file(cls, file_obj, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """Read a binary file object in chunks, for the streaming methods."""
+        chunk_size = chunk_size or cls.STREAM_CHUNK_SIZE
+        while True:
+            chunk = file_obj.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class UndecryptableContent(ValueError):
+    """A stored value is sealed but cannot be decrypted (unknown key or corrupt)."""
+    
+    def __init__(self, key_id: str, reason: str):
+        super().__init__(f"Content sealed under key {key_id} cannot be decrypted: {reason}")
+        self.key_id = key_id
+
+
+class ContentKeyring:
+    """
+    Server-side encryption at rest for stored text, keyed by master keys.
+    
+    Values are stored as "NL_ENC:<key id>:<base64 IV + ciphertext>", where
+    the key id is an HMAC fingerprint of the master key that encrypted
+    them. The current master key encrypts every value written; retired
+    master keys still decrypt until their rows have been re-encrypted (see
+    rotate_journal_encryption). Anything else is plaintext written before
+    encryption was enabled and is read as-is. While encryption is disabled,
+    plaintext that would be mistaken for a sealed or escaped value is
+    stored behind the "NL_TXT:" escape prefix.
+    
+    Each master key yields one data key, derived once at construction, so
+    reads and writes never run the KDF.
+    """
+    
+    PREFIX = "NL_ENC:"
+    ESCAPE = "NL_TXT:"
+    SEALED_PATTERN = re.compile(r"^NL_ENC:([0-9a-f]{12}):([A-Za-z0-9+/]+={0,2})$")
+    
+    # PBKDF2 salt of the data key derived from each master key
+    KEY_SALT = b"neuroleaf-content-v1"
+    
+    def __init__(self, service: EncryptionService, master_key: str, retired_keys: Iterable[str] = ()):
+        self._service = service
+        self._data_keys = {}  # key id -> data key
+        for master in [master_key, *retired_keys]:
+            if master and self.key_id(master) not in self._data_keys:
+                self._data_keys[self.key_id(master)] = service.derive_key(master, self.KEY_SALT)
+        self.current_key_id = self.key_id(master_key) if master_key else None
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether new values are encrypted (a master key is configured)."""
+        return self.current_key_id is not None
+    
+    @staticmethod
+    def key_id(master_key: str) -> str:
+        """Fingerprint of a master key that does not reveal it."""
+        return hmac.new(master_key.encode('utf-8'), b"neuroleaf-key-id", hashlib.sha256).hexdigest()[:12]
+    
+    @property
+    def current_prefix(self) -> Optional[str]:
+        """Prefix of values encrypted under the current master key."""
+        return f"{self.PREFIX}{self.current_key_id}:" if self.enabled else None
+    
+    def key_id_of(self, value: str) -> Optional[str]:
+        """Key id a stored value was encrypted under, or None for plaintext."""
+        match = self.SEALED_PATTERN.match(value)
+        return match.group(1) if match else None
+    
+    def _needs_escape(self, value: str) -> bool:
+        """Whether plaintext would be misread: it starts with PREFIX, after any escapes."""
+        while value.startswith(self.ESCAPE):
+            value = value[len(self.ESCAPE):]
+        return value.startswith(self.PREFIX)
+    
+    def seal(self, value: Optional[str]) -> Optional[str]:
+        """Encode a value for storage: encrypted when enabled, else escaped if ambiguous."""
+        if value is None:
+            return value
+        return self.seal_many([value])[0]
+    
+    def seal_many(self, values: List[str]) -> List[str]:
+        """Encode values for storage, encrypting under the current key with the batch cipher path."""
+        if not self.enabled:
+            return [self.ESCAPE + value if self._needs_escape(value) else value for value in values]
+        
+        prefix = self.current_prefix
+        encrypted = self._service.encrypt_many(values, self._data_keys[self.current_key_id])
+        return [prefix + value for value in encrypted]
+    
+    def _open_one(self, value: str) -> str:
+        """Decode one stored value; raises UndecryptableContent."""
+        if value.startswith(self.ESCAPE) and self._needs_escape(value[len(self.ESCAPE):]):
+            return value[len(self.ESCAPE):]
+        
+        match = self.SEALED_PATTERN.match(value)
+        if not match:
+            return value
+        
+        key_id, payload = match.groups()
+        key = self._data_keys.get(key_id)
+        if key is None:
+            raise UndecryptableContent(key_id, "unknown master key")
+        try:
+            return self._service.decrypt_from_storage(payload, key)
+        except ValueError as e:  # Bad base64, padding or UTF-8
+            raise UndecryptableContent(key_id, str(e)) from e
+    
+    def open(self, value: Optional[str]) -> Optional[str]:
+        """
+        Decode a stored value; plaintext passes through.
+        
+        Raises:
+            UndecryptableContent: The value is sealed under an unknown key or corrupt
+        """
+        if value is None:
+            return value
+        return self._open_one(value)
+    
+    def open_many(self, values: List[str]) -> List[Optional[str]]:
+        """
+        Decode stored values, one cipher batch per master key.
+        
+        Failures are scoped to their row: values that cannot be decrypted
+        are logged and returned as None, the rest are still decoded.
+        """
+        opened: List[Optional[str]] = []
+        by_key = {}
+        for i, value in enumerate(values):
+            key_id = self.key_id_of(value)
+            if key_id is not None and key_id in self._data_keys:
+                by_key.setdefault(key_id, []).append(i)
+                opened.append(None)
+                continue
+            try:
+                opened.append(self._open_one(value))
+            except UndecryptableContent as e:
+                logger.error(str(e))
+                opened.append(None)
+        
+        for key_id, positions in by_key.items():
+            payloads = [values[i].split(":", 2)[2] for i in positions]
+            try:
+                plaintexts = self._service.decrypt_many(payloads, self._data_keys[key_id])
+            except ValueError:
+                # Find the corrupt rows one by one
+                plaintexts = []
+                for i in positions:
+                    try:
+                        plaintexts.append(self._open_one(values[i]))
+                    except UndecryptableContent as e:
+                        logger.error(str(e))
+                        plaintexts.append(None)
+            for i, plaintext in zip(positions, plaintexts):
+                opened[i] = plaintext
+        return opened
 
 
 class ClientSideEncryption:
@@ -185,8 +610,13 @@ class ClientSideEncryption:
         return f"NL_E2E:{encrypted_payload}"
 
 
-# Singleton instance
+# Singleton instances
 encryption_service = EncryptionService()
+content_keyring = ContentKeyring(
+    encryption_service,
+    settings.ENCRYPTION_MASTER_KEY,
+    [key.strip() for key in settings.ENCRYPTION_RETIRED_KEYS.split(",") if key.strip()]
+)
 
 
 # Example usage and testing
@@ -0,0 +1,67 @@
+"""
+Request Coalescing for NeuroLeaf
+Lets duplicate concurrent computations share one execution.
+"""
+
+import asyncio
+from typing import Any, AsyncContextManager, Awaitable, Callable, Optional
+
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight computations.
+    
+    Within one process, concurrent calls with the same key await a single
+    execution and all receive its result (or exception). When a lock
+    factory is given, the execution also holds a cross-worker lock, so
+    duplicates on other workers wait for it to finish before running their
+    own call. Functions should therefore re-check for an existing result
+    first (a cache entry, a saved row) and only compute when it is missing.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        lock: Optional[Callable[[str], AsyncContextManager[bool]]] = None
+    ):
+        """
+        Args:
+            name: Prefix for lock names, unique per use
+            lock: Factory returning an async context manager that holds a
+                cross-worker lock and yields whether it was acquired
+        """
+        self.name = name
+        self._lock = lock
+        self._inflight: dict = {}  # key -> task
+    
+    def __len__(self) -> int:
+        return len(self._inflight)
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn once per key across concurrent callers.
+        
+        Args:
+            key: Identity of the computation
+            fn: Coroutine function performing it
+        
+        Returns:
+            The result of the shared execution
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        
+        # Shielded so one cancelled caller does not cancel the others
+        return await asyncio.shield(task)
+    
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Execute fn, holding the cross-worker lock if one is configured."""
+        if self._lock is None:
+            return await fn()
+        
+        # Runs even if the lock could not be taken: coalescing is best effort
+        async with self._lock(f"{self.name}:{key}"):
+            return await fn()
@@ -0,0 +1,565 @@
+"""
+Vector Index Backends for NeuroLeaf
+Per-user storage and top-k cosine search over journal entry embeddings.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, time, timezone
+from typing import List, Dict, Any, Optional
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows
+    import msvcrt
+    FCNTL_AVAILABLE = False
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+    CHROMA_AVAILABLE = True
+except ImportError:
+    CHROMA_AVAILABLE = False
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def to_timestamp(value) -> Optional[float]:
+    """
+    UTC epoch seconds of a date, datetime or ISO string (naive = UTC).
+    
+    A bare date maps to its start of day.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time.min)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def timestamp_bounds(date_range: Optional[tuple]) -> Optional[tuple]:
+    """
+    Inclusive (start, end) epoch bounds of a (start, end) date range.
+    
+    Either end may be None for an open range; a bare end date includes
+    that whole day.
+    """
+    if not date_range:
+        return None
+    
+    start, end = date_range
+    start_ts = to_timestamp(start) if start is not None else float("-inf")
+    if end is None:
+        end_ts = float("inf")
+    elif isinstance(end, date) and not isinstance(end, datetime):
+        end_ts = to_timestamp(datetime.combine(end, time.max))
+    else:
+        end_ts = to_timestamp(end)
+    return start_ts, end_ts
+
+
+def filter_values(filters: Optional[Dict[str, Any]]) -> Dict[str, list]:
+    """
+    Normalize metadata filters to {key: allowed values}.
+    
+    A scalar value means equality, a list or tuple means "any of"; None
+    values are ignored.
+    """
+    return {
+        key: list(value) if isinstance(value, (list, tuple, set)) else [value]
+        for key, value in (filters or {}).items()
+        if value is not None
+    }
+
+
+def _user_key(model: str, user_id: str) -> str:
+    """Stable per-user, per-model storage name (short enough for Chroma)."""
+    return hashlib.sha256(f"{model}:{user_id}".encode('utf-8')).hexdigest()[:32]
+
+
+class ChromaIndex:
+    """
+    One Chroma collection (HNSW) per user.
+    
+    Collections are created on first write; reads treat a missing
+    collection as an empty history. Handles are kept in a bounded LRU and
+    dropped after a failed call, in case another process removed the
+    collection.
+    """
+    
+    COLLECTION_NAME = "journal_embeddings"
+    
+    def __init__(self, model: str, path: str = "./chroma_data"):
+        if not CHROMA_AVAILABLE:
+            raise RuntimeError("ChromaDB not installed")
+        
+        self._model = model
+        self._client = chromadb.PersistentClient(
+            path=path,
+            settings=ChromaSettings(anonymized_telemetry=False)
+        )
+        self._collections: OrderedDict = OrderedDict()  # user_id -> collection handle
+        logger.info(f"ChromaDB initialized with {len(self._client.list_collections())} collections")
+    
+    def _collection_name(self, user_id: str) -> str:
+        """Collection holding one user's entries for the active embedding model."""
+        return f"{self.COLLECTION_NAME}-{_user_key(self._model, user_id)}"
+    
+    def _user_collection(self, user_id: str, create: bool = False):
+        """
+        Cached handle to a user's collection.
+        
+        Args:
+            user_id: Owner of the collection
+            create: Create the collection if it does not exist yet
+        
+        Returns:
+            Collection, or None if it does not exist and create is False
+        """
+        collection = self._collections.get(user_id)
+        if collection is not None:
+            self._collections.move_to_end(user_id)
+            return collection
+        
+        name = self._collection_name(user_id)
+        if create:
+            collection = self._client.get_or_create_collection(
+                name=name,
+                metadata={"hnsw:space": "cosine", "user_id": user_id, "embedding_model": self._model}
+            )
+        else:
+            try:
+                collection = self._client.get_collection(name=name)
+            except ValueError:
+                # Nothing indexed for this user yet
+                return None
+        
+        self._collections[user_id] = collection
+        while len(self._collections) > settings.VECTOR_COLLECTION_CACHE_SIZE:
+            self._collections.popitem(last=False)
+        return collection
+    
+    def upsert(
+        self,
+        user_id: str,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        """Insert or replace entries in a user's index."""
+        try:
+            self._user_collection(user_id, create=True).upsert(
+                ids=ids,
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=metadatas
+            )
+        except Exception:
+            self._collections.pop(user_id, None)
+            raise
+    
+    def query(
+        self,
+        user_id: str,
+        embedding: List[float],
+        n_results: int,
+        date_range: Optional[tuple] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k most similar entries of a user.
+        
+        Date and metadata filters are applied by Chroma before the vector
+        search; date ranges use the numeric created_ts metadata.
+        
+        Returns:
+            List of {'id', 'content', 'metadata', 'similarity'}
+        """
+        try:
+            collection = self._user_collection(user_id)
+            if collection is None:
+                return []
+            
+            count = collection.count()
+            if not count:
+                return []
+            
+            results = collection.query(
+                query_embeddings=[embedding],
+                n_results=min(n_results, count),
+                where=self._where(date_range, filters),
+                include=["documents", "metadatas", "distances"]
+            )
+        except Exception:
+            self._collections.pop(user_id, None)
+            raise
+        
+        formatted = []
+        if results["ids"] and results["ids"][0]:
+            for i, doc_id in enumerate(results["ids"][0]):
+                formatted.append({
+                    "id": doc_id,
+                    "content": results["documents"][0][i] if results["documents"] else "",
+                    "metadata": results["metadatas"][0][i] if results["metadatas"] else {},
+                    "similarity": 1 - results["distances"][0][i] if results["distances"] else 0,
+                })
+        return formatted
+    
+    @staticmethod
+    def _where(date_range: Optional[tuple], filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Chroma where clause for a date range and metadata filters."""
+        clauses = []
+        bounds = timestamp_bounds(date_range)
+        if bounds is not None:
+            if bounds[0] != float("-inf"):
+                clauses.append({"created_ts": {"$gte": bounds[0]}})
+            if bounds[1] != float("inf"):
+                clauses.append({"created_ts": {"$lte": bounds[1]}})
+        
+        for key, values in filter_values(filters).items():
+            clauses.append({key: values[0]} if len(values) == 1 else {key: {"$in": values}})
+        
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    
+    def delete(self, user_id: str, ids: List[str]) -> int:
+        """Remove entries from a user's index; returns how many existed."""
+        collection = self._user_collection(user_id)
+        if collection is None:
+            return 0
+        
+        try:
+            existing = collection.get(ids=ids, include=[])["ids"]
+            if existing:
+                collection.delete(ids=existing)
+        except Exception:
+            self._collections.pop(user_id, None)
+            raise
+        return len(existing)
+    
+    def delete_user(self, user_id: str) -> int:
+        """Drop a user's collection; returns the number of entries removed."""
+        collection = self._user_collection(user_id)
+        if collection is None:
+            return 0
+        
+        deleted = collection.count()
+        self._client.delete_collection(name=collection.name)
+        self._collections.pop(user_id, None)
+        return deleted
+
+
+class NumpyIndex:
+    """
+    Exact in-process index: one contiguous float32 matrix per user.
+    
+    Each user directory holds L2-normalized vectors (vectors.npy), a
+    parallel array of entry timestamps (timestamps.npy) and the ids,
+    documents and metadata (entries.json). Queries memory-map the matrix
+    and score all entries with one matrix-vector product, taking the top k
+    with argpartition, which beats an HNSW lookup for the few hundred
+    entries a typical user has and is exact. Writes rewrite the user's
+    files under an exclusive file lock; readers take a shared lock and
+    reload when entries.json changes.
+    """
+    
+    def __init__(self, model: str, path: str = "./vector_index"):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("NumPy not installed")
+        
+        self._model = model
+        self._root = os.path.join(path, model)
+        os.makedirs(self._root, exist_ok=True)
+        self._loaded: OrderedDict = OrderedDict()  # user_id -> (stamp, vectors, timestamps, entries)
+        self._loaded_lock = threading.Lock()  # The API queries from executor threads
+    
+    def _user_dir(self, user_id: str) -> str:
+        return os.path.join(self._root, _user_key(self._model, user_id))
+    
+    @contextmanager
+    def _locked(self, user_dir: str, exclusive: bool):
+        """
+        Hold the per-user file lock (shared for reads, exclusive for writes).
+        
+        Windows has no shared file locks, so there every holder is exclusive.
+        """
+        with open(os.path.join(user_dir, ".lock"), "a+") as lock_file:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if FCNTL_AVAILABLE:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    
+    @staticmethod
+    def _stamp(user_dir: str) -> Optional[tuple]:
+        """
+        Change marker of a user's index (entries.json is written last).
+        
+        Writes replace the file, so the inode changes even when a rewrite
+        lands within the filesystem's mtime granularity at the same size.
+        """
+        try:
+            stat = os.stat(os.path.join(user_dir, "entries.json"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+    
+    @staticmethod
+    def _read(user_dir: str) -> tuple:
+        """Memory-map vectors and load timestamps and entries (caller holds the lock)."""
+        vectors = np.load(os.path.join(user_dir, "vectors.npy"), mmap_mode="r")
+        timestamps = np.load(os.path.join(user_dir, "timestamps.npy"))
+        with open(os.path.join(user_dir, "entries.json")) as f:
+            entries = json.load(f)
+        return vectors, timestamps, entries
+    
+    def _load(self, user_id: str) -> Optional[tuple]:
+        """Cached (vectors, timestamps, entries) of a user, or None if empty."""
+        user_dir = self._user_dir(user_id)
+        stamp = self._stamp(user_dir)
+        if stamp is None:
+            self._loaded.pop(user_id, None)
+            return None
+        
+        with self._loaded_lock:
+            cached = self._loaded.get(user_id)
+            if cached is not None and cached[0] == stamp:
+                self._loaded.move_to_end(user_id)
+                return cached[1:]
+        
+        with self._locked(user_dir, exclusive=False):
+            stamp = self._stamp(user_dir)
+            if stamp is None:
+                return None
+            loaded = self._read(user_dir)
+        
+        with self._loaded_lock:
+            self._loaded[user_id] = (stamp, *loaded)
+            while len(self._loaded) > settings.VECTOR_COLLECTION_CACHE_SIZE:
+                self._loaded.popitem(last=False)
+        return loaded
+    
+    @staticmethod
+    def _entry_timestamp(metadata: Dict[str, Any]) -> float:
+        """Creation epoch of an entry, or NaN if unknown."""
+        if metadata.get("created_ts") is not None:
+            return float(metadata["created_ts"])
+        if metadata.get("created_at"):
+            return to_timestamp(metadata["created_at"])
+        return np.nan
+    
+    @staticmethod
+    def _write_array(path: str, array):
+        """Atomically replace a .npy file."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    
+    def _write(self, user_dir: str, vectors, timestamps, entries: Dict[str, list]):
+        """Replace a user's files; entries.json goes last as it marks the change."""
+        self._write_array(os.path.join(user_dir, "vectors.npy"), vectors)
+        self._write_array(os.path.join(user_dir, "timestamps.npy"), timestamps)
+        entries_path = os.path.join(user_dir, "entries.json")
+        with open(f"{entries_path}.tmp", "w") as f:
+            json.dump(entries, f)
+        os.replace(f"{entries_path}.tmp", entries_path)
+    
+    def upsert(
+        self,
+        user_id: str,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        """Insert or replace entries in a user's index."""
+        user_dir = self._user_dir(user_id)
+        os.makedirs(user_dir, exist_ok=True)
+        
+        new_vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(new_vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        new_vectors /= norms
+        new_timestamps = np.array([self._entry_timestamp(metadata) for metadata in metadatas], dtype=np.float64)
+        
+        with self._locked(user_dir, exclusive=True):
+            if self._stamp(user_dir) is not None:
+                vectors, timestamps, entries = self._read(user_dir)
+                vectors = np.array(vectors)
+            else:
+                vectors = np.empty((0, new_vectors.shape[1]), dtype=np.float32)
+                timestamps = np.empty(0, dtype=np.float64)
+                entries = {"ids": [], "documents": [], "metadatas": []}
+            
+            positions = {entry_id: i for i, entry_id in enumerate(entries["ids"])}
+            appended = []
+            for row, entry_id in enumerate(ids):
+                position = positions.get(entry_id)
+                if position is None:
+                    positions[entry_id] = len(entries["ids"])
+                    entries["ids"].append(entry_id)
+                    entries["documents"].append(documents[row])
+                    entries["metadatas"].append(metadatas[row])
+                    appended.append(row)
+                else:
+                    vectors[position] = new_vectors[row]
+                    timestamps[position] = new_timestamps[row]
+                    entries["documents"][position] = documents[row]
+                    entries["metadatas"][position] = metadatas[row]
+            
+            vectors = np.concatenate([vectors, new_vectors[appended]])
+            timestamps = np.concatenate([timestamps, new_timestamps[appended]])
+            self._write(user_dir, vectors, timestamps, entries)
+        
+        self._loaded.pop(user_id, None)
+    
+    def query(
+        self,
+        user_id: str,
+        embedding: List[float],
+        n_results: int,
+        date_range: Optional[tuple] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Exact top-k cosine search over a user's entries.
+        
+        Filters select the candidate rows first, so only matching entries
+        are scored.
+        
+        Args:
+            user_id: Owner of the entries
+            embedding: Query vector
+            n_results: Number of results to return
+            date_range: Optional (start, end) filter on entry creation time
+            filters: Optional metadata filters (see filter_values())
+        
+        Returns:
+            List of {'id', 'content', 'metadata', 'similarity'}, best first
+        """
+        loaded = self._load(user_id)
+        if loaded is None:
+            return []
+        vectors, timestamps, entries = loaded
+        
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        
+        mask = None
+        bounds = timestamp_bounds(date_range)
+        if bounds is not None:
+            # NaN timestamps (unknown dates) fail both comparisons
+            mask = (timestamps >= bounds[0]) & (timestamps <= bounds[1])
+        for key, values in filter_values(filters).items():
+            allowed = set(values)
+            matches = np.fromiter(
+                (metadata.get(key) in allowed for metadata in entries["metadatas"]),
+                dtype=bool,
+                count=len(entries["metadatas"])
+            )
+            mask = matches if mask is None else mask & matches
+        
+        if mask is None:
+            candidates = None
+            scores = vectors @ query
+        else:
+            candidates = np.flatnonzero(mask)
+            scores = vectors[candidates] @ query
+        
+        k = min(n_results, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        results = []
+        for i in top:
+            row = int(i if candidates is None else candidates[i])
+            results.append({
+                "id": entries["ids"][row],
+                "content": entries["documents"][row],
+                "metadata": entries["metadatas"][row],
+                "similarity": float(scores[i]),
+            })
+        return results
+    
+    def delete(self, user_id: str, ids: List[str]) -> int:
+        """Remove entries from a user's index; returns how many existed."""
+        user_dir = self._user_dir(user_id)
+        if self._stamp(user_dir) is None:
+            return 0
+        
+        removed = set(ids)
+        with self._locked(user_dir, exclusive=True):
+            if self._stamp(user_dir) is None:
+                return 0
+            vectors, timestamps, entries = self._read(user_dir)
+            keep = [i for i, entry_id in enumerate(entries["ids"]) if entry_id not in removed]
+            deleted = len(entries["ids"]) - len(keep)
+            if deleted:
+                entries = {field: [values[i] for i in keep] for field, values in entries.items()}
+                self._write(user_dir, np.array(vectors[keep]), timestamps[keep], entries)
+        
+        self._loaded.pop(user_id, None)
+        return deleted
+    
+    def delete_user(self, user_id: str) -> int:
+        """Remove a user's index; returns the number of entries removed."""
+        user_dir = self._user_dir(user_id)
+        loaded = self._load(user_id)
+        self._loaded.pop(user_id, None)
+        if loaded is None:
+            return 0
+        
+        with self._locked(user_dir, exclusive=True):
+            for name in ("entries.json", "vectors.npy", "timestamps.npy"):
+                try:
+                    os.remove(os.path.join(user_dir, name))
+                except FileNotFoundError:
+                    pass
+        return len(loaded[2]["ids"])
+
+
+def create_vector_index(backend: str, model: str):
+    """
+    Build the vector index for a configured backend.
+    
+    Args:
+        backend: 'chroma' (HNSW via ChromaDB) or 'numpy' (exact, in-process)
+        model: Embedding model name, so indexes of different models never mix
+    """
+    if backend == "chroma":
+        return ChromaIndex(model)
+    if backend == "numpy":
+        return NumpyIndex(model, path=settings.VECTOR_INDEX_PATH)
+    raise ValueError(f"Unknown vector index backend: {backend!r}")
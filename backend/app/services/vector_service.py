@@ -1,22 +1,20 @@
 """
-Vector Database Service using ChromaDB
+Vector Database Service for NeuroLeaf
 Provides semantic search and RAG capabilities for long-term emotional pattern recognition.
 """
 
+import asyncio
+import functools
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from datetime import datetime
 import uuid
 
-try:
-    import chromadb
-    from chromadb.config import Settings as ChromaSettings
-    CHROMA_AVAILABLE = True
-except ImportError:
-    CHROMA_AVAILABLE = False
-
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from app.config import get_settings
+from app.ml.embedder import embedder
+from app.services.embedding_cache import embedding_cache
+from app.services.vector_index import create_vector_index, to_timestamp
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -24,59 +22,98 @@ settings = get_settings()
 
 class VectorService:
     """
-    ChromaDB-based vector storage for semantic search over journal entries.
+    Per-user vector storage for semantic search over journal entries.
     Enables RAG (Retrieval-Augmented Generation) for contextual AI responses.
+    
+    Each user's entries live in their own index partition (per embedding
+    model), so a search only walks that user's entries and account deletion
+    drops a single partition. The index backend is chosen by
+    VECTOR_INDEX_BACKEND: ChromaDB collections (HNSW) or an exact
+    memory-mapped NumPy index.
     """
     
-    COLLECTION_NAME = "journal_embeddings"
-    EMBEDDING_MODEL = "text-embedding-3-small"
-    EMBEDDING_DIMENSIONS = 1536
+    RAG_MODEL = "gpt-4"
+    RAG_MAX_TOKENS = 300
+    
+    NO_AI_ANSWER = "AI service not available"
+    NO_HISTORY_ANSWER = "I don't have enough journal history to answer that question. Keep writing!"
     
     def __init__(self):
-        self._client: Optional[chromadb.Client] = None
-        self._collection = None
+        self._index = None
         self._openai_client = None
+        self._async_openai_client = None
         self._initialize()
     
     def _initialize(self):
-        """Initialize ChromaDB and OpenAI clients."""
-        if not CHROMA_AVAILABLE:
-            logger.warning("ChromaDB not installed. Vector search disabled.")
-            return
-        
+        """Initialize the vector index and OpenAI client."""
         try:
-            # Initialize ChromaDB with persistent storage
-            self._client = chromadb.Client(ChromaSettings(
-                chroma_db_impl="duckdb+parquet",
-                persist_directory="./chroma_data",
-                anonymized_telemetry=False
-            ))
-            
-            # Get or create collection
-            self._collection = self._client.get_or_create_collection(
-                name=self.COLLECTION_NAME,
-                metadata={"hnsw:space": "cosine"}
-            )
+            self._index = create_vector_index(settings.VECTOR_INDEX_BACKEND, embedder.model)
             
-            # Initialize OpenAI for embeddings
+            # Initialize OpenAI for RAG answers
             self._openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            
-            logger.info(f"ChromaDB initialized with {self._collection.count()} documents")
+            self._async_openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
             
         except Exception as e:
-            logger.error(f"Failed to initialize ChromaDB: {e}")
-            self._client = None
+            logger.error(f"Failed to initialize vector index: {e}. Vector search disabled.")
+            self._index = None
     
-    def _generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding vector for text using OpenAI."""
-        if not self._openai_client:
-            raise RuntimeError("OpenAI client not initialized")
+    @property
+    def available(self) -> bool:
+        """Whether the vector index initialized (searches and writes are no-ops otherwise)."""
+        return self._index is not None
+    
+    @staticmethod
+    def _split_cached(texts: List[str], cached: List[Optional[List[float]]]) -> List[str]:
+        """Distinct texts with no cached embedding."""
+        return list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+    
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, requesting only those not in the embedding cache."""
+        if not embedder.cacheable:
+            return embedder.embed(texts)
         
-        response = self._openai_client.embeddings.create(
-            model=self.EMBEDDING_MODEL,
-            input=text,
+        vectors = embedding_cache.get_many(embedder.model, texts)
+        missing = self._split_cached(texts, vectors)
+        if missing:
+            computed = dict(zip(missing, embedder.embed(missing)))
+            embedding_cache.set_many(embedder.model, missing, list(computed.values()))
+            vectors = [vector if vector is not None else computed[text] for text, vector in zip(texts, vectors)]
+        return vectors
+    
+    async def _index_call(self, method: str, *args, **kwargs):
+        """Run a blocking index operation (file I/O, NumPy, HNSW) off the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(getattr(self._index, method), *args, **kwargs)
         )
-        return response.data[0].embedding
+    
+    async def _embed_async(self, texts: List[str]) -> List[List[float]]:
+        """Non-blocking variant of _embed() for the API."""
+        if not embedder.cacheable:
+            return await embedder.embed_async(texts)
+        
+        vectors = await embedding_cache.get_many_async(embedder.model, texts)
+        missing = self._split_cached(texts, vectors)
+        if missing:
+            computed = dict(zip(missing, await embedder.embed_async(missing)))
+            await embedding_cache.set_many_async(embedder.model, missing, list(computed.values()))
+            vectors = [vector if vector is not None else computed[text] for text, vector in zip(texts, vectors)]
+        return vectors
+    
+    @staticmethod
+    def _document_metadata(user_id: str, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Metadata stored alongside an entry's embedding.
+        
+        created_ts mirrors created_at as epoch seconds so date ranges can be
+        filtered numerically inside the index.
+        """
+        doc_metadata = {
+            "user_id": str(user_id),
+            "created_at": datetime.utcnow().isoformat(),
+            **(metadata or {})
+        }
+        doc_metadata["created_ts"] = to_timestamp(doc_metadata["created_at"])
+        return doc_metadata
     
     async def add_journal_entry(
         self,
@@ -97,24 +134,20 @@ class VectorService:
         Returns:
             True if successfully added
         """
-        if not self._collection:
+        if not self._index:
             logger.warning("Vector store not available")
             return False
         
         try:
-            embedding = self._generate_embedding(content)
+            embedding = (await self._embed_async([content]))[0]
             
-            doc_metadata = {
-                "user_id": user_id,
-                "created_at": datetime.utcnow().isoformat(),
-                **(metadata or {})
-            }
-            
-            self._collection.add(
+            await self._index_call(
+                "upsert",
+                str(user_id),
                 ids=[journal_id],
                 embeddings=[embedding],
                 documents=[content],
-                metadatas=[doc_metadata]
+                metadatas=[self._document_metadata(user_id, metadata)]
             )
             
             logger.info(f"Added journal {journal_id} to vector store")
@@ -124,54 +157,88 @@ class VectorService:
             logger.error(f"Failed to add journal to vector store: {e}")
             return False
     
+    def add_journal_entries_batch(self, entries: List[Dict[str, Any]]) -> int:
+        """
+        Embed and store many journal entries with batched embedding requests.
+        
+        Entries already in the store are overwritten, so re-running a
+        backfill is safe.
+        
+        Args:
+            entries: Dicts with 'journal_id', 'user_id', 'content' and
+                optional 'metadata'
+        
+        Returns:
+            Number of entries stored
+        """
+        if not self._index:
+            logger.warning("Vector store not available")
+            return 0
+        if not entries:
+            return 0
+        
+        embeddings = self._embed([entry["content"] for entry in entries])
+        
+        by_user = {}
+        for entry, embedding in zip(entries, embeddings):
+            by_user.setdefault(str(entry["user_id"]), []).append((entry, embedding))
+        
+        for user_id, user_entries in by_user.items():
+            self._index.upsert(
+                user_id,
+                ids=[entry["journal_id"] for entry, _ in user_entries],
+                embeddings=[embedding for _, embedding in user_entries],
+                documents=[entry["content"] for entry, _ in user_entries],
+                metadatas=[
+                    self._document_metadata(user_id, entry.get("metadata"))
+                    for entry, _ in user_entries
+                ]
+            )
+        
+        logger.info(f"Added {len(entries)} journals to vector store")
+        return len(entries)
+    
     async def search_similar(
         self,
         user_id: str,
         query: str,
         n_results: int = 5,
-        date_range: Optional[tuple] = None
+        date_range: Optional[tuple] = None,
+        filters: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         Search for journal entries similar to the query.
         
+        Filters are applied inside the index before ranking, so the top
+        n_results are all matching entries.
+        
         Args:
-            user_id: Filter results to this user only
+            user_id: Search this user's entries only
             query: Natural language query
             n_results: Number of results to return
-            date_range: Optional (start_date, end_date) tuple
+            date_range: Optional (start_date, end_date) tuple on entry
+                creation time; either end may be None
+            filters: Optional metadata filters, e.g. {'sentiment': 'negative',
+                'emotion': ['fear', 'sadness'], 'stress_level': 'high'}
             
         Returns:
             List of matching documents with scores
         """
-        if not self._collection:
+        if not self._index:
             return []
         
         try:
-            query_embedding = self._generate_embedding(query)
-            
-            # Build where filter
-            where_filter = {"user_id": user_id}
+            query_embedding = (await self._embed_async([query]))[0]
             
-            results = self._collection.query(
-                query_embeddings=[query_embedding],
+            return await self._index_call(
+                "query",
+                str(user_id),
+                query_embedding,
                 n_results=n_results,
-                where=where_filter,
-                include=["documents", "metadatas", "distances"]
+                date_range=date_range,
+                filters=filters
             )
             
-            # Format results
-            formatted = []
-            if results["ids"] and results["ids"][0]:
-                for i, doc_id in enumerate(results["ids"][0]):
-                    formatted.append({
-                        "id": doc_id,
-                        "content": results["documents"][0][i] if results["documents"] else "",
-                        "metadata": results["metadatas"][0][i] if results["metadatas"] else {},
-                        "similarity": 1 - results["distances"][0][i] if results["distances"] else 0,
-                    })
-            
-            return formatted
-            
         except Exception as e:
             logger.error(f"Vector search failed: {e}")
             return []
@@ -180,7 +247,9 @@ class VectorService:
         self,
         user_id: str,
         question: str,
-        n_context: int = 5
+        n_context: int = 5,
+        date_range: Optional[tuple] = None,
+        filters: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         RAG-powered query: Ask questions about your past journal entries.
@@ -194,63 +263,169 @@ class VectorService:
             user_id: User ID
             question: Natural language question
             n_context: Number of relevant entries to retrieve
+            date_range: Optional (start_date, end_date) to draw context from
+            filters: Optional metadata filters for the context (see
+                search_similar())
             
         Returns:
             AI-generated answer with source citations
         """
         if not self._openai_client:
-            return {"answer": "AI service not available", "sources": []}
+            return {"answer": self.NO_AI_ANSWER, "sources": []}
         
         # Retrieve relevant context
-        similar_entries = await self.search_similar(user_id, question, n_results=n_context)
+        similar_entries = await self.search_similar(
+            user_id,
+            question,
+            n_results=n_context,
+            date_range=date_range,
+            filters=filters
+        )
         
         if not similar_entries:
-            return {
-                "answer": "I don't have enough journal history to answer that question. Keep writing!",
-                "sources": []
-            }
-        
-        # Build context for RAG
-        context_parts = []
-        for i, entry in enumerate(similar_entries):
-            date = entry.get("metadata", {}).get("created_at", "Unknown date")
-            context_parts.append(f"Entry {i+1} ({date[:10]}):\n{entry['content'][:500]}")
-        
-        context = "\n\n---\n\n".join(context_parts)
+            return {"answer": self.NO_HISTORY_ANSWER, "sources": []}
         
         # Generate answer using GPT
         response = self._openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """You are a compassionate AI assistant helping someone reflect on their personal journal entries.
-                    Answer their question based ONLY on the provided journal context.
-                    Be warm, supportive, and highlight patterns or insights.
-                    If the context doesn't contain relevant information, say so gently."""
-                },
-                {
-                    "role": "user",
-                    "content": f"Based on these journal entries:\n\n{context}\n\nAnswer this question: {question}"
-                }
-            ],
-            max_tokens=300,
+            model=self.RAG_MODEL,
+            messages=self._rag_messages(question, similar_entries),
+            max_tokens=self.RAG_MAX_TOKENS,
             temperature=0.7
         )
         
         return {
             "answer": response.choices[0].message.content,
-            "sources": [
-                {
-                    "id": e["id"],
-                    "date": e.get("metadata", {}).get("created_at", "")[:10],
-                    "preview": e["content"][:100] + "...",
-                    "similarity": round(e["similarity"], 3)
-                }
-                for e in similar_entries
-            ]
+            "sources": self._rag_sources(similar_entries)
         }
     
+    async def ask_past_self_stream(
+        self,
+        user_id: str,
+        question: str,
+        n_context: int = 5,
+        date_range: Optional[tuple] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of ask_past_self().
+        
+        Yields the retrieved sources as soon as the search returns, then the
+        answer a token delta at a time as the model produces it.
+        
+        Args:
+            user_id: User ID
+            question: Natural language question
+            n_context: Number of relevant entries to retrieve
+            date_range: Optional (start_date, end_date) to draw context from
+            filters: Optional metadata filters for the context
+        
+        Yields:
+            Events as {'event': name, 'data': payload}, in order: one
+            'sources' (list of citations), any number of 'token' (text
+            delta), then 'done' or 'error'
+        """
+        if not self._async_openai_client:
+            yield {"event": "sources", "data": []}
+            yield {"event": "token", "data": self.NO_AI_ANSWER}
+            yield {"event": "done", "data": {}}
+            return
+        
+        similar_entries = await self.search_similar(
+            user_id,
+            question,
+            n_results=n_context,
+            date_range=date_range,
+            filters=filters
+        )
+        yield {"event": "sources", "data": self._rag_sources(similar_entries)}
+        
+        if not similar_entries:
+            yield {"event": "token", "data": self.NO_HISTORY_ANSWER}
+            yield {"event": "done", "data": {}}
+            return
+        
+        try:
+            stream = await self._async_openai_client.chat.completions.create(
+                model=self.RAG_MODEL,
+                messages=self._rag_messages(question, similar_entries),
+                max_tokens=self.RAG_MAX_TOKENS,
+                temperature=0.7,
+                stream=True
+            )
+            finish_reason = None
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.delta.content:
+                    yield {"event": "token", "data": choice.delta.content}
+                finish_reason = choice.finish_reason or finish_reason
+        
+        except Exception as e:
+            logger.error(f"Streaming RAG answer failed: {e}")
+            yield {"event": "error", "data": {"detail": "Answer generation failed"}}
+            return
+        
+        yield {"event": "done", "data": {"finish_reason": finish_reason}}
+    
+    @staticmethod
+    def _rag_messages(question: str, entries: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Chat messages answering question from the retrieved entries."""
+        context_parts = []
+        for i, entry in enumerate(entries):
+            date = entry.get("metadata", {}).get("created_at", "Unknown date")
+            context_parts.append(f"Entry {i+1} ({date[:10]}):\n{entry['content'][:500]}")
+        
+        context = "\n\n---\n\n".join(context_parts)
+        
+        return [
+            {
+                "role": "system",
+                "content": """You are a compassionate AI assistant helping someone reflect on their personal journal entries.
+                Answer their question based ONLY on the provided journal context.
+                Be warm, supportive, and highlight patterns or insights.
+                If the context doesn't contain relevant information, say so gently."""
+            },
+            {
+                "role": "user",
+                "content": f"Based on these journal entries:\n\n{context}\n\nAnswer this question: {question}"
+            }
+        ]
+    
+    @staticmethod
+    def _rag_sources(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Source citations for the retrieved entries."""
+        return [
+            {
+                "id": e["id"],
+                "date": e.get("metadata", {}).get("created_at", "")[:10],
+                "preview": e["content"][:100] + "...",
+                "similarity": round(e["similarity"], 3)
+            }
+            for e in entries
+        ]
+    
+    def delete_journal_entries(self, entries: List[Dict[str, Any]]) -> int:
+        """
+        Remove journal entries from the vector store.
+        
+        Args:
+            entries: Dicts with 'journal_id' and 'user_id'
+        
+        Returns:
+            Number of entries that were indexed and are now removed
+        """
+        if not self._index or not entries:
+            return 0
+        
+        by_user = {}
+        for entry in entries:
+            by_user.setdefault(str(entry["user_id"]), []).append(str(entry["journal_id"]))
+        
+        deleted = sum(self._index.delete(user_id, ids) for user_id, ids in by_user.items())
+        logger.info(f"Removed {deleted} journals from vector store")
+        return deleted
+    
     async def delete_user_entries(self, user_id: str) -> int:
         """
         Delete all vector entries for a user (for account deletion).
@@ -258,22 +433,14 @@ class VectorService:
         Returns:
             Number of entries deleted
         """
-        if not self._collection:
+        if not self._index:
             return 0
         
         try:
-            # Get all IDs for this user
-            results = self._collection.get(
-                where={"user_id": user_id},
-                include=[]
-            )
-            
-            if results["ids"]:
-                self._collection.delete(ids=results["ids"])
-                logger.info(f"Deleted {len(results['ids'])} vector entries for user {user_id}")
-                return len(results["ids"])
+            deleted = await self._index_call("delete_user", str(user_id))
             
-            return 0
+            logger.info(f"Deleted {deleted} vector entries for user {user_id}")
+            return deleted
             
         except Exception as e:
             logger.error(f"Failed to delete user vectors: {e}")
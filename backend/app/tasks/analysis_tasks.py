@@ -3,13 +3,17 @@ Background tasks for AI analysis operations.
 These tasks run asynchronously via Celery to avoid blocking the API.
 """
 
+from datetime import datetime, timedelta
 from celery import shared_task
-from sqlalchemy import create_engine, select
+from sqlalchemy import create_engine, select, delete, func, cast, tuple_, Text, BigInteger
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import sessionmaker
 from app.config import get_settings
 from app.models.journal import JournalEntry
 from app.models.analysis import AIAnalysis
-from app.ml import sentiment_analyzer, emotion_classifier, crisis_detector, reflection_generator
+from app.models.outbox import VectorOutbox, SyncWatermark
+from app.services.ai_service import AIService
+from app.services.vector_service import vector_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -37,53 +41,28 @@ def analyze_journal_entry_async(self, journal_id: str, user_id: str):
     try:
         with SessionLocal() as db:
             # Fetch the journal entry
-            result = db.execute(
+            entry = db.execute(
                 select(JournalEntry).where(JournalEntry.id == journal_id)
-            )
-            entry = result.scalar_one_or_none()
+            ).scalar_one_or_none()
             
             if not entry:
                 logger.error(f"Journal entry {journal_id} not found")
                 return {"status": "error", "message": "Entry not found"}
             
-            content = entry.content
-            
-            # 1. Sentiment Analysis
-            sentiment_result = sentiment_analyzer.analyze(content)
-            
-            # 2. Emotion Classification
-            emotion_result = emotion_classifier.analyze(content)
-            
-            # 3. Crisis Detection
-            crisis_result = crisis_detector.detect(content)
-            
-            # 4. Generate AI Reflection
-            reflection_result = reflection_generator.generate(
-                journal_content=content,
-                primary_emotion=emotion_result['primary'],
-                sentiment_label=sentiment_result['label'],
-                stress_level=crisis_result['stress_level'],
-                crisis_detected=crisis_result['crisis_detected']
-            )
+            # 1-4. Sentiment, emotion, crisis and reflection (memoized, so a
+            # retry after a failed commit does not call the LLM again)
+            result = AIService.run_pipeline_batch([entry.content])[0]
             
             # 5. Create AI Analysis record
-            analysis = AIAnalysis(
-                user_id=user_id,
-                journal_id=journal_id,
-                sentiment_score=sentiment_result['score'],
-                sentiment_label=sentiment_result['label'],
-                primary_emotion=emotion_result['primary'],
-                emotion_scores=emotion_result['scores'],
-                stress_level=crisis_result['stress_level'],
-                stress_keywords=crisis_result['stress_keywords'],
-                ai_reflection=reflection_result['reflection'],
-                reflection_tone=reflection_result['tone'],
-                crisis_detected=crisis_result['crisis_detected'],
-                crisis_severity=crisis_result['severity'],
-                model_version=reflection_result['model_version']
-            )
-            
+            analysis = AIService.build_analysis(entry, result)
             db.add(analysis)
+            db.flush()
+            
+            # 6. Log crisis if detected
+            crisis_log = AIService.build_crisis_log(entry, analysis, result)
+            if crisis_log:
+                db.add(crisis_log)
+            
             db.commit()
             
             logger.info(f"Analysis complete for journal {journal_id}")
@@ -91,9 +70,9 @@ def analyze_journal_entry_async(self, journal_id: str, user_id: str):
             return {
                 "status": "success",
                 "journal_id": journal_id,
-                "sentiment": sentiment_result['label'],
-                "primary_emotion": emotion_result['primary'],
-                "crisis_detected": crisis_result['crisis_detected']
+                "sentiment": result['sentiment']['label'],
+                "primary_emotion": result['emotion']['primary'],
+                "crisis_detected": result['crisis']['crisis_detected']
             }
             
     except Exception as e:
@@ -101,23 +80,280 @@ def analyze_journal_entry_async(self, journal_id: str, user_id: str):
         raise self.retry(exc=e)
 
 
+def _analyze_batch(db, journal_ids: list, reanalyze: bool = False) -> dict:
+    """
+    Analyze a batch of journal entries with one fetch, one bulk insert per
+    table and a single commit (the sync counterpart of AIService.analyze_batch).
+    """
+    entries = db.execute(AIService.batch_entries_query(journal_ids, reanalyze=reanalyze)).scalars().all()
+    if not entries:
+        return {"analyzed": 0, "crisis_detected": 0}
+    
+    entry_ids = [e.id for e in entries]
+    logged = set(db.execute(AIService.logged_journals_query(entry_ids)).scalars())
+    if reanalyze:
+        db.execute(AIService.delete_analyses_statement(entry_ids))
+    
+    results = AIService.run_pipeline_batch([e.content for e in entries])
+    
+    analyses, crisis_logs, relinks = AIService.build_batch_records(entries, results, logged)
+    db.add_all(analyses)
+    db.flush()
+    db.add_all(crisis_logs)
+    if relinks:
+        db.execute(AIService.RELINK_CRISIS_LOG, relinks)
+    db.commit()
+    
+    return {
+        "analyzed": len(analyses),
+        "crisis_detected": sum(1 for r in results if r['crisis']['crisis_detected'])
+    }
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def analyze_journal_entries_batch(self, journal_ids: list, reanalyze: bool = False):
+    """
+    Analyze many journal entries in one transaction.
+    
+    Args:
+        journal_ids: UUIDs of the journal entries
+        reanalyze: Replace existing analyses (e.g. after a model change)
+    """
+    logger.info(f"Starting batch analysis for {len(journal_ids)} journals")
+    
+    try:
+        with SessionLocal() as db:
+            counts = _analyze_batch(db, journal_ids, reanalyze=reanalyze)
+        
+        logger.info(f"Batch analysis complete: {counts['analyzed']} analyzed")
+        return {"status": "success", **counts}
+    
+    except Exception as e:
+        logger.exception(f"Batch analysis failed: {e}")
+        raise self.retry(exc=e)
+
+
+@shared_task
+def reanalyze_user_history(user_id: str, batch_size: int = 200):
+    """
+    Re-run the analysis pipeline over a user's full journal history,
+    replacing existing analyses batch by batch.
+    """
+    logger.info(f"Re-analyzing journal history for user {user_id}")
+    
+    analyzed = 0
+    crisis_detected = 0
+    
+    with SessionLocal() as db:
+        journal_ids = db.execute(
+            select(JournalEntry.id)
+            .where(JournalEntry.user_id == user_id)
+            .order_by(JournalEntry.created_at)
+        ).scalars().all()
+        
+        for start in range(0, len(journal_ids), batch_size):
+            counts = _analyze_batch(db, journal_ids[start:start + batch_size], reanalyze=True)
+            analyzed += counts["analyzed"]
+            crisis_detected += counts["crisis_detected"]
+    
+    logger.info(f"Re-analysis complete for user {user_id}: {analyzed} entries")
+    return {"status": "success", "user_id": user_id, "analyzed": analyzed, "crisis_detected": crisis_detected}
+
+
+# Watermark name of the vector index outbox consumer
+VECTOR_SYNC_WATERMARK = "vector_index"
+
+
+def _embedding_query():
+    """Journal entries with the analysis labels stored as index metadata."""
+    return (
+        select(
+            JournalEntry,
+            AIAnalysis.sentiment_label,
+            AIAnalysis.primary_emotion,
+            AIAnalysis.stress_level
+        )
+        .outerjoin(AIAnalysis, JournalEntry.id == AIAnalysis.journal_id)
+    )
+
+
+def _index_entry(entry: JournalEntry, sentiment_label, primary_emotion, stress_level) -> dict:
+    """Vector store input for a row of _embedding_query()."""
+    metadata = {
+        "created_at": entry.created_at.isoformat(),
+        "entry_date": entry.entry_date.isoformat(),
+        "sentiment": sentiment_label,
+        "emotion": primary_emotion,
+        "stress_level": stress_level,
+    }
+    return {
+        "journal_id": str(entry.id),
+        "user_id": str(entry.user_id),
+        "content": entry.content,
+        # Chroma metadata values cannot be null
+        "metadata": {k: v for k, v in metadata.items() if v is not None}
+    }
+
+
+def _locked_watermark(db, name: str) -> SyncWatermark:
+    """Fetch a watermark row, creating it, locked until the transaction ends."""
+    db.execute(
+        insert(SyncWatermark)
+        .values(name=name, position=0, updated_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=[SyncWatermark.name])
+    )
+    return db.execute(
+        select(SyncWatermark).where(SyncWatermark.name == name).with_for_update()
+    ).scalar_one()
+
+
+def _oldest_running_txid(db) -> int:
+    """Transaction id below which every transaction has committed or aborted."""
+    return db.execute(
+        select(cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger))
+    ).scalar_one()
+
+
+def _sync_vector_batch(db, batch_size: int) -> dict:
+    """
+    Apply the next batch of outbox changes past the watermark and advance it.
+    
+    Changes are collapsed per entry and applied from the entry's current
+    state (re-embedded if it exists, removed from the index if not), so
+    replaying a batch is harmless. The watermark row lock serializes
+    concurrent consumers.
+    
+    Only rows written by transactions older than every running one are
+    read, in (txid, id) order, so a slow transaction's rows can never land
+    behind the watermark after it has moved on.
+    
+    Raises:
+        RuntimeError: The vector index is unavailable (the watermark is
+            left where it is)
+    """
+    if not vector_service.available:
+        raise RuntimeError("Vector index not available")
+    
+    watermark = _locked_watermark(db, VECTOR_SYNC_WATERMARK)
+    horizon = _oldest_running_txid(db)
+    
+    changes = db.execute(
+        select(VectorOutbox)
+        .where(
+            tuple_(VectorOutbox.txid, VectorOutbox.id) > tuple_(watermark.txid, watermark.position),
+            VectorOutbox.txid < horizon
+        )
+        .order_by(VectorOutbox.txid, VectorOutbox.id)
+        .limit(batch_size)
+    ).scalars().all()
+    
+    if not changes:
+        db.rollback()
+        return {"changes": 0, "upserted": 0, "deleted": 0}
+    
+    owners = {change.journal_id: change.user_id for change in changes}
+    rows = db.execute(_embedding_query().where(JournalEntry.id.in_(owners))).all()
+    present = {row[0].id for row in rows}
+    
+    upserted = vector_service.add_journal_entries_batch([_index_entry(*row) for row in rows])
+    deleted = vector_service.delete_journal_entries([
+        {"journal_id": journal_id, "user_id": user_id}
+        for journal_id, user_id in owners.items()
+        if journal_id not in present
+    ])
+    
+    watermark.txid = changes[-1].txid
+    watermark.position = changes[-1].id
+    db.commit()
+    
+    return {"changes": len(changes), "upserted": upserted, "deleted": deleted}
+
+
+@shared_task
+def sync_vector_index(batch_size: int = None):
+    """
+    Apply journal changes from the outbox to the vector index.
+    Runs every VECTOR_SYNC_INTERVAL seconds via Celery Beat.
+    
+    Each batch is applied and its watermark committed before the next, so
+    a failed run resumes where it stopped.
+    """
+    if not vector_service.available:
+        logger.warning("Vector index not available; outbox changes left for a later run")
+        return {"status": "error", "message": "Vector index not available"}
+    
+    batch_size = batch_size or settings.VECTOR_SYNC_BATCH_SIZE
+    totals = {"changes": 0, "upserted": 0, "deleted": 0}
+    
+    with SessionLocal() as db:
+        for _ in range(settings.VECTOR_SYNC_MAX_BATCHES):
+            counts = _sync_vector_batch(db, batch_size)
+            for name, count in counts.items():
+                totals[name] += count
+            if counts["changes"] < batch_size:
+                break
+    
+    if totals["changes"]:
+        logger.info(
+            f"Vector index sync applied {totals['changes']} changes: "
+            f"{totals['upserted']} upserted, {totals['deleted']} deleted"
+        )
+    return {"status": "success", **totals}
+
+
 @shared_task
 def cleanup_stale_embeddings():
     """
-    Cleanup old vector embeddings that are no longer needed.
+    Prune vector outbox rows that have been applied to the index.
     Runs daily via Celery Beat.
+    
+    Rows past the sync watermark are kept whatever their age, and applied
+    rows are kept for VECTOR_OUTBOX_RETENTION_DAYS.
     """
     logger.info("Running stale embeddings cleanup...")
-    # TODO: Implement ChromaDB cleanup logic
-    return {"status": "success", "cleaned": 0}
+    
+    cutoff = datetime.utcnow() - timedelta(days=settings.VECTOR_OUTBOX_RETENTION_DAYS)
+    with SessionLocal() as db:
+        watermark = db.execute(
+            select(SyncWatermark.txid, SyncWatermark.position)
+            .where(SyncWatermark.name == VECTOR_SYNC_WATERMARK)
+        ).one_or_none() or (0, 0)
+        
+        result = db.execute(
+            delete(VectorOutbox).where(
+                tuple_(VectorOutbox.txid, VectorOutbox.id) <= tuple_(*watermark),
+                VectorOutbox.created_at < cutoff
+            )
+        )
+        db.commit()
+    
+    logger.info(f"Pruned {result.rowcount} applied vector outbox rows")
+    return {"status": "success", "cleaned": result.rowcount}
 
 
 @shared_task
-def generate_user_embeddings(user_id: str):
+def generate_user_embeddings(user_id: str, batch_size: int = 500):
     """
     Generate vector embeddings for all of a user's journal entries.
     Used for RAG-based insights.
+    
+    Entries are embedded batch_size at a time, each batch packed into as
+    few embedding requests as the API limits allow.
     """
     logger.info(f"Generating embeddings for user {user_id}")
-    # TODO: Implement ChromaDB embedding generation
-    return {"status": "success", "user_id": user_id}
+    
+    embedded = 0
+    
+    with SessionLocal() as db:
+        rows = db.execute(
+            _embedding_query()
+            .where(JournalEntry.user_id == user_id)
+            .order_by(JournalEntry.created_at)
+        ).all()
+    
+    for start in range(0, len(rows), batch_size):
+        entries = [_index_entry(*row) for row in rows[start:start + batch_size]]
+        embedded += vector_service.add_journal_entries_batch(entries)
+    
+    logger.info(f"Embeddings complete for user {user_id}: {embedded} entries")
+    return {"status": "success", "user_id": user_id, "embedded": embedded}
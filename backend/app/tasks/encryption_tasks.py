@@ -0,0 +1,188 @@
+"""
+Encryption maintenance tasks.
+Migrates journal content to encryption at rest and rotates master keys.
+"""
+
+from celery import shared_task
+from sqlalchemy import create_engine, select, update, func, not_, bindparam, table, column, Text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime
+import logging
+import time
+import uuid
+
+from app.config import get_settings
+from app.models.checkpoint import JobCheckpoint
+from app.services.encryption_service import content_keyring
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Sync engine for Celery
+sync_engine = create_engine(
+    settings.DATABASE_URL.replace("+asyncpg", ""),
+    echo=False
+)
+SessionLocal = sessionmaker(bind=sync_engine)
+
+# Raw view of journal content, bypassing EncryptedText so stored values are
+# read and written exactly as they are
+journal_content = table(
+    "journal_entries",
+    column("id", UUID(as_uuid=True)),
+    column("content", Text),
+)
+
+CHECKPOINT_PREFIX = "journal-encryption"
+
+
+def _checkpoint(db, name: str) -> JobCheckpoint:
+    """Fetch or create a job checkpoint."""
+    checkpoint = db.get(JobCheckpoint, name)
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(name=name, processed=0)
+        db.add(checkpoint)
+        db.commit()
+    return checkpoint
+
+
+def _pending(cursor: str | None):
+    """Rows past the cursor not yet encrypted under the current master key."""
+    condition = not_(journal_content.c.content.startswith(content_keyring.current_prefix, autoescape=True))
+    if cursor:
+        condition = condition & (journal_content.c.id > uuid.UUID(cursor))
+    return condition
+
+
+def _reencrypt_batch(db, rows) -> int:
+    """
+    Encrypt a batch under the current key with the bulk cipher path.
+    
+    Rows that cannot be decrypted (sealed under a key missing from
+    ENCRYPTION_RETIRED_KEYS, or corrupt) are left untouched.
+    
+    Returns:
+        Number of rows skipped as undecryptable
+    """
+    opened = content_keyring.open_many([row.content for row in rows])
+    readable = [(row, plaintext) for row, plaintext in zip(rows, opened) if plaintext is not None]
+    sealed = content_keyring.seal_many([plaintext for _, plaintext in readable])
+    
+    # Matching on the old value skips rows edited since they were read;
+    # those were already written under the current key
+    if readable:
+        db.execute(
+            update(journal_content)
+            .where(
+                journal_content.c.id == bindparam("row_id"),
+                journal_content.c.content == bindparam("old_content")
+            )
+            .values(content=bindparam("new_content")),
+            [
+                {"row_id": row.id, "old_content": row.content, "new_content": new_content}
+                for (row, _), new_content in zip(readable, sealed)
+            ]
+        )
+    return len(rows) - len(readable)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def rotate_journal_encryption(self, batch_size: int = None, max_rows_per_second: int = None):
+    """
+    Encrypt journal content under the current master key.
+    
+    Covers both the initial migration (plaintext rows) and key rotation
+    (rows under a key listed in ENCRYPTION_RETIRED_KEYS). Rows are walked
+    in id order with keyset pagination, and each batch is committed
+    together with its checkpoint, so the job resumes where it stopped.
+    Throughput is capped at max_rows_per_second, and after
+    ENCRYPTION_ROTATION_TIME_BUDGET seconds the task re-enqueues itself
+    to stay clear of the Celery time limit. Rows that cannot be decrypted
+    are skipped and counted as unreadable rather than failing the batch.
+    
+    Args:
+        batch_size: Rows per transaction
+        max_rows_per_second: Throughput cap
+    """
+    if not content_keyring.enabled:
+        return {"status": "error", "message": "ENCRYPTION_MASTER_KEY is not set"}
+    
+    batch_size = batch_size or settings.ENCRYPTION_ROTATION_BATCH_SIZE
+    max_rows_per_second = max_rows_per_second or settings.ENCRYPTION_ROTATION_MAX_ROWS_PER_SECOND
+    checkpoint_name = f"{CHECKPOINT_PREFIX}:{content_keyring.current_key_id}"
+    
+    started = time.monotonic()
+    deadline = started + settings.ENCRYPTION_ROTATION_TIME_BUDGET
+    processed = 0
+    unreadable = 0
+    
+    try:
+        with SessionLocal() as db:
+            checkpoint = _checkpoint(db, checkpoint_name)
+            if checkpoint.finished_at:
+                return {"status": "success", "processed": checkpoint.processed, "remaining": 0}
+            
+            remaining = db.execute(
+                select(func.count()).select_from(journal_content).where(_pending(checkpoint.cursor))
+            ).scalar_one()
+            logger.info(f"Encrypting journal content under key {content_keyring.current_key_id}: {remaining} rows to go")
+            
+            while True:
+                rows = db.execute(
+                    select(journal_content.c.id, journal_content.c.content)
+                    .where(_pending(checkpoint.cursor))
+                    .order_by(journal_content.c.id)
+                    .limit(batch_size)
+                ).all()
+                
+                if not rows:
+                    checkpoint.finished_at = datetime.utcnow()
+                    total = checkpoint.processed
+                    db.commit()
+                    break
+                
+                skipped = _reencrypt_batch(db, rows)
+                if skipped:
+                    logger.error(f"Journal encryption skipped {skipped} undecryptable rows up to {rows[-1].id}")
+                unreadable += skipped
+                checkpoint.cursor = str(rows[-1].id)
+                checkpoint.processed += len(rows)
+                db.commit()
+                
+                processed += len(rows)
+                remaining = max(0, remaining - len(rows))
+                elapsed = time.monotonic() - started
+                progress = {
+                    "processed": checkpoint.processed,
+                    "remaining": remaining,
+                    "unreadable": unreadable,
+                    "rows_per_second": round(processed / elapsed, 1) if elapsed else None,
+                }
+                if self.request.id:
+                    self.update_state(state="PROGRESS", meta=progress)
+                logger.info(
+                    f"Journal encryption: {progress['processed']} done, {remaining} remaining "
+                    f"({progress['rows_per_second']} rows/s)"
+                )
+                
+                # Throttle to the rate cap
+                time.sleep(max(0.0, processed / max_rows_per_second - (time.monotonic() - started)))
+                
+                if time.monotonic() >= deadline:
+                    self.apply_async(kwargs={"batch_size": batch_size, "max_rows_per_second": max_rows_per_second})
+                    return {"status": "continuing", **progress}
+        
+        elapsed = time.monotonic() - started
+        logger.info(f"Journal encryption complete: {processed} rows this run")
+        return {
+            "status": "success",
+            "processed": total,
+            "remaining": 0,
+            "unreadable": unreadable,
+            "rows_per_second": round(processed / elapsed, 1) if elapsed else None,
+        }
+    
+    except Exception as e:
+        logger.exception(f"Journal encryption failed: {e}")
+        raise self.retry(exc=e)
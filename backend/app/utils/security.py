@@ -1,13 +1,24 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from app.config import get_settings
 
+logger = logging.getLogger(__name__)
+
 settings = get_settings()
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Verified token payloads, kept until the token expires
+_verified_tokens: OrderedDict = OrderedDict()  # token -> (payload, exp)
+
 
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt."""
@@ -19,6 +30,85 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordPool:
+    """
+    Bounded thread pool for bcrypt, with an awaitable API.
+    
+    bcrypt releases the GIL while hashing, so a few threads keep the event
+    loop free during login bursts. Once more than max_queue operations are
+    waiting for a thread, new ones are rejected with 503 rather than
+    queued behind seconds of work. Queue wait is recorded for stats().
+    """
+    
+    # Recent queue waits kept for percentiles
+    WAIT_SAMPLES = 1000
+    
+    def __init__(self, workers: int, max_queue: int):
+        self._workers = workers
+        self._max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._pending = 0  # Submitted and not finished (running or queued)
+        self._completed = 0
+        self._rejected = 0
+        self._waits: deque = deque(maxlen=self.WAIT_SAMPLES)
+        self._max_wait = 0.0
+    
+    @staticmethod
+    def _timed(submitted_at: float, fn, *args):
+        """Run fn on a pool thread, returning (queue wait, result)."""
+        wait = time.monotonic() - submitted_at
+        return wait, fn(*args)
+    
+    async def _run(self, fn, *args):
+        """Run fn in the pool, shedding load when the queue is full."""
+        if self._pending >= self._workers + self._max_queue:
+            self._rejected += 1
+            logger.warning(f"Password hashing queue full ({self._pending} pending). Shedding request.")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        
+        self._pending += 1
+        try:
+            wait, result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._timed, time.monotonic(), fn, *args
+            )
+        finally:
+            self._pending -= 1
+        
+        self._completed += 1
+        self._waits.append(wait)
+        self._max_wait = max(self._max_wait, wait)
+        return result
+    
+    async def hash(self, password: str) -> str:
+        """Non-blocking hash_password()."""
+        return await self._run(hash_password, password)
+    
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Non-blocking verify_password()."""
+        return await self._run(verify_password, plain_password, hashed_password)
+    
+    def stats(self) -> dict:
+        """Pool occupancy, shed count and queue wait (ms) over recent operations."""
+        waits = sorted(self._waits)
+        return {
+            "workers": self._workers,
+            "max_queue": self._max_queue,
+            "pending": self._pending,
+            "queued": max(0, self._pending - self._workers),
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "wait_ms": {
+                "mean": round(1000 * sum(waits) / len(waits), 2) if waits else 0.0,
+                "p95": round(1000 * waits[int(0.95 * (len(waits) - 1))], 2) if waits else 0.0,
+                "max": round(1000 * self._max_wait, 2),
+            },
+        }
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -35,9 +125,35 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
 
 
 def verify_token(token: str) -> dict | None:
-    """Verify and decode a JWT token."""
+    """
+    Verify and decode a JWT token.
+    
+    Valid payloads are memoized per token until its exp claim, so repeat
+    requests skip the signature check; tokens without exp are not cached.
+    """
+    cached = _verified_tokens.get(token)
+    if cached is not None:
+        payload, expires_at = cached
+        if expires_at > time.time():
+            _verified_tokens.move_to_end(token)
+            return dict(payload)
+        _verified_tokens.pop(token, None)
+    
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
     except JWTError:
         return None
+    
+    expires_at = payload.get("exp")
+    if isinstance(expires_at, (int, float)):
+        _verified_tokens[token] = (dict(payload), expires_at)
+        while len(_verified_tokens) > settings.TOKEN_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+    return payload
+
+
+# Singleton instance
+password_pool = PasswordPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
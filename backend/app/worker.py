@@ -20,6 +20,7 @@ celery_app = Celery(
         "app.tasks.notification_tasks",
         "app.tasks.trend_analysis",
         "app.tasks.export_tasks",
+        "app.tasks.encryption_tasks",
     ]
 )
 
@@ -50,6 +51,11 @@ celery_app.conf.beat_schedule = {
         "task": "app.tasks.notification_tasks.send_weekly_summaries",
         "schedule": crontab(hour=10, minute=0, day_of_week=0),
     },
+    # Apply journal changes to the vector index
+    "vector-index-sync": {
+        "task": "app.tasks.analysis_tasks.sync_vector_index",
+        "schedule": float(settings.VECTOR_SYNC_INTERVAL),
+    },
     # Cleanup old cache entries daily at 3 AM UTC
     "daily-cache-cleanup": {
         "task": "app.tasks.analysis_tasks.cleanup_stale_embeddings",
@@ -0,0 +1,41 @@
+"""Tests for batch analysis record building."""
+
+import uuid
+from types import SimpleNamespace
+
+from app.services.ai_service import AIService
+
+
+def _entry():
+    return SimpleNamespace(id=uuid.uuid4(), user_id=uuid.uuid4(), content="I can't go on like this")
+
+
+def _result(crisis: bool) -> dict:
+    return {
+        'sentiment': {'score': -0.8, 'label': 'negative'},
+        'emotion': {'primary': 'sadness', 'scores': {'sadness': 0.9}},
+        'crisis': {
+            'crisis_detected': crisis,
+            'severity': 'severe' if crisis else 'none',
+            'detected_patterns': ["can't go on"] if crisis else [],
+            'stress_level': 'high',
+            'stress_keywords': [],
+        },
+        'reflection': {'reflection': '...', 'tone': 'grounding', 'model_version': 'test'},
+    }
+
+
+def test_batch_records_do_not_relog_existing_crisis_logs():
+    logged, fresh, calm = _entry(), _entry(), _entry()
+    
+    analyses, crisis_logs, relinks = AIService.build_batch_records(
+        [logged, fresh, calm],
+        [_result(True), _result(True), _result(False)],
+        {logged.id}
+    )
+    
+    assert len(analyses) == 3
+    assert all(analysis.id is not None for analysis in analyses)
+    assert [log.journal_id for log in crisis_logs] == [fresh.id]
+    assert crisis_logs[0].analysis_id == analyses[1].id
+    assert relinks == [{"log_journal_id": logged.id, "new_analysis_id": analyses[0].id}]
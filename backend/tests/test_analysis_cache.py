@@ -0,0 +1,45 @@
+"""Tests for the two-tier analysis cache."""
+
+import fakeredis
+import pytest
+import redis
+
+from app.services.analysis_cache import AnalysisCache
+
+
+class FailingRedis:
+    """Redis double whose reads fail, counting the attempts."""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def get(self, key):
+        self.calls += 1
+        raise redis.ConnectionError("connection refused")
+
+
+@pytest.mark.asyncio
+async def test_sync_and_async_clients_share_results():
+    server = fakeredis.FakeServer()
+    writer = AnalysisCache()
+    writer._client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    reader = AnalysisCache()
+    reader._async_client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    key = writer.make_key("sentiment", "v1", "  a calm day ")
+    
+    writer.set_sync(key, {"label": "positive"})
+    
+    assert await reader.get("sentiment", key) == {"label": "positive"}
+    assert await reader.get("sentiment", key) == {"label": "positive"}
+    assert reader.stats()["stages"]["sentiment"]["shared_hits"] == 1
+    assert reader.stats()["stages"]["sentiment"]["local_hits"] == 1
+
+
+def test_sync_errors_back_off_to_misses():
+    cache = AnalysisCache()
+    cache._client = FailingRedis()
+    
+    assert cache.get_sync("emotion", "key") is None
+    assert cache._backoff.active
+    assert cache.get_sync("emotion", "key") is None
+    assert cache._client.calls == 1
@@ -0,0 +1,27 @@
+"""Tests for admin-only access to operational endpoints."""
+
+import pytest
+from fastapi import HTTPException
+
+from app.middleware import auth
+from app.middleware.auth import GUEST_EMAIL, get_current_admin
+from app.models.user import User
+
+
+@pytest.fixture(autouse=True)
+def admins(monkeypatch):
+    monkeypatch.setattr(auth.settings, "ADMIN_EMAILS", f"ops@example.com, {GUEST_EMAIL}")
+
+
+@pytest.mark.asyncio
+async def test_listed_admin_is_allowed():
+    user = User(email="Ops@Example.com")
+    assert await get_current_admin(user) is user
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("email", ["someone@example.com", GUEST_EMAIL])
+async def test_other_users_and_guest_are_forbidden(email):
+    with pytest.raises(HTTPException) as excinfo:
+        await get_current_admin(User(email=email))
+    assert excinfo.value.status_code == 403
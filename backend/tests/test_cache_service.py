@@ -0,0 +1,124 @@
+"""Tests for CacheService key versioning and read-through loads."""
+
+import asyncio
+import uuid
+
+import fakeredis.aioredis
+import redis
+import pytest
+
+from app.services.cache_service import CacheService, CacheNamespace
+
+
+@pytest.fixture
+def cache():
+    service = CacheService()
+    service._redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return service
+
+
+def test_per_user_namespaces_are_one_key_segment():
+    user_id = uuid.uuid4()
+    assert ":" not in CacheNamespace.journal_list(user_id)
+    assert ":" not in CacheNamespace.mood_history(user_id)
+
+
+@pytest.mark.asyncio
+async def test_reaper_keeps_live_per_user_keys(cache):
+    namespace = CacheNamespace.journal_list(uuid.uuid4())
+    await cache.set(namespace, "10:0", {"entries": []})
+    
+    assert await cache.reap_orphaned_keys() == 0
+    assert await cache.get(namespace, "10:0") == {"entries": []}
+
+
+@pytest.mark.asyncio
+async def test_reaper_removes_retired_generations(cache):
+    namespace = CacheNamespace.mood_history(uuid.uuid4())
+    await cache.set(namespace, "weekly:30:2026-01-01", {"entries": []})
+    await cache.invalidate_namespace(namespace)
+    await cache.set(namespace, "weekly:30:2026-01-01", {"entries": [1]})
+    await cache._redis_client.set("neuroleaf:legacy-unversioned", "1")
+    
+    assert await cache.reap_orphaned_keys() == 2
+    assert await cache.get(namespace, "weekly:30:2026-01-01") == {"entries": [1]}
+
+
+@pytest.mark.asyncio
+async def test_shared_load_survives_cancelled_caller(cache):
+    started = asyncio.Event()
+    release = asyncio.Event()
+    
+    async def loader():
+        started.set()
+        await release.wait()
+        return {"value": 1}
+    
+    first = asyncio.create_task(cache.get_or_load("stats", "k", loader))
+    await started.wait()
+    second = asyncio.create_task(cache.get_or_load("stats", "k", loader))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    
+    assert await second == {"value": 1}
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+
+@pytest.mark.asyncio
+async def test_generations_are_not_recorded_without_listener(cache):
+    namespace = CacheNamespace.journal_list(uuid.uuid4())
+    await cache.invalidate_namespace(namespace)
+    
+    # Another worker bumps the generation; no broadcast reaches this one
+    await cache._redis_client.incr(cache._generation_key(namespace))
+    await cache.set(namespace, "10:0", {"entries": [1]})
+    
+    assert cache._namespace_generations == {}
+    assert await cache._redis_client.get(cache._make_key(namespace, "10:0", 2))
+
+class FailingRedis:
+    """Redis double whose calls fail, counting the attempts."""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    async def get(self, key):
+        self.calls += 1
+        raise redis.ConnectionError("connection refused")
+    
+    async def ping(self):
+        self.calls += 1
+        raise redis.ConnectionError("connection refused")
+
+
+@pytest.mark.asyncio
+async def test_status_reports_backoff_without_calling_redis():
+    service = CacheService()
+    client = FailingRedis()
+    service._redis_client = client
+    assert service.status()["backend"] == "redis"
+    
+    assert await service.get("stats", "k") is None
+    calls = client.calls
+    
+    status = service.status()
+    assert status["backend"] == "memory"
+    assert "connection refused" in status["last_error"]
+    assert client.calls == calls
+
+
+def test_health_endpoint_does_not_ping(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import main
+    
+    client = FailingRedis()
+    monkeypatch.setattr(main.cache_service, "_redis_client", client)
+    
+    response = TestClient(main.app).get("/health")
+    
+    assert response.status_code == 200
+    assert response.json()["cache"] == "redis"
+    assert client.calls == 0
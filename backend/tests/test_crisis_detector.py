@@ -0,0 +1,140 @@
+"""Parity tests for the single-pass crisis detector against the per-keyword scan it replaced."""
+
+import random
+import re
+
+import pytest
+
+from app.ml.crisis_detector import CrisisDetector, crisis_detector
+
+
+def legacy_detect(text: str) -> dict:
+    """The original implementation: one search per keyword and pattern."""
+    text_lower = text.lower()
+    detected_patterns = [k for k in CrisisDetector.HIGH_RISK_KEYWORDS if k in text_lower]
+    if detected_patterns:
+        return {
+            'crisis_detected': True,
+            'severity': 'severe',
+            'detected_patterns': detected_patterns,
+            'stress_keywords': [],
+            'stress_level': 'high'
+        }
+    
+    for pattern in CrisisDetector.MODERATE_RISK_PATTERNS:
+        match = re.search(pattern, text_lower, re.IGNORECASE)
+        if match:
+            detected_patterns.append(match.group(0))
+    if detected_patterns:
+        return {
+            'crisis_detected': True,
+            'severity': 'moderate',
+            'detected_patterns': detected_patterns,
+            'stress_keywords': [],
+            'stress_level': 'high'
+        }
+    
+    stress_keywords_found = [
+        k for k in CrisisDetector.STRESS_KEYWORDS
+        if re.search(r'\b' + re.escape(k) + r'\b', text_lower)
+    ]
+    stress_count = len(stress_keywords_found)
+    if stress_count >= 5:
+        stress_level = 'high'
+    elif stress_count >= 2:
+        stress_level = 'moderate'
+    else:
+        stress_level = 'low'
+    return {
+        'crisis_detected': False,
+        'severity': 'none',
+        'detected_patterns': [],
+        'stress_keywords': stress_keywords_found,
+        'stress_level': stress_level
+    }
+
+
+CORPUS = [
+    # Empty and neutral
+    "",
+    "Had a lovely walk in the park today.",
+    # Word boundaries (stress keywords are whole words, high-risk are substrings)
+    "I am stressed",
+    "I am stressedout and distressed",
+    "Busybody neighbours, not busy at all",
+    "untired, retired, tired.",
+    "anxiety-anxious_worried",
+    "the deadline's workload",
+    "nonsuicidal thoughts",
+    "I'm so tired of everything",
+    "I'm retired of everything",
+    "They said nothing matters",
+    "Somethingnothing matters",
+    # Overlapping and contained high-risk keywords
+    "suicidal",
+    "suicide and suicidal",
+    "I want to harm myself and hurt myself",
+    "self-harm",
+    "going to kill myself",
+    "I want to dielike",
+    "can't go on, can't take it anymore",
+    "endend it all",
+    "better off deadline",
+    # Moderate patterns, leftmost match and greedy spans
+    "I don't want to be here. I don't want to exist.",
+    "hopelessness will last forever and always",
+    "hopeless, never mind, hopeless forever",
+    "Everyone would be better off without me",
+    "no point in trying, no point in living",
+    "give up on life",
+    "I can't take this anymore and I'm tired of trying to live",
+    # Case
+    "SUICIDE",
+    "I Want To Die",
+    "STRESSED, Overwhelmed, ANXIOUS, Tired, Worried",
+    "Nothing Will Help",
+    "DON'T WANT TO WAKE UP",
+    "HOPELESS FOREVER",
+    # Stress levels
+    "busy",
+    "busy hectic",
+    "stress stressed overwhelmed anxious anxiety pressure burden",
+    # Non-ASCII text around keywords
+    "Ça va? tired… worried—busy",
+    "İstanbul was hectic",
+]
+
+
+@pytest.mark.parametrize("text", CORPUS)
+def test_matches_legacy_scan(text):
+    assert crisis_detector.detect(text) == legacy_detect(text)
+
+
+FRAGMENTS = sorted(
+    set(CrisisDetector.HIGH_RISK_KEYWORDS)
+    | set(CrisisDetector.STRESS_KEYWORDS)
+    | {
+        "don't want to live", "tired of life", "everyone better off without me",
+        "no point in anything", "can't take it anymore", "give up on everything",
+        "hopeless", "forever", "never", "nothing can help",
+    }
+)
+JOINERS = [" ", "", "-", "_", ". ", ", ", "'", "\n", "s ", "ly ", " the "]
+
+
+def test_matches_legacy_scan_on_random_corpus():
+    rng = random.Random(20261017)
+    for _ in range(3000):
+        pieces = []
+        for _ in range(rng.randint(1, 6)):
+            fragment = rng.choice(FRAGMENTS)
+            if rng.random() < 0.3:
+                fragment = fragment.upper() if rng.random() < 0.5 else fragment.title()
+            pieces.append(fragment)
+            pieces.append(rng.choice(JOINERS))
+        text = "".join(pieces)
+        assert crisis_detector.detect(text) == legacy_detect(text), text
+
+
+def test_batch_matches_single_detection():
+    assert crisis_detector.analyze_batch(CORPUS) == [crisis_detector.detect(text) for text in CORPUS]
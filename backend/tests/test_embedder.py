@@ -0,0 +1,220 @@
+"""Tests for OpenAIEmbedder and the embedding backfill against a local fake embeddings server."""
+
+import hashlib
+import json
+import threading
+import uuid
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from openai import BadRequestError
+
+from app.ml.embedder import OpenAIEmbedder
+
+DIMENSIONS = 8
+
+
+def fake_vector(text: str) -> list:
+    """Deterministic embedding of a text."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [byte / 255 for byte in digest[:DIMENSIONS]]
+
+
+class FakeEmbeddingsServer:
+    """OpenAI-compatible /v1/embeddings endpoint recording each request's inputs."""
+    
+    def __init__(self, rate_limit_first: bool = False, max_request_bytes: int = None):
+        self.requests = []
+        self._rate_limit_next = rate_limit_first
+        self._max_request_bytes = max_request_bytes
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if server._rate_limit_next:
+                    server._rate_limit_next = False
+                    self._reply(429, {"error": {"message": "rate limited", "type": "rate_limit"}})
+                    return
+                if server._max_request_bytes is not None and sum(
+                    len(text.encode("utf-8")) for text in body["input"]
+                ) > server._max_request_bytes:
+                    self._reply(400, {"error": {"message": "too many tokens", "type": "invalid_request_error"}})
+                    return
+                
+                server.requests.append(body["input"])
+                data = [
+                    {"object": "embedding", "index": i, "embedding": fake_vector(text)}
+                    for i, text in enumerate(body["input"])
+                ]
+                # Out of order, as the API does not promise ordering
+                self._reply(200, {
+                    "object": "list",
+                    "data": data[::-1],
+                    "model": body["model"],
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                })
+            
+            def _reply(self, status: int, payload: dict):
+                raw = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.send_header("retry-after-ms", "10")
+                self.end_headers()
+                self.wfile.write(raw)
+            
+            def log_message(self, *args):
+                pass
+        
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+    
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    fake = FakeEmbeddingsServer()
+    yield fake
+    fake.close()
+
+
+def test_embed_returns_vectors_in_input_order(server):
+    embedder = OpenAIEmbedder(base_url=server.base_url, api_key="test")
+    texts = ["first", "second", "third"]
+    
+    assert embedder.embed(texts) == [fake_vector(text) for text in texts]
+    assert server.requests == [texts]
+
+
+def test_embed_splits_into_request_sized_batches(monkeypatch, server):
+    monkeypatch.setattr(OpenAIEmbedder, "MAX_BATCH_INPUTS", 2)
+    embedder = OpenAIEmbedder(base_url=server.base_url, api_key="test")
+    texts = [f"entry {i}" for i in range(5)]
+    
+    assert embedder.embed(texts) == [fake_vector(text) for text in texts]
+    assert sorted(len(batch) for batch in server.requests) == [1, 2, 2]
+
+
+def test_embed_retries_rate_limits():
+    fake = FakeEmbeddingsServer(rate_limit_first=True)
+    try:
+        embedder = OpenAIEmbedder(base_url=fake.base_url, api_key="test")
+        assert embedder.embed(["retry me"]) == [fake_vector("retry me")]
+    finally:
+        fake.close()
+
+
+def test_truncation_is_safe_for_multibyte_text():
+    embedder = OpenAIEmbedder(base_url="http://127.0.0.1:1/v1", api_key="test")
+    embedder._encoding, embedder._encoding_loaded = None, True  # Count UTF-8 bytes
+    
+    prepared, tokens = embedder._prepare("日記😊" * 5000)
+    
+    assert tokens == len(prepared.encode("utf-8")) <= OpenAIEmbedder.MAX_INPUT_TOKENS
+    assert "\ufffd" not in prepared
+
+
+def test_rejected_batch_is_retried_in_halves():
+    fake = FakeEmbeddingsServer(max_request_bytes=8)
+    try:
+        embedder = OpenAIEmbedder(base_url=fake.base_url, api_key="test")
+        texts = ["aaaa", "bbbb", "cccc"]
+        
+        assert embedder.embed(texts) == [fake_vector(text) for text in texts]
+        assert fake.requests == [["aaaa"], ["bbbb", "cccc"]]
+        
+        with pytest.raises(BadRequestError):
+            embedder.embed(["too long to embed"])
+    finally:
+        fake.close()
+
+
+@pytest.mark.asyncio
+async def test_rejected_batch_is_retried_in_halves_async():
+    fake = FakeEmbeddingsServer(max_request_bytes=8)
+    try:
+        embedder = OpenAIEmbedder(base_url=fake.base_url, api_key="test")
+        texts = ["aaaa", "bbbb", "cccc"]
+        
+        assert await embedder.embed_async(texts) == [fake_vector(text) for text in texts]
+    finally:
+        fake.close()
+
+
+@pytest.mark.asyncio
+async def test_embed_async_matches_sync(server):
+    embedder = OpenAIEmbedder(base_url=server.base_url, api_key="test")
+    texts = ["one", "", "three"]
+    
+    assert await embedder.embed_async(texts) == [fake_vector(text or " ") for text in texts]
+
+
+class RecordingIndex:
+    """Vector index double keeping upserted entries per user."""
+    
+    def __init__(self):
+        self.entries = {}
+    
+    def upsert(self, user_id, ids, embeddings, documents, metadatas):
+        for journal_id, embedding, document in zip(ids, embeddings, documents):
+            self.entries[(user_id, journal_id)] = (embedding, document)
+
+
+def test_generate_user_embeddings_against_fake_server(monkeypatch, server):
+    pytest.importorskip("psycopg2")  # Celery tasks use a sync Postgres engine
+    from app.services import vector_service as vector_service_module
+    from app.services.embedding_cache import embedding_cache
+    from app.tasks import analysis_tasks
+    
+    user_id = uuid.uuid4()
+    rows = [
+        (
+            SimpleNamespace(
+                id=uuid.uuid4(),
+                user_id=user_id,
+                content=f"journal entry {i}",
+                created_at=datetime(2026, 1, i + 1),
+                entry_date=date(2026, 1, i + 1),
+            ),
+            "neutral", None, "low"
+        )
+        for i in range(5)
+    ]
+    
+    class FakeSession:
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc):
+            return False
+        
+        def execute(self, query):
+            return SimpleNamespace(all=lambda: rows)
+    
+    index = RecordingIndex()
+    monkeypatch.setattr(analysis_tasks, "SessionLocal", FakeSession)
+    monkeypatch.setattr(vector_service_module.vector_service, "_index", index)
+    monkeypatch.setattr(vector_service_module, "embedder", OpenAIEmbedder(base_url=server.base_url, api_key="test"))
+    monkeypatch.setattr(embedding_cache, "_client", fakeredis.FakeRedis())
+    
+    result = analysis_tasks.generate_user_embeddings(str(user_id), batch_size=2)
+    
+    assert result == {"status": "success", "user_id": str(user_id), "embedded": 5}
+    assert [len(batch) for batch in server.requests] == [2, 2, 1]
+    for entry, *_ in rows:
+        embedding, document = index.entries[(str(user_id), str(entry.id))]
+        assert document == entry.content
+        assert embedding == pytest.approx(fake_vector(entry.content))
+    
+    # A rerun is served from the embedding cache
+    analysis_tasks.generate_user_embeddings(str(user_id), batch_size=2)
+    assert len(server.requests) == 3
@@ -0,0 +1,48 @@
+"""Tests for the binary embedding cache."""
+
+import fakeredis
+import pytest
+import redis
+
+from app.services.embedding_cache import EmbeddingCache
+
+
+class FailingRedis:
+    """Redis double whose reads fail, counting the attempts."""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def mget(self, keys):
+        self.calls += 1
+        raise redis.ConnectionError("connection refused")
+
+
+def test_round_trips_vectors_as_float32():
+    cache = EmbeddingCache()
+    cache._client = fakeredis.FakeRedis()
+    
+    cache.set_many("model", ["a", "b"], [[0.5, -1.0], [0.25, 2.0]])
+    
+    assert cache.get_many("model", ["b", "missing", "a"]) == [[0.25, 2.0], None, [0.5, -1.0]]
+    assert cache.get_many("other-model", ["a"]) == [None]
+
+
+def test_errors_back_off_to_misses():
+    cache = EmbeddingCache()
+    cache._client = FailingRedis()
+    
+    assert cache.get_many("model", ["a"]) == [None]
+    assert cache._backoff.active
+    assert cache.get_many("model", ["a"]) == [None]
+    assert cache._client.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_async_client_uses_binary_shared_pool_settings():
+    cache = EmbeddingCache()
+    kwargs = cache._async_client.connection_pool.connection_kwargs
+    
+    assert not kwargs.get("decode_responses")
+    assert cache._async_client.connection_pool.max_connections == cache._client.connection_pool.max_connections
+    await cache.close()
@@ -0,0 +1,300 @@
+"""Tests for the encryption service and journal content encryption at rest."""
+
+import asyncio
+import base64
+import random
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.types import EncryptedText
+from app.services import encryption_service as encryption_module
+from app.services.encryption_service import (
+    ContentKeyring,
+    DerivedKeyCache,
+    EncryptionService,
+    UndecryptableContent,
+)
+
+KEY = bytes(range(32))
+
+
+@pytest.fixture(scope="module")
+def service():
+    return EncryptionService()
+
+
+@pytest.fixture(scope="module")
+def keyring(service):
+    return ContentKeyring(service, "current-master-key", ["retired-master-key"])
+
+
+@pytest.fixture(scope="module")
+def disabled(service):
+    return ContentKeyring(service, "")
+
+
+@pytest.fixture(scope="module")
+def lost_key_value(service):
+    return ContentKeyring(service, "lost-master-key").seal("written under a lost key")
+
+
+@pytest.mark.parametrize("text", [
+    "an ordinary entry",
+    "NL_ENC:looks like a prefix",
+    "NL_ENC:0123456789ab:AAAAAAAAAAAAAAAAAAAAAA==",
+    "NL_TXT:NL_ENC:nested",
+    "NL_TXT:already escaped looking",
+])
+def test_disabled_keyring_round_trips_prefix_lookalikes(disabled, text):
+    stored = disabled.seal(text)
+    assert disabled.open(stored) == text
+
+
+def test_disabled_keyring_stores_ordinary_text_unchanged(disabled):
+    assert disabled.seal("an ordinary entry") == "an ordinary entry"
+    assert disabled.seal("NL_TXT:no prefix after it") == "NL_TXT:no prefix after it"
+
+
+@pytest.mark.parametrize("text", ["", "hello", "NL_ENC:0123456789ab:AAAA", "NL_TXT:x"])
+def test_enabled_keyring_always_seals(keyring, text):
+    stored = keyring.seal(text)
+    assert stored.startswith(keyring.current_prefix)
+    assert keyring.open(stored) == text
+
+
+def test_legacy_plaintext_with_prefix_reads_as_is(keyring):
+    assert keyring.open("NL_ENC: notes about encryption") == "NL_ENC: notes about encryption"
+    assert keyring.open("NL_ENC:") == "NL_ENC:"
+
+
+def test_retired_key_still_decrypts(service, keyring):
+    old = ContentKeyring(service, "retired-master-key").seal("before rotation")
+    assert keyring.key_id_of(old) != keyring.current_key_id
+    assert keyring.open(old) == "before rotation"
+
+
+def test_unknown_key_raises_for_single_value(keyring, lost_key_value):
+    with pytest.raises(UndecryptableContent):
+        keyring.open(lost_key_value)
+
+
+def test_open_many_scopes_failures_to_their_row(keyring, lost_key_value):
+    good = keyring.seal("fine")
+    corrupt = keyring.current_prefix + "AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA="
+    
+    assert keyring.open_many([good, lost_key_value, "plain", corrupt, good]) == [
+        "fine", None, "plain", None, "fine"
+    ]
+
+
+def test_encrypted_text_raises_instead_of_returning_ciphertext(monkeypatch, keyring, lost_key_value):
+    monkeypatch.setattr("app.models.types.content_keyring", keyring)
+    column = EncryptedText()
+    
+    with pytest.raises(UndecryptableContent):
+        column.process_result_value(lost_key_value, None)
+    assert column.process_result_value(keyring.seal("ok"), None) == "ok"
+
+
+def test_data_keys_are_derived_once(service):
+    keyring = ContentKeyring(service, "another-master-key")
+    
+    def fail(*args):
+        raise AssertionError("KDF ran after construction")
+    
+    keyring._service = SimpleNamespace(
+        derive_key=fail,
+        get_key=fail,
+        encrypt_many=service.encrypt_many,
+        decrypt_many=service.decrypt_many,
+        decrypt_from_storage=service.decrypt_from_storage,
+    )
+    assert keyring.open(keyring.seal("no kdf")) == "no kdf"
+
+
+def test_rotation_skips_undecryptable_rows(monkeypatch, keyring, lost_key_value):
+    pytest.importorskip("psycopg2")  # Celery tasks use a sync Postgres engine
+    from app.tasks import encryption_tasks
+    
+    monkeypatch.setattr(encryption_tasks, "content_keyring", keyring)
+    rows = [
+        SimpleNamespace(id=1, content="plaintext row"),
+        SimpleNamespace(id=2, content=lost_key_value),
+    ]
+    executed = []
+    db = SimpleNamespace(execute=lambda statement, params: executed.append(params))
+    
+    assert encryption_tasks._reencrypt_batch(db, rows) == 1
+    (params,) = executed
+    assert [p["row_id"] for p in params] == [1]
+    assert keyring.open(params[0]["new_content"]) == "plaintext row"
+
+
+class FakeClock:
+    """Stands in for the time module in the encryption service."""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(encryption_module, "time", fake)
+    return fake
+
+
+def test_key_cache_expires_entries(clock):
+    cache = DerivedKeyCache(ttl_seconds=60)
+    lookup = cache.lookup_key("password", b"salt")
+    cache.set(lookup, KEY)
+    held = cache._entries[lookup][0]
+    
+    clock.now += 59
+    assert cache.get(lookup) == KEY
+    clock.now += 1
+    assert cache.get(lookup) is None
+    assert len(cache) == 0
+    assert held == bytearray(len(KEY))
+
+
+def test_key_cache_evicts_least_recently_used(clock):
+    cache = DerivedKeyCache(max_entries=2)
+    lookups = [cache.lookup_key(f"password {i}", b"salt") for i in range(3)]
+    cache.set(lookups[0], KEY)
+    cache.set(lookups[1], KEY)
+    held = cache._entries[lookups[1]][0]
+    
+    assert cache.get(lookups[0]) == KEY  # Now most recently used
+    cache.set(lookups[2], KEY)
+    
+    assert len(cache) == 2
+    assert cache.get(lookups[1]) is None
+    assert held == bytearray(len(KEY))
+    assert cache.get(lookups[0]) == KEY
+
+
+def test_key_cache_returns_copies_and_zeroizes_on_replace(clock):
+    cache = DerivedKeyCache()
+    lookup = cache.lookup_key("password", b"salt")
+    cache.set(lookup, KEY)
+    held = cache._entries[lookup][0]
+    
+    copy = cache.get(lookup)
+    cache.set(lookup, bytes(32))
+    
+    assert copy == KEY
+    assert held == bytearray(len(KEY))
+
+
+def test_key_cache_lookup_separates_salt_and_password():
+    cache = DerivedKeyCache()
+    assert cache.lookup_key("bc", b"a") != cache.lookup_key("c", b"ab")
+
+
+def test_forget_session_drops_only_that_session(clock):
+    cache = DerivedKeyCache()
+    mine = cache.lookup_key("mine", b"salt")
+    other = cache.lookup_key("other", b"salt")
+    cache.set(mine, KEY, session="session-1")
+    cache.set(other, KEY, session="session-2")
+    held = cache._entries[mine][0]
+    
+    assert cache.forget_session("session-1") == 1
+    assert cache.get(mine) is None
+    assert cache.get(other) == KEY
+    assert held == bytearray(len(KEY))
+
+
+@pytest.mark.asyncio
+async def test_get_key_async_coalesces_concurrent_misses(monkeypatch):
+    service = EncryptionService()
+    calls = []
+    release = threading.Event()
+    
+    def derive_key(password, salt):
+        calls.append(password)
+        release.wait(5)
+        return KEY
+    
+    monkeypatch.setattr(service, "derive_key", derive_key)
+    waiters = [asyncio.create_task(service.get_key_async("password", b"salt")) for _ in range(5)]
+    await asyncio.sleep(0.05)
+    release.set()
+    
+    assert await asyncio.gather(*waiters) == [KEY] * 5
+    assert calls == ["password"]
+    # Later calls are served from the cache
+    assert await service.get_key_async("password", b"salt") == KEY
+    assert service.get_key("password", b"salt") == KEY
+    assert calls == ["password"]
+
+
+def random_splits(data: bytes, rng: random.Random) -> list:
+    """Split data at random points, including empty and single-byte pieces."""
+    pieces = []
+    position = 0
+    while position < len(data):
+        size = rng.choice([0, 1, 15, 16, 17, rng.randint(1, 5000)])
+        pieces.append(data[position:position + size])
+        position += size
+    return pieces
+
+
+@pytest.mark.parametrize("length", [0, 1, 15, 16, 17, 100_000])
+def test_streams_round_trip_across_arbitrary_splits(service, length):
+    rng = random.Random(length)
+    payload = rng.randbytes(length)
+    
+    ciphertext = b"".join(service.encrypt_stream(random_splits(payload, rng), KEY))
+    
+    assert len(ciphertext) == service.IV_SIZE + (length // 16 + 1) * 16
+    assert b"".join(service.decrypt_stream(random_splits(ciphertext, rng), KEY)) == payload
+    assert b"".join(service.decrypt_stream([ciphertext], KEY)) == payload
+
+
+def test_decrypt_stream_rejects_truncated_input(service):
+    ciphertext = b"".join(service.encrypt_stream([b"journal export"], KEY))
+    with pytest.raises(ValueError):
+        b"".join(service.decrypt_stream([ciphertext[:10]], KEY))
+    with pytest.raises(ValueError):
+        b"".join(service.decrypt_stream([ciphertext[:-16]], KEY))
+
+
+def test_decrypt_many_accepts_mixed_base64_and_bytes(service):
+    texts = ["first", "", "third 日記", "fourth"]
+    as_text = service.encrypt_many(texts, KEY)
+    as_bytes = service.encrypt_many(texts, KEY, binary=True)
+    mixed = [as_text[0], as_bytes[1], memoryview(as_bytes[2]), bytearray(as_bytes[3])]
+    
+    assert service.decrypt_many(mixed, KEY) == texts
+    assert service.decrypt_many(as_text, KEY) == service.decrypt_many(as_bytes, KEY) == texts
+
+
+def test_bytea_variants_match_the_storage_format(service):
+    blob = service.encrypt_to_bytes("entry text", KEY)
+    streamed = b"".join(service.encrypt_stream(["entry ".encode(), "text".encode()], KEY))
+    
+    assert len(blob) == service.IV_SIZE + 16
+    assert service.decrypt_from_bytes(blob, KEY) == "entry text"
+    assert service.decrypt_from_bytes(memoryview(blob), KEY) == "entry text"  # psycopg2 BYTEA
+    assert service.decrypt_from_bytes(streamed, KEY) == "entry text"
+    assert service.decrypt_from_storage(base64.b64encode(blob).decode("ascii"), KEY) == "entry text"
+    assert service.decrypt_from_bytes(base64.b64decode(service.encrypt_for_storage("x", KEY)), KEY) == "x"
+
+
+
+@pytest.mark.parametrize("data", [b"", b"x" * 15 + b"\x00", b"x" * 15 + b"\x11", b"x" * 13 + b"\x01\x03\x03", b"\x02"])
+def test_unpad_rejects_invalid_padding(data):
+    with pytest.raises(ValueError):
+        EncryptionService._unpad(data)
+
+
+def test_unpad_strips_valid_padding():
+    assert EncryptionService._unpad(EncryptionService._pad(b"entry")) == b"entry"
+    assert EncryptionService._unpad(b"x" * 16 + b"\x10" * 16) == b"x" * 16
@@ -0,0 +1,56 @@
+"""Tests for the memory-mapped NumPy vector index."""
+
+import builtins
+import importlib
+import os
+import sys
+
+import pytest
+
+from app.services import vector_index
+
+
+def test_imports_without_fcntl(monkeypatch):
+    """The module (and so the whole backend) must import on Windows."""
+    real_import = builtins.__import__
+    
+    def no_fcntl(name, *args, **kwargs):
+        if name == "fcntl":
+            raise ImportError("No module named 'fcntl'")
+        if name == "msvcrt":
+            return sys.modules["msvcrt"]
+        return real_import(name, *args, **kwargs)
+    
+    monkeypatch.setitem(sys.modules, "msvcrt", object())
+    monkeypatch.setattr(builtins, "__import__", no_fcntl)
+    try:
+        module = importlib.reload(vector_index)
+        assert module.FCNTL_AVAILABLE is False
+    finally:
+        monkeypatch.undo()
+        importlib.reload(vector_index)
+
+
+@pytest.mark.skipif(not vector_index.NUMPY_AVAILABLE, reason="NumPy not installed")
+def test_locked_round_trip(tmp_path):
+    index = vector_index.NumpyIndex("test-model", path=str(tmp_path))
+    user_dir = tmp_path / "user"
+    user_dir.mkdir()
+    
+    with index._locked(str(user_dir), exclusive=True):
+        pass
+    with index._locked(str(user_dir), exclusive=False):
+        pass
+
+
+def test_stamp_changes_when_file_is_replaced_within_mtime_granularity(tmp_path):
+    entries_path = tmp_path / "entries.json"
+    entries_path.write_text('{"ids": ["a"]}')
+    before = vector_index.NumpyIndex._stamp(str(tmp_path))
+    
+    replacement = tmp_path / "entries.json.tmp"
+    replacement.write_text('{"ids": ["b"]}')
+    os.utime(replacement, ns=(before[1], before[1]))
+    os.replace(replacement, entries_path)
+    
+    assert vector_index.NumpyIndex._stamp(str(tmp_path)) != before
@@ -0,0 +1,28 @@
+"""Tests for the vector index outbox consumer."""
+
+import pytest
+
+pytest.importorskip("psycopg2")  # Celery tasks use a sync Postgres engine
+
+from app.tasks import analysis_tasks  # noqa: E402
+
+
+class UntouchableSession:
+    """Session double that fails if the consumer reads or writes anything."""
+    
+    def __getattr__(self, name):
+        raise AssertionError(f"session.{name} used while the index is unavailable")
+
+
+def test_unavailable_index_leaves_watermark_untouched(monkeypatch):
+    monkeypatch.setattr(analysis_tasks.vector_service, "_index", None)
+    
+    with pytest.raises(RuntimeError):
+        analysis_tasks._sync_vector_batch(UntouchableSession(), batch_size=10)
+
+
+def test_sync_task_reports_unavailable_index(monkeypatch):
+    monkeypatch.setattr(analysis_tasks.vector_service, "_index", None)
+    monkeypatch.setattr(analysis_tasks, "SessionLocal", UntouchableSession)
+    
+    assert analysis_tasks.sync_vector_index()["status"] == "error"